@@ -1,9 +1,33 @@
+import logging
+import threading
+import time
+from collections import deque
 import numpy as np
 import cv2
 import mediapipe as mp
-from ultralytics import YOLO
+from backends import BACKENDS, check_backend, detector_path
+from barpath import BarPath
+from buffers import BufferPool
+from capture import LatestFrameCapture
+from cache import LandmarkCache, Recording, hash_model, to_landmark_list
+from concurrency import ConcurrentInference, configure_threads
+from detection import BarbellDetector, RegionDetector, StridedDetector, draw_detections
+from errors import CustomError
 from helpers import calculate_angle
+from helpers import calculate_angles
+from helpers import calculate_distances
 from helpers import convert_coordinates
+from helpers import convert_coordinates_array
+from landmarks import VISIBILITY, LandmarkStore, joint_indices, landmarks_to_array
+from metrics import Metrics, events
+from models import registry
+from offline import NO_VIEW, VideoFeatures
+from overlay import Overlay
+from pacing import DEFAULT_FPS, Pacer
+from pipeline import FramePacket, Pipeline, Stage
+from reps import DEFAULT_HYSTERESIS_FRAMES, RepSegmenter, combine_results, rep_report
+from smoothing import DEFAULT_BETA, DEFAULT_MIN_CUTOFF, LandmarkFilter
+from tuning import PoseInput, tune
 
 class Analysis:
      
@@ -12,141 +36,637 @@ class Analysis:
                "green": (0, 255, 0),
                "orange": (0, 165, 255)
                }
+
+     # Settings of the MediaPipe Pose graph. The model complexity is set by the
+     # 'pose_model_complexity' option.
+     pose_settings = {
+               "model_complexity": 1,
+               "min_detection_confidence": 0.5,
+               "min_tracking_confidence": 0.5
+               }
+
+     # Joints whose pixels are needed for drawing, the (a, b, c) joints of each angle at 'b' and
+     # the (a, b) joints of each distance measured in every frame. Set by subclasses.
+     pixel_joints = ()
+     angle_joints = {}
+     distance_joints = {}
+
+     # Default values of the options that can be passed to the constructor.
+     defaults = {
+               # Maximum number of frames waiting in between two stages of the pipeline.
+               "queue_depth": 4,
+               # Run the barbell detector every 'detection_stride' frames and track the barbell in
+               # between. If 'adaptive_stride' is set, the stride is adjusted (up to
+               # 'max_detection_stride') depending on how well the tracking agrees with the
+               # detector.
+               "detection_stride": 1,
+               "adaptive_stride": False,
+               "max_detection_stride": 8,
+               # Search for the barbell around the lifter's hands and shoulders only, extended by
+               # 'region_margin' times the size of that region. The region is taken from the
+               # landmarks of the same frame, so the pose model runs before the barbell detector.
+               "region_of_interest": False,
+               "region_margin": 0.5,
+               # Number of frames passed to the barbell detector at once. Batching increases the
+               # throughput of offline analyses at the cost of latency.
+               "detection_batch_size": 1,
+               # Store the landmarks and detections of each video on disk, and reuse them instead of
+               # running the models when the same video is analysed again.
+               "cache": False,
+               "cache_dir": None,
+               # File to memory-map the landmark store to, for long sessions.
+               "landmark_store_path": None,
+               # Play the video back at its own frame rate. Pose and barbell detection are skipped
+               # on frames that arrive too late to be analysed in time, and the pose and detections
+               # of the last analysed frame are carried forward instead. Paced analyses are not
+               # cached.
+               "real_time": False,
+               # Treat the source as live: read it (a camera index, a stream URL, or a video file
+               # played back in real time as a stand-in for a camera) on a capture thread that only
+               # keeps the newest frame. Live sources are not cached.
+               "live": False,
+               # Show the median and 95th percentile time per frame of each stage on the video.
+               "show_metrics": False,
+               # Number of consecutive frames that a phase must hold to start or end a repetition.
+               "rep_hysteresis_frames": DEFAULT_HYSTERESIS_FRAMES,
+               # Smooth the landmarks from one frame to the next before they are analysed, so that
+               # the jitter of the pose model does not flip the verdicts. The cutoff frequency (in
+               # Hz) rises from 'smoothing_min_cutoff' by 'smoothing_beta' times the speed of each
+               # landmark, so that fast movements are not delayed.
+               "smoothing": False,
+               "smoothing_min_cutoff": DEFAULT_MIN_CUTOFF,
+               "smoothing_beta": DEFAULT_BETA,
+               # Complexity of the pose model (0 for the lite model, 1 for the full model and 2 for
+               # the heavy model), and the factor that frames are downscaled by before the pose
+               # model is run on them. The landmarks are normalised to the frame, so they map back
+               # to the full-size frame as they are.
+               "pose_model_complexity": 1,
+               "pose_input_scale": 1.0,
+               # Size (in pixels, on the longest side) that frames are resized to for the barbell
+               # detector, or None for the size it was trained at. The boxes are returned in frame
+               # pixels either way.
+               "detector_image_size": None,
+               # If set, the settings above are chosen before the first playback: the most accurate
+               # settings that still hold this many frames per second, measured on the first
+               # seconds of the video on this machine.
+               "target_fps": None,
+               # Run the barbell detector and the pose model on each frame at the same time, in a
+               # single stage, instead of in consecutive stages. This shortens the delay of each
+               # frame to that of the slower model. Not combined with 'detection_batch_size' or
+               # 'region_of_interest'.
+               "concurrent_inference": False,
+               # Number of threads that the barbell detector (PyTorch) and OpenCV may each use, or
+               # None for their defaults. The limits apply to the whole process.
+               "torch_threads": None,
+               "opencv_threads": None,
+               # Runtime that the barbell detector runs on: "pytorch", or one of the CPU-optimised
+               # backends exported by 'backends.py' ("onnx", "onnx-int8" or "openvino").
+               "detector_backend": "pytorch"
+               }
      
-     def __init__(self, video_path):
+     def __init__(self, video_path, **options):
+          unknown_options = set(options) - set(self.defaults)
+          if unknown_options:
+               raise CustomError(f"Unknown analysis option(s): {', '.join(sorted(unknown_options))}.",
+                                 "unknown_option")
+          self.options = {**self.defaults, **options}
+          check_backend(self.options["detector_backend"])
+          if self.options["concurrent_inference"] and self.options["detection_batch_size"] > 1:
+               raise CustomError("Concurrent inference cannot be combined with batched detection.",
+                                 "invalid_option")
+          self.pose_settings = {**self.pose_settings, "model_complexity": self.options["pose_model_complexity"]}
+          # The settings chosen for the 'target_fps' option and the measurements they were chosen from.
+          self.tuning = None
           self.mp_drawing = mp.solutions.drawing_utils
           self.mp_pose = mp.solutions.pose
+          self.landmark_spec = self.mp_drawing.DrawingSpec(color=(0, 255, 0), thickness=4, circle_radius=6)
+          self.connection_spec = self.mp_drawing.DrawingSpec(color=(255, 255, 255), thickness=8, circle_radius=6)
           self.video_path = video_path
 
           self.view = ""
-          self.landmarks = {}
+          # The landmarks of every frame, and a view of the landmarks of the latest frame by joint
+          # name.
+          self.store = LandmarkStore(path=self.options["landmark_store_path"])
+          self.landmarks = self.store.latest
+          self.pixel_indices = joint_indices(self.pixel_joints)
+          self.angle_indices = joint_indices(list(self.angle_joints.values()))
+          self.distance_indices = joint_indices(list(self.distance_joints.values()))
           self.results = {}
           self.angles = {}
           self.pixels = {}
-          # If a weight is detected, the weight type and a set of all of its coordinates are stored.
+          # If a weight is detected, the weight type is stored and its path is followed.
           self.exercise = ""
-          self.weight = {"type": "",
-               "coordinates": []
-               }
+          self.weight = {"type": ""}
+          self.bar_path = BarPath()
+          # Phase of the exercise in the latest frame with a detected pose. The set is split into
+          # repetitions, each reported with its own results once it ends ('results' only holds the
+          # results of the repetition in progress), along with the index of the frame at which
+          # each repetition ended.
+          self.phase = None
+          self.segmenter = RepSegmenter(self.options["rep_hysteresis_frames"])
+          self.reps = []
+          self.rep_ends = []
           
-          self.is_playing = False
-     
-     def process_video(self, gui):
+          # Number of frames that have reached the analysis stage.
+          self.frame_count = 0
+
+          # Held for as long as the video is being processed so that only one playback runs at a
+          # time.
+          self.playback_lock = threading.Lock()
+          self.pipeline = None
+          # Set by 'stop', which may be called before the pipeline of a playback exists (e.g. while
+          # the models are loaded or tuned), and cleared once the playback ends. 'stopped_early' is
+          # whether the latest playback was stopped before the end of the video.
+          self.stop_requested = threading.Event()
+          self.stopped_early = False
+          # The detector that is given the landmarks of each frame to search for the barbell around.
+          self.region_detector = None
+          # Collects the landmarks and detections of each frame while they are being cached.
+          self.recording = None
+          # Whether the annotations are recorded, i.e. whether the frames are being displayed.
+          self.rendering = False
+          # Paces the playback to the frame rate of the video, if the 'real_time' option is set.
+          self.pacer = None
+          # The latest computed detections and pose, carried forward to frames that are skipped,
+          # and the annotations of the latest analysed frame.
+          self.last_detections = []
+          self.last_pose = (None, None)
+          self.annotations = None
+          # The capture thread of a live source, and the latest delays (in seconds) from the
+          # capture of a frame to its results being shown.
+          self.capture = None
+          self.delays = deque(maxlen=1000)
+          # The time spent in each stage of the analysis, and the lines of the on-screen metrics
+          # with the time at which they were last refreshed.
+          self.metrics = Metrics()
+          self.metrics_lines = []
+          self.metrics_refreshed = 0.0
+          # The frames are decoded into buffers of this pool, which are reused once the frames have
+          # been shown.
+          self.buffers = BufferPool(metrics=self.metrics)
+          self.pose_input = None
+          # Smooths the landmarks of each frame, if the 'smoothing' option is set.
+          self.smoother = None
+          if self.options["smoothing"]:
+               self.smoother = LandmarkFilter(self.options["smoothing_min_cutoff"], self.options["smoothing_beta"])
+
+     @property
+     def is_playing(self):
+          return self.playback_lock.locked()
+
+     # Process the video through a pipeline of stages (decoding, barbell detection, pose
+     # detection, analysis and display) that run concurrently on consecutive frames. 'gui' may be
+     # None to process the video without displaying it.
+     def process_video(self, gui=None):
           # Handle race conditions when the 'replay' button is clicked while the video is already
           # playing.
-          if self.is_playing:
-            print("Video is already playing. Stopping current playback...")
-            # Do not start a new thread if the video is already playing.
-            return
-          self.is_playing = True
-
-          model = YOLO('runs/detect/barbell_detector/weights/best.pt')
+          if not self.playback_lock.acquire(blocking=False):
+               events.event("already_playing", logging.WARNING, video=str(self.video_path))
+               # Do not start a new playback if the video is already playing.
+               return
+          self.stopped_early = False
+          try:
+               # Follow the barbell path afresh on every playback.
+               self.bar_path.reset()
+               self.phase = None
+               self.segmenter.reset()
+               self.reps = []
+               self.rep_ends = []
+               self.results = {}
+               # Including the smallest and largest angles of the previous playback.
+               self.angles = {}
+               self.store.clear()
+               if self.smoother is not None:
+                    self.smoother.reset()
+               self.pacer = None
+               self.last_detections = []
+               self.last_pose = (None, None)
+               self.annotations = None
+               self.delays.clear()
+               self.metrics.reset()
+               self.metrics_lines = []
+               cache = cache_key = None
+               if self.options["cache"] and not self.options["live"]:
+                    cache = LandmarkCache(self.options["cache_dir"])
+                    cache_key = cache.key(self.video_path, self.cache_config())
+                    entry = cache.load(cache_key)
+                    if entry is not None:
+                         # Skip the models entirely and go straight to the analysis. Without a GUI
+                         # to play the video back to, the video does not even need to be decoded.
+                         if gui is None:
+                              with self.metrics.time("offline", frames=len(entry)):
+                                   self.analyse_offline(entry)
+                         else:
+                              self.run_pipeline(self.read_cached_frames(entry), [Stage("analysis", self.analyse_frame)], gui)
+                         return
+
+               # Only tune on a cache miss: the cache is keyed by the configured settings, not the
+               # tuned ones, so that a cached video never waits for the models to be measured.
+               if self.options["target_fps"] and self.tuning is None and not self.options["live"]:
+                    self.autotune()
+               # The models are loaded once per process and reused by later analyses.
+               configure_threads(self.options["torch_threads"], self.options["opencv_threads"])
+               with registry.detector_model(detector_path(self.options["detector_backend"])) as model, \
+                         registry.pose(**self.pose_settings) as pose, \
+                         ConcurrentInference() as inference:
+                    detector = self.create_detector(model)
+                    # Frames that are skipped to keep up with real time have no landmarks or
+                    # detections of their own to cache.
+                    if cache is not None and not self.options["real_time"]:
+                         self.recording = Recording()
+                    self.run_pipeline(self.read_frames(), self.create_stages(detector, pose, inference), gui)
+               # Only cache videos that were processed until the end.
+               if self.recording is not None and not self.stopped_early:
+                    cache.store(cache_key, self.recording, self.video_path)
+          finally:
+               self.recording = None
+               self.stop_requested.clear()
+               self.playback_lock.release()
+
+     # Choose the most accurate model settings that hold the 'target_fps' option on this machine.
+     # The choice is kept for replays.
+     def autotune(self):
+          settings, measurements = tune(self.video_path, self.options["target_fps"], registry, self.pose_settings,
+                                        detector_path=detector_path(self.options["detector_backend"]))
+          configured = {name: self.options[name] for name in settings}
+          self.options.update(settings)
+          self.pose_settings = {**self.pose_settings, "model_complexity": settings["pose_model_complexity"]}
+          self.tuning = {"target_fps": self.options["target_fps"], "settings": settings, "configured": configured,
+                         "measurements": measurements}
+          events.event("autotune", target_fps=self.options["target_fps"], **settings)
+
+     def run_pipeline(self, source, stages, gui):
+          self.rendering = gui is not None
+          if self.stop_requested.is_set():
+               self.stopped_early = True
+               return
+          self.pipeline = Pipeline(
+               source,
+               stages,
+               sink=(lambda packet: self.display_frame(gui, packet)) if gui is not None else self.record_delay,
+               queue_depth=self.options["queue_depth"],
+               metrics=self.metrics
+          )
+          # 'stop' may have been called in between the check above and the pipeline being created.
+          if self.stop_requested.is_set():
+               self.pipeline.stop()
+          try:
+               self.pipeline.run()
+          finally:
+               self.stopped_early = self.pipeline.stop_event.is_set()
+
+     # Create the stages that each frame passes through after being decoded, in order.
+     def create_stages(self, detector, pose, inference=None):
+          self.pose_input = PoseInput(self.options["pose_input_scale"], self.buffers)
+          if self.options["region_of_interest"]:
+               # The barbell is searched for around the landmarks of the frame, so they must be
+               # detected first.
+               stages = [Stage("pose", lambda packet: self.detect_landmarks(pose, packet)),
+                         self.create_detection_stage(detector)]
+          elif self.options["concurrent_inference"] and inference is not None:
+               # Each model is still timed on its own, alongside the time of the stage as a whole.
+               detect = self.metrics.timed("detection", lambda packet: self.detect_weight(detector, packet))
+               estimate_pose = self.metrics.timed("pose", lambda packet: self.detect_landmarks(pose, packet))
+               stages = [Stage("inference", lambda packet: self.detect_concurrently(inference, detect, estimate_pose,
+                                                                                     packet))]
+          else:
+               stages = [self.create_detection_stage(detector),
+                         Stage("pose", lambda packet: self.detect_landmarks(pose, packet))]
+          if self.smoother is not None:
+               stages.append(Stage("smoothing", self.smooth_landmarks))
+          return stages + [Stage("analysis", self.analyse_frame)]
+
+     def create_detection_stage(self, detector):
+          if self.options["detection_batch_size"] > 1:
+               return Stage("detection", lambda packets: self.detect_weights(detector, packets),
+                            batch_size=self.options["detection_batch_size"])
+          return Stage("detection", lambda packet: self.detect_weight(detector, packet))
+
+     # Stop the current playback, if any.
+     def stop(self):
+          self.stop_requested.set()
+          if self.pipeline is not None:
+               self.pipeline.stop()
+          if self.capture is not None:
+               self.capture.stop_event.set()
+
+     # Decode the video one frame at a time.
+     def read_frames(self):
+          if self.options["live"]:
+               yield from self.read_live_frames()
+               return
           cap = cv2.VideoCapture(self.video_path)
-
-          with self.mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5) as pose:
-               frame_count = 0
+          fps = cap.get(cv2.CAP_PROP_FPS)
+          if self.options["real_time"]:
+               self.pacer = Pacer(fps)
+          shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), 3)
+          frame_count = 0
+          try:
                while cap.isOpened():
-                    ret, frame = cap.read()
+                    buffer = self.buffers.acquire(shape)
+                    with self.metrics.time("decode"):
+                         ret, frame = cap.read(buffer)
                     if not ret:
-                         print(f"Video ended or failed to load at frame {frame_count}")
+                         self.buffers.release(buffer)
+                         events.event("video_ended", frame=frame_count)
                          break
+                    # OpenCV allocates a new frame when the buffer does not fit it, e.g. when the
+                    # container reports the wrong size.
+                    if not np.may_share_memory(frame, buffer):
+                         self.buffers.release(buffer)
+                         self.buffers.count_allocation()
+                         packet = FramePacket(frame_count, frame)
+                    else:
+                         packet = FramePacket(frame_count, frame, self.buffers)
+                    # Prefer the timestamp stored in the container, which also holds for videos
+                    # with a variable frame rate.
+                    timestamp = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+                    packet.timestamp = timestamp if timestamp > 0 or frame_count == 0 else frame_count / (fps or 30.0)
+                    if self.pacer is not None and self.pacer.origin is None:
+                         self.pacer.start(packet.timestamp)
+                    yield packet
                     frame_count += 1
-                    # Keep the analysis window updated with the original video frame for playback.
-                    gui.update_video_frame(frame, label='original')
-
-                    # Detect the presence of a weight.
-                    results = model(frame, verbose=False)
-                    annotated_frame = results[0].plot()
-
-                    for result in results:
-                         for detection in result.boxes:
-                              confidence = detection.conf.item()
-                              # If detection confidence > 70% and class is 'barbell'.
-                              if confidence > 0.7 and detection.cls == 0:
-                                   self.weight["type"] = "barbell"
-                                   box = detection.xywh[0]
-                                   x_coordinate = box[0].item()
-                                   y_coordinate = box[1].item()
-                                   self.weight["coordinates"].append((x_coordinate, y_coordinate))
-
-                    # Detect landmarks.
-                    image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    image_rgb.flags.writeable = False
-                    landmarks_results = pose.process(image_rgb)
-                    image_rgb.flags.writeable = True
-                    image_bgr = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR)
-
-                    if landmarks_results.pose_landmarks:
-                         landmarks = landmarks_results.pose_landmarks.landmark
-                         # Perform calculations and analyses for each frame.
-                         self.extract_landmarks(landmarks)
-                         self.draw_landmarks(landmarks_results, image_bgr)
-                         self.get_landmark_pixels(image_bgr)
-                         self.calculate_angles()
-                         self.calculate_distances()
-                         self.calculate_coordinates()
-                         self.determine_view()
-                         self.initialise_results()
-                         if self.weight["type"] == "barbell":
-                              self.analyse_bar_path()
-                         if self.view == "left" or self.view == "right":
-                              self.analyse_side_view(image_bgr)
-                         elif self.view == "front":
-                              self.analyse_front_view(image_bgr)
-                         else:
-                              print("View error.")
-
-                    # Update the text in the analysis window depending on the results.
-                    gui.update_analysis_text()
-                    
-                    # Combine the annotations from MediaPipe and YOLO in one frame.
-                    combined_frame = cv2.addWeighted(annotated_frame, 0.6, image_bgr, 0.8, 0)
-                    # Keep the analysis window updated with the annotated frame for playback.
-                    gui.update_video_frame(combined_frame, label='processed')
-
-                    if cv2.waitKey(10) & 0xFF == ord("q"):
-                         break
-
+          finally:
+               cap.release()
+               if self.pacer is not None:
+                    events.event("pacing", analysed_frames=self.pacer.analysed_frames,
+                                 analysis_fps=round(self.pacer.analysis_rate(), 1),
+                                 dropped_frames=self.pacer.dropped_frames)
+
+     # Take the newest frame of a live source each time the pipeline is ready for one. Frames that
+     # arrive in the meantime are dropped by the capture thread.
+     def read_live_frames(self):
+          self.capture = LatestFrameCapture(self.video_path).start()
+          if self.options["real_time"]:
+               self.pacer = Pacer(self.capture.fps)
+          try:
+               while (latest := self.capture.read()) is not None:
+                    index, frame, captured_at = latest
+                    packet = FramePacket(index, frame)
+                    packet.timestamp = index / self.capture.fps
+                    packet.captured_at = captured_at
+                    if self.pacer is not None and self.pacer.origin is None:
+                         self.pacer.start(packet.timestamp)
+                    yield packet
+          finally:
+               self.capture.stop()
+               events.event("capture_ended", captured_frames=self.capture.captured_frames,
+                            dropped_frames=self.capture.dropped_frames)
+
+     # Record the delay from the capture of a live frame to its results being shown, after which
+     # the frame's buffer can be reused.
+     def record_delay(self, packet):
+          if packet.captured_at is not None:
+               self.delays.append(time.perf_counter() - packet.captured_at)
+          packet.release()
+          return packet
+
+     # Decode the video and attach the cached landmarks and detections to each frame.
+     def read_cached_frames(self, entry):
+          for packet in self.read_frames():
+               if packet.index >= len(entry):
+                    break
+               packet.detections = entry.detections(packet.index)
+               packet.pose_landmarks = entry.pose_landmarks(packet.index)
+               packet.landmarks = entry.landmarks[packet.index] if entry.has_pose[packet.index] else None
+               yield packet
+
+     # Analyse the whole video at once from its cached landmarks and detections, with the
+     # vectorised rules of 'offline'. The results are the same as those of analysing the video
+     # frame by frame.
+     def analyse_offline(self, entry):
+          frame_indices = np.flatnonzero(entry.has_pose)
+          self.store.extend(entry.landmarks[entry.has_pose], frame_indices)
+          barbell_frames, barbell_coordinates = entry.barbell_coordinates()
+          if len(barbell_frames):
+               self.weight["type"] = "barbell"
+          landmarks = self.store.frames()
+          score = self.score_offline(VideoFeatures(landmarks, frame_indices, barbell_frames, barbell_coordinates[:, 0]))
+
+          # Score each frame range that 'update_phase' would analyse as one repetition on its own.
+          # 'barbell_start' is the first barbell detection of the repetition.
+          def score_range(start, end, barbell_start):
+               view = score.features.views[start - 1] if start else NO_VIEW
+               return self.score_offline(VideoFeatures(landmarks[start:end], frame_indices[start:end], barbell_frames,
+                                                       barbell_coordinates[:, 0], view=view,
+                                                       barbell_start=barbell_start))
+
+          # Split the set into repetitions where 'update_phase' would.
+          fps = self.video_fps()
+          start = barbell_start = 0
+          for position, (phase, frame_index) in enumerate(zip(score.phase_names().tolist(), frame_indices.tolist())):
+               span = self.segmenter.update(phase or None, frame_index, frame_index / fps)
+               if span is None:
+                    continue
+               barbell_end = np.searchsorted(barbell_frames, frame_index, side="right")
+               self.bar_path.extend(barbell_frames[barbell_start:barbell_end],
+                                    barbell_coordinates[barbell_start:barbell_end])
+               self.reps.append(rep_report(len(self.reps) + 1, span, score_range(start, position, barbell_start).results,
+                                           self.bar_path.end_rep()))
+               self.rep_ends.append(span[2])
+               start, barbell_start = position, barbell_end
+          self.bar_path.extend(barbell_frames[barbell_start:], barbell_coordinates[barbell_start:])
+          self.view = score.view
+          self.results = (score_range(start, len(landmarks), barbell_start) if start else score).results
+          self.frame_count = len(entry)
+          return score
+
+     # Frame rate of the video, read from its container without decoding it.
+     def video_fps(self):
+          cap = cv2.VideoCapture(self.video_path)
+          fps = cap.get(cv2.CAP_PROP_FPS)
           cap.release()
-          cv2.destroyAllWindows()
-          self.is_playing = False
-
-     # Extract x and y coordinates of each landmark and add to landmarks dictionary.
-     def extract_landmarks(self, landmarks):
-
-        self.landmarks = {"left_hip": [landmarks[self.mp_pose.PoseLandmark.LEFT_HIP.value].x,
-                    landmarks[self.mp_pose.PoseLandmark.LEFT_HIP.value].y],
-                          "right_hip": [landmarks[self.mp_pose.PoseLandmark.RIGHT_HIP.value].x,
-                    landmarks[self.mp_pose.PoseLandmark.RIGHT_HIP.value].y],
-                          "left_knee": [landmarks[self.mp_pose.PoseLandmark.LEFT_KNEE.value].x,
-                    landmarks[self.mp_pose.PoseLandmark.LEFT_KNEE.value].y,
-                    landmarks[self.mp_pose.PoseLandmark.LEFT_KNEE.value].visibility],
-                          "right_knee": [landmarks[self.mp_pose.PoseLandmark.RIGHT_KNEE.value].x,
-                    landmarks[self.mp_pose.PoseLandmark.RIGHT_KNEE.value].y,
-                    landmarks[self.mp_pose.PoseLandmark.RIGHT_KNEE.value].visibility],
-                          "left_heel": [landmarks[self.mp_pose.PoseLandmark.LEFT_HEEL.value].x,
-                    landmarks[self.mp_pose.PoseLandmark.LEFT_HEEL.value].y],
-                          "right_heel": [landmarks[self.mp_pose.PoseLandmark.RIGHT_HEEL.value].x,
-                    landmarks[self.mp_pose.PoseLandmark.RIGHT_HEEL.value].y],
-                          "left_shoulder": [landmarks[self.mp_pose.PoseLandmark.LEFT_SHOULDER.value].x,
-                    landmarks[self.mp_pose.PoseLandmark.LEFT_SHOULDER.value].y],
-                          "right_shoulder": [landmarks[self.mp_pose.PoseLandmark.RIGHT_SHOULDER.value].x,
-                    landmarks[self.mp_pose.PoseLandmark.RIGHT_SHOULDER.value].y],
-                          "left_toes": [landmarks[self.mp_pose.PoseLandmark.LEFT_FOOT_INDEX.value].x,
-                    landmarks[self.mp_pose.PoseLandmark.LEFT_FOOT_INDEX.value].y],
-                          "right_toes": [landmarks[self.mp_pose.PoseLandmark.RIGHT_FOOT_INDEX.value].x,
-                    landmarks[self.mp_pose.PoseLandmark.RIGHT_FOOT_INDEX.value].y],
-                          "left_ankle": [landmarks[self.mp_pose.PoseLandmark.LEFT_ANKLE.value].x,
-                    landmarks[self.mp_pose.PoseLandmark.LEFT_ANKLE.value].y],
-                          "right_ankle": [landmarks[self.mp_pose.PoseLandmark.RIGHT_ANKLE.value].x,
-                    landmarks[self.mp_pose.PoseLandmark.RIGHT_ANKLE.value].y]
-                        }
+          return fps if fps and fps > 0 else DEFAULT_FPS
+
+     # Everything that the cached landmarks and detections depend on, besides the video itself. The
+     # settings chosen by tuning depend on the speed of the machine at the time, so the settings that
+     # were configured (and the target frame rate) are used instead.
+     def cache_config(self):
+          options = {**self.options, **self.tuning["configured"]} if self.tuning is not None else self.options
+          try:
+               model_hash = hash_model(BACKENDS[options["detector_backend"]])
+          except OSError:
+               model_hash = ""
+          return {
+               "model": model_hash,
+               "mediapipe": mp.__version__,
+               "pose_settings": {**self.pose_settings, "model_complexity": options["pose_model_complexity"]},
+               **{name: options[name] for name in ("detection_stride", "adaptive_stride",
+                                                   "max_detection_stride", "region_of_interest",
+                                                   "region_margin")},
+               # Only included when they differ from the defaults, so that the entries cached
+               # before they were added stay valid.
+               **{name: options[name] for name in ("pose_input_scale", "detector_image_size", "detector_backend",
+                                                   "target_fps")
+                  if options[name] != self.defaults[name]},
+               **({name: options[name] for name in ("smoothing", "smoothing_min_cutoff", "smoothing_beta")}
+                  if options["smoothing"] else {})
+          }
+
+     def create_detector(self, model):
+          detector = BarbellDetector(model, image_size=self.options["detector_image_size"])
+          self.region_detector = None
+          if self.options["region_of_interest"]:
+               detector = self.region_detector = RegionDetector(detector, margin=self.options["region_margin"])
+          if self.options["detection_stride"] > 1 or self.options["adaptive_stride"]:
+               detector = StridedDetector(detector, stride=self.options["detection_stride"],
+                                          adaptive=self.options["adaptive_stride"],
+                                          max_stride=self.options["max_detection_stride"])
+          return detector
+
+     # Whether a stage should skip its work on a frame to keep up with real time.
+     def is_late(self, packet):
+          return self.pacer is not None and not self.pacer.can_afford(packet.timestamp)
+
+     # Detect the presence of a weight.
+     def detect_weight(self, detector, packet):
+          if self.is_late(packet):
+               packet.detections, packet.detections_carried = self.last_detections, True
+               return packet
+          if self.region_detector is not None:
+               self.region_detector.update_landmarks(packet.landmarks)
+          packet.detections = self.last_detections = detector.detect(packet.frame)
+          return packet
+
+     # Detect the presence of a weight in a batch of consecutive frames.
+     def detect_weights(self, detector, packets):
+          # Each region is taken from the landmarks of its own frame.
+          if self.region_detector is not None:
+               return [self.detect_weight(detector, packet) for packet in packets]
+          late = [self.is_late(packet) for packet in packets]
+          detected = iter(detector.detect_batch([packet.frame for packet, is_late in zip(packets, late) if not is_late]))
+          for packet, is_late in zip(packets, late):
+               if is_late:
+                    packet.detections, packet.detections_carried = self.last_detections, True
+               else:
+                    packet.detections = self.last_detections = next(detected)
+          return packets
+
+     # Detect the presence of a weight and the landmarks at the same time.
+     def detect_concurrently(self, inference, detect, estimate_pose, packet):
+          inference(lambda: detect(packet), lambda: estimate_pose(packet))
+          return packet
+
+     # Detect landmarks.
+     def detect_landmarks(self, pose, packet):
+          if self.is_late(packet):
+               packet.pose_landmarks, packet.landmarks = self.last_pose
+               packet.pose_carried = True
+               return packet
+          image_rgb = self.pose_input(packet.frame)
+          packet.pose_landmarks = pose.process(image_rgb).pose_landmarks
+          if packet.pose_landmarks:
+               packet.landmarks = landmarks_to_array(packet.pose_landmarks)
+          self.last_pose = (packet.pose_landmarks, packet.landmarks)
+          return packet
+
+     # Smooth the landmarks of each frame, in order, with those of the frames before it. The smoothed
+     # landmarks are the ones that are analysed, drawn and cached.
+     def smooth_landmarks(self, packet):
+          if packet.landmarks is not None and not packet.pose_carried:
+               packet.landmarks = self.smoother(packet.landmarks, packet.timestamp)
+               if self.rendering:
+                    packet.pose_landmarks = to_landmark_list(packet.landmarks)
+          return packet
+
+     # Update the weight and the analysis with the detections and landmarks of the frame, and record
+     # the annotations on the overlay of the frame. Frames reach this stage in order, so the
+     # analysis state is only ever modified here.
+     def analyse_frame(self, packet):
+          self.frame_count = packet.index + 1
+          # Carried detections were already counted in the frame they were detected in.
+          if not packet.detections_carried:
+               for x_coordinate, y_coordinate, _, _, confidence, class_id in packet.detections:
+                    # If detection confidence > 70% and class is 'barbell'.
+                    if confidence > 0.7 and class_id == 0:
+                         self.weight["type"] = "barbell"
+                         self.bar_path.add(x_coordinate, y_coordinate, packet.index)
+
+          if self.recording is not None:
+               self.recording.add(packet.landmarks, packet.detections)
+
+          overlay = packet.overlay = Overlay(packet.frame.shape, enabled=self.rendering)
+          draw_detections(overlay, packet.detections)
+          if packet.pose_carried:
+               # Carried landmarks were already analysed; show their annotations again.
+               if self.annotations is not None:
+                    overlay.extend(self.annotations)
+          elif packet.landmarks is not None:
+               annotations = self.annotations = Overlay(packet.frame.shape, enabled=self.rendering)
+               # Perform calculations and analyses for each frame.
+               with self.metrics.time("landmarks"):
+                    self.extract_landmarks(packet.landmarks, packet.index)
+                    self.draw_landmarks(packet.pose_landmarks, annotations)
+                    self.get_landmark_pixels(annotations)
+               with self.metrics.time("measurements"):
+                    self.calculate_angles()
+                    self.calculate_distances()
+                    self.calculate_coordinates()
+               with self.metrics.time("view"):
+                    self.determine_view()
+                    self.update_phase(packet.index, packet.timestamp)
+                    self.initialise_results()
+               with self.metrics.time("view_analysis"):
+                    if self.view == "left" or self.view == "right":
+                         self.analyse_side_view(annotations)
+                    elif self.view == "front":
+                         self.analyse_front_view(annotations)
+                    else:
+                         events.event("view_error", logging.WARNING, frame=packet.index)
+               overlay.extend(annotations)
+
+          if self.pacer is not None:
+               self.pacer.record(packet.pose_carried)
+               overlay.text(f"Analysis: {self.pacer.analysis_rate():.1f} fps, {self.pacer.dropped_frames} dropped",
+                            (10, 30), (255, 255, 255))
+          if self.delays:
+               overlay.text(f"Delay: {self.delays[-1] * 1000:.0f} ms", (10, 60), (255, 255, 255))
+          if self.options["show_metrics"] and self.rendering:
+               self.draw_metrics(overlay)
+          return packet
+
+     # Show the time per frame of each stage, refreshed once per second.
+     def draw_metrics(self, overlay):
+          now = time.perf_counter()
+          if now - self.metrics_refreshed >= 1.0:
+               self.metrics_lines = self.metrics.overlay_lines()
+               self.metrics_refreshed = now
+          for i, line in enumerate(self.metrics_lines):
+               overlay.text(line, (10, 90 + 20 * i), (255, 255, 255), scale=0.5, thickness=1)
+
+     # Hand the analysed frame over to the analysis window, which shows the newest frame (and
+     # renders its annotations) on its own main loop, dropping any frame it did not get to.
+     def display_frame(self, gui, packet):
+          # Do not show frames before they are due, so that the video plays at its own speed.
+          if self.pacer is not None:
+               self.pacer.wait(packet.timestamp, self.pipeline.stop_event)
+          gui.submit(packet)
+          return packet
+
+     # The pixels of every joint in 'pixel_joints' in the latest frame, converted in one call.
+     def measure_pixels(self, image):
+          pixels = convert_coordinates_array(self.store.latest_frame()[self.pixel_indices], image)
+          return dict(zip(self.pixel_joints, map(tuple, pixels.tolist())))
+
+     # Every angle in 'angle_joints' in the latest frame, computed in one call.
+     def measure_angles(self):
+          a, b, c = self.store.latest_frame()[self.angle_indices.T]
+          return dict(zip(self.angle_joints, calculate_angles(a, b, c)))
+
+     # Every distance in 'distance_joints' in the latest frame, computed in one call.
+     def measure_distances(self):
+          a, b = self.store.latest_frame()[self.distance_indices.T]
+          return dict(zip(self.distance_joints, calculate_distances(a, b)))
+
+     # Add the (x, y, z, visibility) values of each landmark to the landmark store. The landmarks
+     # of the current frame are then available by joint name through 'self.landmarks'.
+     def extract_landmarks(self, landmarks, frame_index=None):
+          self.store.append(landmarks, frame_index)
         
      # Draw landmarks and connections on playback video.
-     def draw_landmarks(self, results, image):
-        self.mp_drawing.draw_landmarks(image, results.pose_landmarks, self.mp_pose.POSE_CONNECTIONS,
-                                       self.mp_drawing.DrawingSpec(color=(0, 255, 0), thickness=4, circle_radius=6),
-                                       self.mp_drawing.DrawingSpec(color=(255, 255, 255), thickness=8, circle_radius=6))
+     def draw_landmarks(self, pose_landmarks, overlay):
+        overlay.add(self.mp_drawing.draw_landmarks, pose_landmarks, self.mp_pose.POSE_CONNECTIONS,
+                    self.landmark_spec, self.connection_spec)
 
      # Determine the view that the exercise is being recorded from. The analyses performed on the
      # exercise is dependant on the view. The same analyses cannot be accurately performed on both 
@@ -154,8 +674,8 @@ class Analysis:
      # measure the distance between the feet when the video is recorded from the side, or 
      # difficulty in detecting certain landmarks when key body parts are occluded in the side view.
      def determine_view(self):
-          right_knee_visibility = self.landmarks["right_knee"][2]
-          left_knee_visibility = self.landmarks["left_knee"][2]
+          right_knee_visibility = self.landmarks["right_knee"][VISIBILITY]
+          left_knee_visibility = self.landmarks["left_knee"][VISIBILITY]
           confidence = 0 
 
           if right_knee_visibility >= 0.7 and left_knee_visibility >= 0.7:
@@ -168,24 +688,49 @@ class Analysis:
               self.view = "left"
               confidence = left_knee_visibility / (left_knee_visibility + right_knee_visibility) if (left_knee_visibility + right_knee_visibility) != 0 else 0
           else:
-              print("Error determining the view of the exercise. Please ensure the video adheres to criteria.")
-
-          print(f"View detected: {self.view} with confidence: {confidence:.2f}")
-
+              events.event("view_undetermined", logging.WARNING,
+                           message="Please ensure the video adheres to the criteria.")
+
+          events.event("view_detected", view=self.view, confidence=round(float(confidence), 2))
+
+     # A repetition ends when the lifter returns to standing from the working phase, i.e. from the
+     # bottom of a squat or once a deadlift is locked out. Its results, barbell path and timings are
+     # then reported, and the state kept for it is released so that memory does not grow with the
+     # length of the session.
+     def update_phase(self, frame_index, timestamp):
+          self.phase = self.determine_phase()
+          span = self.segmenter.update(self.phase, frame_index, timestamp)
+          if span is not None:
+               self.end_rep(span)
+
+     def end_rep(self, span):
+          self.reps.append(rep_report(len(self.reps) + 1, span, self.results, self.bar_path.end_rep()))
+          self.rep_ends.append(span[2])
+          # Start the next repetition from the current frame, with fresh results and extrema.
+          self.results = {}
+          self.store.retain_latest()
+          for name in self.angles:
+               if name.startswith(("smallest_", "largest_")):
+                    self.angles[name] = self.angles[name.split("_", 1)[1]]
+          self.calculate_coordinates()
+
+     # The results of the whole set, combined from every repetition and the one in progress. Also
+     # called from the GUI thread, so it works on copies of the lists being appended to.
+     def set_results(self):
+          return combine_results([rep["results"] for rep in list(self.reps)] + [dict(self.results)])
+
+     # Whether the barbell path of the repetition in progress is straight.
      def analyse_bar_path(self):
-          min_x = min(coord[0] for coord in self.weight["coordinates"])
-          max_x = max(coord[0] for coord in self.weight["coordinates"])
-          if abs(min_x - max_x) > 50:
-            return False
-          return True
+          return self.bar_path.rep_is_straight()
      
-     def draw_circle(self, image, pixel, colour, radius=2, size=20):
-          cv2.circle(image, pixel, radius, self.colours[colour], size)
+     # The drawing helpers record their shapes on the overlay of the frame being analysed.
+     def draw_circle(self, overlay, pixel, colour, radius=2, size=20):
+          overlay.circle(pixel, radius, self.colours[colour], size)
      
-     def draw_line(self, image, start, end, colour, thickness=8):
-         cv2.line(image, start, end, self.colours[colour], thickness)
+     def draw_line(self, overlay, start, end, colour, thickness=8):
+         overlay.line(start, end, self.colours[colour], thickness)
      
-     def draw_dashed_line(self, image, start_point, end_point, colour, thickness=6, dash_length=15, gap_length=15):
+     def draw_dashed_line(self, overlay, start_point, end_point, colour, thickness=6, dash_length=15, gap_length=15):
         distance = np.sqrt((end_point[0] - start_point[0]) ** 2 + (end_point[1] - start_point[1]) ** 2)
 
         num_dashes = int(distance / (dash_length + gap_length))
@@ -200,23 +745,28 @@ class Analysis:
                 int(start_point[1] + (end_point[1] - start_point[1]) * (i + 0.5) / num_dashes)
             )
 
-            overlay = image.copy()
-            opacity = 0.6
-            cv2.line(overlay, start, end, self.colours[colour], thickness)
-            cv2.addWeighted(overlay, opacity, image, 1 - opacity, 0, image)
-
-     def draw_cross(self, image, pixel, colour, thickness=6, size=15):
-          cv2.line(image, (int(pixel[0] - size), int(pixel[1] - size)), (int(pixel[0] + size), 
-                                                                         int(pixel[1] + size)), 
-                                                                         self.colours[colour], 2)
-          cv2.line(image, (int(pixel[0] - size), int(pixel[1] + size)), (int(pixel[0] + size), 
-                                                                         int(pixel[1] - size)), 
-                                                                         self.colours[colour], 2)
+            overlay.line(start, end, self.colours[colour], thickness, opacity=0.6)
+
+     def draw_cross(self, overlay, pixel, colour, thickness=6, size=15):
+          overlay.line((int(pixel[0] - size), int(pixel[1] - size)), (int(pixel[0] + size), 
+                                                                      int(pixel[1] + size)), 
+                                                                      self.colours[colour], 2)
+          overlay.line((int(pixel[0] - size), int(pixel[1] + size)), (int(pixel[0] + size), 
+                                                                      int(pixel[1] - size)), 
+                                                                      self.colours[colour], 2)
      
      def initialise_results():
          # Placeholder to be overridden by subclasses.
          pass
 
+     def score_offline(self, features):
+         # Placeholder to be overridden by subclasses.
+         pass
+
+     def determine_phase(self):
+         # Placeholder to be overridden by subclasses.
+         pass
+
      def get_landmark_pixels(self):
          # Placeholder to be overridden by subclasses.
          pass
@@ -238,8 +788,8 @@ class Analysis:
          pass
 
 class Deadlift(Analysis):
-     def __init__(self, video_path):
-          super().__init__(video_path)
+     def __init__(self, video_path, **options):
+          super().__init__(video_path, **options)
 
      def initialise_results(self):
           if self.view == "left" or self.view == "right":
@@ -0,0 +1,247 @@
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+import cv2
+import numpy as np
+from errors import CustomError
+
+MODEL_PATH = 'runs/detect/barbell_detector/weights/best.pt'
+# Training arguments of the barbell detector, including the dataset and settings it was validated on.
+TRAINING_ARGUMENTS_PATH = 'runs/detect/barbell_detector/args.yaml'
+WEIGHTS_DIR = os.path.dirname(MODEL_PATH)
+# Where each backend of the barbell detector is stored. The exported backends are created from the
+# PyTorch weights by 'export'.
+BACKENDS = {
+    "pytorch": MODEL_PATH,
+    "onnx": os.path.join(WEIGHTS_DIR, "best.onnx"),
+    # The ONNX model with INT8 weights and activations, calibrated on frames from our own videos.
+    "onnx-int8": os.path.join(WEIGHTS_DIR, "best_int8.onnx"),
+    "openvino": os.path.join(WEIGHTS_DIR, "best_openvino_model"),
+}
+# Number of frames taken from each video to calibrate the INT8 model on.
+DEFAULT_CALIBRATION_FRAMES = 50
+# Grey that frames are padded with to the square input of the model, as in training.
+PADDING_COLOUR = 114
+# Number of frames that each backend is timed on.
+DEFAULT_TIMING_FRAMES = 50
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".bmp")
+# Keys of the box mAP in the validation metrics of Ultralytics, as logged during training.
+MAP50_KEY = "metrics/mAP50(B)"
+MAP50_95_KEY = "metrics/mAP50-95(B)"
+
+
+def training_arguments(path=TRAINING_ARGUMENTS_PATH):
+    # Imported here since PyYAML (a dependency of Ultralytics) is only needed to export and evaluate
+    # the backends.
+    import yaml
+    with open(path) as file:
+        return yaml.safe_load(file)
+
+
+def check_backend(backend):
+    if backend not in BACKENDS:
+        raise CustomError(f"Unknown detector backend '{backend}'. Choose from: {', '.join(BACKENDS)}.",
+                          "unknown_backend")
+
+
+# The model file (or directory) of a backend, which the barbell detector is loaded from. The
+# exported backends must have been exported first.
+def detector_path(backend):
+    check_backend(backend)
+    path = BACKENDS[backend]
+    if backend != "pytorch" and not os.path.exists(path):
+        raise CustomError(f"The '{backend}' detector has not been exported yet. Run "
+                          f"'python3 backends.py export {backend}' first.", "missing_model")
+    return path
+
+
+# Resize a BGR frame to fit a square of 'size' pixels and pad it, as the detector does, and return
+# it as the (1, 3, size, size) float RGB input of the ONNX model.
+def letterbox(frame, size):
+    height, width = frame.shape[:2]
+    scale = size / max(height, width)
+    resized = cv2.resize(frame, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_LINEAR)
+    image = np.full((size, size, 3), PADDING_COLOUR, dtype=np.uint8)
+    top, left = (size - resized.shape[0]) // 2, (size - resized.shape[1]) // 2
+    image[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    return (image.transpose(2, 0, 1)[np.newaxis] / 255).astype(np.float32)
+
+
+# 'count' frames spread evenly over each of the videos.
+def calibration_frames(video_paths, count=DEFAULT_CALIBRATION_FRAMES):
+    frames = []
+    for video_path in video_paths:
+        cap = cv2.VideoCapture(video_path)
+        try:
+            total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            for index in np.linspace(0, max(total - 1, 0), count).astype(int).tolist():
+                cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+                ret, frame = cap.read()
+                if ret:
+                    frames.append(frame)
+        finally:
+            cap.release()
+    return frames
+
+
+# Feeds the calibration frames to the ONNX Runtime quantiser, one at a time.
+class CalibrationReader:
+
+    def __init__(self, frames, input_name, size):
+        self.inputs = iter([{input_name: letterbox(frame, size)} for frame in frames])
+
+    def get_next(self):
+        return next(self.inputs, None)
+
+
+# Quantise the ONNX model to INT8, with the ranges of its activations calibrated on 'frames'.
+def quantise(onnx_path, output_path, frames, size):
+    # Imported here since ONNX Runtime is only needed to quantise the model.
+    import onnxruntime
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+    input_name = onnxruntime.InferenceSession(onnx_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    quantize_static(onnx_path, output_path, CalibrationReader(frames, input_name, size),
+                    quant_format=QuantFormat.QDQ, activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    return output_path
+
+
+# Export the PyTorch barbell detector to 'backend', at the image size it was trained at. The INT8
+# model is calibrated on frames of 'calibration_videos'.
+def export(backend, calibration_videos=(), calibration_count=DEFAULT_CALIBRATION_FRAMES):
+    check_backend(backend)
+    size = training_arguments()["imgsz"]
+    if backend == "pytorch":
+        return detector_path(backend)
+    if backend == "onnx-int8":
+        if not calibration_videos:
+            raise CustomError("The INT8 model needs at least one video to be calibrated on.", "missing_calibration")
+        frames = calibration_frames(calibration_videos, calibration_count)
+        if not frames:
+            raise CustomError("No frames could be read from the calibration videos.", "empty_video")
+        onnx_path = BACKENDS["onnx"] if os.path.exists(BACKENDS["onnx"]) else export("onnx")
+        return quantise(onnx_path, BACKENDS[backend], frames, size)
+    # Imported here so that the backends can be listed without loading Ultralytics.
+    from ultralytics import YOLO
+    model = YOLO(detector_path("pytorch"))
+    exported = model.export(format=backend, imgsz=size)
+    return str(exported) if exported else BACKENDS[backend]
+
+
+# Up to 'count' images of the 'split' of the dataset described by the data.yaml at 'data'. The
+# image directories are resolved against the dataset's 'path', or against the data.yaml itself.
+def validation_images(data, split, count=DEFAULT_TIMING_FRAMES):
+    # Imported here for the same reason as in 'training_arguments'.
+    import yaml
+    with open(data) as file:
+        dataset = yaml.safe_load(file)
+    data_dir = Path(data).parent
+    root = Path(dataset.get("path") or data_dir)
+    if not root.is_absolute():
+        root = data_dir / root
+    entries = dataset.get(split) or []
+    paths = []
+    for entry in [entries] if isinstance(entries, str) else entries:
+        directory = next((candidate for candidate in (root / entry, data_dir / entry) if candidate.is_dir()), None)
+        if directory is not None:
+            paths.extend(sorted(path for path in directory.rglob("*") if path.suffix.lower() in IMAGE_SUFFIXES))
+    images = [image for image in (cv2.imread(str(path)) for path in paths[:count]) if image is not None]
+    if not images:
+        raise CustomError(f"No '{split}' images were found for the dataset '{data}'. Pass videos to time the "
+                          f"backends on with --videos.", "missing_dataset")
+    return images
+
+
+# Mean time (in seconds) that the barbell detector takes on each of 'frames', one frame at a time,
+# from pre-processing to the parsed detections, as in the analysis.
+def time_detector(path, frames, image_size):
+    # Imported here since 'detection' depends on this module.
+    from ultralytics import YOLO
+    from detection import BarbellDetector
+    detector = BarbellDetector(YOLO(path), image_size=image_size)
+    # Warm the model up so that its initialisation is not timed.
+    detector.detect(frames[0])
+    start = time.perf_counter()
+    for frame in frames:
+        detector.detect(frame)
+    return (time.perf_counter() - start) / len(frames)
+
+
+# Validate each exported backend on the dataset and settings that the detector was validated on
+# during training, and report its mAP and the frames per second it ran at. 'data' replaces the
+# dataset recorded in the training arguments, e.g. when it lives elsewhere on this machine. The
+# backends are timed on frames of 'videos' if given, or on the validation images otherwise.
+def evaluate(backends=tuple(BACKENDS), data=None, videos=(), timing_count=DEFAULT_TIMING_FRAMES):
+    arguments = training_arguments()
+    data = data or arguments["data"]
+    if not os.path.exists(data):
+        raise CustomError(f"The validation dataset '{data}' does not exist. Pass its data.yaml with --data.",
+                          "missing_dataset")
+    from ultralytics import YOLO
+    frames = calibration_frames(videos, timing_count) if videos else validation_images(data, arguments["split"],
+                                                                                        timing_count)
+    if not frames:
+        raise CustomError("No frames could be read from the videos.", "empty_video")
+    report = {"data": data, "split": arguments["split"], "imgsz": arguments["imgsz"], "timing_frames": len(frames),
+              "backends": []}
+    for backend in backends:
+        check_backend(backend)
+        if not os.path.exists(BACKENDS[backend]):
+            report["backends"].append({"backend": backend, "exported": False})
+            continue
+        # The metrics are read by the keys that Ultralytics logs them under, which hold across its
+        # versions, rather than by attributes of the object that 'val' returns.
+        metrics = YOLO(BACKENDS[backend]).val(data=data, split=arguments["split"], imgsz=arguments["imgsz"],
+                                              iou=arguments["iou"], batch=1, plots=False, verbose=False).results_dict
+        seconds = time_detector(BACKENDS[backend], frames, arguments["imgsz"])
+        report["backends"].append({
+            "backend": backend,
+            "exported": True,
+            "map50": float(metrics[MAP50_KEY]),
+            "map50_95": float(metrics[MAP50_95_KEY]),
+            "ms_per_frame": seconds * 1000,
+            "fps": 1 / seconds if seconds > 0 else 0.0
+        })
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the barbell detector to CPU-optimised backends and compare "
+                                                 "their accuracy and speed.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_command = commands.add_parser("export", help="Export the detector to a backend.")
+    export_command.add_argument("backend", choices=[backend for backend in BACKENDS if backend != "pytorch"])
+    export_command.add_argument("--calibration-videos", nargs="+", default=[],
+                                help="Videos whose frames the INT8 model is calibrated on.")
+    export_command.add_argument("--calibration-frames", type=int, default=DEFAULT_CALIBRATION_FRAMES,
+                                help="Number of frames taken from each calibration video.")
+    report_command = commands.add_parser("report", help="Compare the mAP and frame rate of each exported backend.")
+    report_command.add_argument("--backends", nargs="+", choices=list(BACKENDS), default=list(BACKENDS))
+    report_command.add_argument("--data", default=None,
+                                help="data.yaml of the validation dataset (default: the one it was trained on).")
+    report_command.add_argument("--videos", nargs="+", default=[],
+                                help="Videos whose frames the backends are timed on (default: the validation images).")
+    report_command.add_argument("--timing-frames", type=int, default=DEFAULT_TIMING_FRAMES,
+                                help="Number of frames that each backend is timed on (taken from each video).")
+    report_command.add_argument("--output", default=None, help="File to write the report to as JSON.")
+    arguments = parser.parse_args(argv)
+    if arguments.command == "export":
+        path = export(arguments.backend, arguments.calibration_videos, arguments.calibration_frames)
+        print(f"Exported the '{arguments.backend}' detector to {path}")
+        return
+    report = evaluate(arguments.backends, arguments.data, arguments.videos, arguments.timing_frames)
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            json.dump(report, file, indent=2)
+    print(f"{'backend':>10} {'mAP50':>7} {'mAP50-95':>9} {'fps':>7}")
+    for row in report["backends"]:
+        if not row["exported"]:
+            print(f"{row['backend']:>10} {'not exported':>25}")
+            continue
+        print(f"{row['backend']:>10} {row['map50']:>7.3f} {row['map50_95']:>9.3f} {row['fps']:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
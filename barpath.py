@@ -0,0 +1,119 @@
+import math
+import numpy as np
+
+# Default number of barbell positions kept in the trajectory.
+DEFAULT_CAPACITY = 1024
+# The barbell path is considered straight if the bar does not move more than this many pixels
+# horizontally.
+DEFAULT_TOLERANCE = 50
+
+
+# Running statistics of the horizontal position of the barbell over a stretch of frames, updated
+# in constant time per detection.
+class LateralStats:
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.first_frame = self.last_frame = None
+        self.first_x = self.last_x = None
+        self.min_x = math.inf
+        self.max_x = -math.inf
+        # Running mean and sum of squared differences from the mean (Welford's algorithm).
+        self.mean_x = 0.0
+        self.m2_x = 0.0
+
+    def add(self, x, frame_index):
+        if self.count == 0:
+            self.first_frame, self.first_x = frame_index, x
+        self.last_frame, self.last_x = frame_index, x
+        self.count += 1
+        self.min_x = min(self.min_x, x)
+        self.max_x = max(self.max_x, x)
+        delta = x - self.mean_x
+        self.mean_x += delta / self.count
+        self.m2_x += delta * (x - self.mean_x)
+
+    # How far the bar moved horizontally, from its leftmost to its rightmost position.
+    def lateral_drift(self):
+        return abs(self.min_x - self.max_x) if self.count else 0.0
+
+    def report(self, tolerance):
+        return {
+            "start": self.first_frame,
+            "end": self.last_frame,
+            "detections": self.count,
+            "lateral_drift": self.lateral_drift(),
+            # Signed horizontal distance from the first to the last position.
+            "net_drift": self.last_x - self.first_x if self.count else 0.0,
+            "deviation": math.sqrt(self.m2_x / self.count) if self.count else 0.0,
+            "straight": self.lateral_drift() <= tolerance
+        }
+
+
+# Follows the path of the barbell through a video. The statistics of the whole path and of the
+# current repetition are maintained as positions are added, and the latest 'capacity' positions are
+# kept in a ring buffer, so the cost of each frame and the memory used do not grow with the length
+# of the video.
+class BarPath:
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, tolerance=DEFAULT_TOLERANCE):
+        self.tolerance = tolerance
+        # (frame index, x, y) of the latest positions, oldest first from 'head' once full.
+        self.buffer = np.zeros((max(1, capacity), 3))
+        self.head = 0
+        self.path = LateralStats()
+        self.rep = LateralStats()
+        self.reps = []
+
+    def __len__(self):
+        return self.path.count
+
+    # Forget the whole path, e.g. before the video is replayed.
+    def reset(self):
+        self.head = 0
+        self.path.reset()
+        self.rep.reset()
+        self.reps = []
+
+    def add(self, x, y, frame_index):
+        self.buffer[self.head % len(self.buffer)] = (frame_index, x, y)
+        self.head += 1
+        self.path.add(x, frame_index)
+        self.rep.add(x, frame_index)
+
+    # Add the (x, y) 'coordinates' detected in each of 'frame_indices' at once.
+    def extend(self, frame_indices, coordinates):
+        for frame_index, (x, y) in zip(np.asarray(frame_indices).tolist(), np.asarray(coordinates).tolist()):
+            self.add(x, y, frame_index)
+
+    # Close the current repetition and return its report, or None if the barbell was not detected
+    # during it.
+    def end_rep(self):
+        report = self.rep.report(self.tolerance) if self.rep.count else None
+        if report is not None:
+            self.reps.append(report)
+        self.rep.reset()
+        return report
+
+    def is_straight(self):
+        return self.path.lateral_drift() <= self.tolerance
+
+    # Whether the path of the current repetition alone is straight.
+    def rep_is_straight(self):
+        return self.rep.lateral_drift() <= self.tolerance
+
+    # The (frame index, x, y) of the latest positions, oldest first.
+    def trajectory(self):
+        if self.head <= len(self.buffer):
+            return self.buffer[:self.head].copy()
+        start = self.head % len(self.buffer)
+        return np.concatenate((self.buffer[start:], self.buffer[:start]))
+
+    def report(self):
+        report = self.path.report(self.tolerance)
+        # Include the repetition in progress, if any.
+        report["reps"] = self.reps + ([self.rep.report(self.tolerance)] if self.rep.count else [])
+        return report
@@ -0,0 +1,260 @@
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from backends import BACKENDS
+from errors import CustomError
+
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".avi", ".mkv", ".m4v"}
+EXERCISES = ("squat", "deadlift")
+
+
+# Create the analysis for an exercise. The exercise modules are imported here so that the parent
+# process, which only schedules the videos, does not load the models' dependencies.
+def create_analysis(exercise, video_path, **options):
+    if exercise == "squat":
+        import squat
+        analysis = squat.Squat(video_path, **options)
+    elif exercise == "deadlift":
+        import deadlift
+        analysis = deadlift.Deadlift(video_path, **options)
+    else:
+        raise CustomError(f"Unknown exercise '{exercise}'.", "unknown_exercise")
+    analysis.exercise = exercise
+    return analysis
+
+
+# Collect (video path, exercise) jobs from a directory of videos or from a manifest file. Each
+# line of a manifest holds a video path, optionally followed by a comma and the exercise to use
+# instead of the default one. Blank lines and lines starting with '#' are ignored.
+def collect_jobs(source, exercise):
+    source = Path(source)
+    if source.is_dir():
+        return [(str(path), exercise) for path in sorted(source.iterdir())
+                if path.suffix.lower() in VIDEO_EXTENSIONS]
+    if not source.is_file():
+        raise CustomError(f"'{source}' is neither a directory nor a manifest file.", "invalid_source")
+    jobs = []
+    for line in source.read_text().splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        path, _, line_exercise = line.partition(",")
+        path = Path(path.strip())
+        if not path.is_absolute():
+            path = source.parent / path
+        jobs.append((str(path), line_exercise.strip().lower() or exercise))
+    return jobs
+
+
+# Analyse a single video and return its report. The analysis is stopped once 'timeout' seconds
+# have passed.
+def analyse_video(video_path, exercise, timeout=None, options=None):
+    report = {
+        "video": video_path,
+        "exercise": exercise,
+        "status": "completed",
+        "error": None,
+        "view": "",
+        "weight": "",
+        "bar_path": {"straight": None, "detections": 0},
+        # Results of the whole set, and the results, barbell path and timings of each repetition.
+        "results": {},
+        "reps": [],
+        # Index of the frame at which each repetition ended.
+        "rep_ends": [],
+        # Time spent in each stage of the analysis.
+        "metrics": {},
+        # The model settings chosen for the 'target_fps' option, if it was set.
+        "tuning": None,
+        "frames": 0,
+        "seconds": 0.0,
+        "fps": 0.0
+    }
+    start = time.perf_counter()
+    timer = None
+    timed_out = threading.Event()
+    try:
+        if not os.path.isfile(video_path):
+            raise CustomError(f"The video file '{video_path}' does not exist.", "missing_video")
+        analysis = create_analysis(exercise, video_path, **(options or {}))
+        if timeout:
+            def expire():
+                timed_out.set()
+                analysis.stop()
+            timer = threading.Timer(timeout, expire)
+            timer.daemon = True
+            timer.start()
+        try:
+            analysis.process_video()
+        finally:
+            if timer is not None:
+                timer.cancel()
+        report["view"] = analysis.view
+        report["weight"] = analysis.weight["type"]
+        report["results"] = analysis.set_results()
+        report["reps"] = analysis.reps
+        report["frames"] = analysis.frame_count
+        report["rep_ends"] = analysis.rep_ends
+        report["metrics"] = analysis.metrics.summary()
+        report["tuning"] = analysis.tuning
+        if len(analysis.bar_path):
+            report["bar_path"] = analysis.bar_path.report()
+        # The timer may fire just as the video ends, in which case the analysis was complete.
+        if timed_out.is_set() and analysis.stopped_early:
+            report["status"] = "timeout"
+    except Exception as error:
+        report["status"] = "failed"
+        report["error"] = f"{type(error).__name__}: {error}"
+    report["seconds"] = time.perf_counter() - start
+    if report["seconds"] > 0:
+        report["fps"] = report["frames"] / report["seconds"]
+    return report
+
+
+# Convert NumPy scalars (e.g. angles) to plain Python values when writing reports.
+def to_json(value):
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def write_json(path, data):
+    with open(path, "w") as file:
+        json.dump(data, file, indent=2, default=to_json)
+
+
+# Analyse every job in a pool of worker processes and write one report per video, plus a summary,
+# to 'output_dir'.
+def run_batch(jobs, output_dir, workers=None, timeout=None, options=None):
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+
+    # Name each report after its video, numbering videos that share the same name.
+    report_names = []
+    for video_path, _ in jobs:
+        name = Path(video_path).stem
+        candidate, number = name, 1
+        while f"{candidate}.json" in report_names:
+            number += 1
+            candidate = f"{name}_{number}"
+        report_names.append(f"{candidate}.json")
+
+    start = time.perf_counter()
+    reports = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(analyse_video, video_path, exercise, timeout, options): report_name
+                   for (video_path, exercise), report_name in zip(jobs, report_names)}
+        for future in as_completed(futures):
+            report = future.result()
+            report["report"] = futures[future]
+            write_json(output_dir / futures[future], report)
+            reports.append(report)
+            print(f"[{len(reports)}/{len(jobs)}] {report['video']}: {report['status']} "
+                  f"({report['frames']} frames, {report['fps']:.1f} fps)")
+    wall_seconds = time.perf_counter() - start
+
+    total_frames = sum(report["frames"] for report in reports)
+    summary = {
+        "videos": len(reports),
+        "completed": sum(report["status"] == "completed" for report in reports),
+        "timed_out": sum(report["status"] == "timeout" for report in reports),
+        "failed": sum(report["status"] == "failed" for report in reports),
+        "workers": workers,
+        "wall_seconds": wall_seconds,
+        "total_frames": total_frames,
+        # Throughput of the whole pool.
+        "frames_per_second": total_frames / wall_seconds if wall_seconds > 0 else 0.0,
+        "videos_per_minute": 60 * len(reports) / wall_seconds if wall_seconds > 0 else 0.0,
+        # Throughput of a single worker.
+        "mean_video_fps": sum(report["fps"] for report in reports) / len(reports) if reports else 0.0,
+        "reports": sorted(report["report"] for report in reports)
+    }
+    write_json(output_dir / "summary.json", summary)
+    return summary
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse many videos without the GUI.")
+    parser.add_argument("source", help="Directory of videos or manifest file listing one video per line.")
+    parser.add_argument("--exercise", required=True, choices=EXERCISES, help="Exercise performed in the videos.")
+    parser.add_argument("--output", default="reports", help="Directory to write the reports to.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: CPU count).")
+    parser.add_argument("--timeout", type=float, default=None, help="Maximum number of seconds per video.")
+    parser.add_argument("--cache", action="store_true",
+                        help="Reuse the landmarks and detections cached by previous analyses of the same videos.")
+    parser.add_argument("--cache-dir", default=None, help="Directory of the cache.")
+    parser.add_argument("--pose-complexity", type=int, default=None, choices=(0, 1, 2),
+                        help="Pose model: 0 (lite), 1 (full, default) or 2 (heavy).")
+    parser.add_argument("--pose-scale", type=float, default=None,
+                        help="Factor that frames are downscaled by for the pose model.")
+    parser.add_argument("--detector-size", type=int, default=None,
+                        help="Size that frames are resized to for the barbell detector.")
+    parser.add_argument("--target-fps", type=float, default=None,
+                        help="Choose the most accurate model settings that hold this frame rate.")
+    parser.add_argument("--concurrent-inference", action="store_true",
+                        help="Run the barbell detector and the pose model on each frame at the same time.")
+    parser.add_argument("--torch-threads", type=int, default=None,
+                        help="Threads used by the barbell detector in each worker process.")
+    parser.add_argument("--opencv-threads", type=int, default=None, help="Threads used by OpenCV in each worker process.")
+    parser.add_argument("--detector-backend", default=None, choices=list(BACKENDS),
+                        help="Runtime of the barbell detector (default: pytorch).")
+    parser.add_argument("--detection-batch-size", type=int, default=None,
+                        help="Number of frames passed to the barbell detector at once.")
+    parser.add_argument("--detection-stride", type=int, default=None,
+                        help="Run the barbell detector every this many frames and track the barbell in between.")
+    parser.add_argument("--adaptive-stride", action="store_true",
+                        help="Adapt the detection stride to how well the tracking agrees with the detector.")
+    parser.add_argument("--max-detection-stride", type=int, default=None,
+                        help="Largest stride that the adaptive stride grows to.")
+    parser.add_argument("--region-of-interest", action="store_true",
+                        help="Search for the barbell around the lifter's hands and shoulders only.")
+    parser.add_argument("--region-margin", type=float, default=None,
+                        help="Margin added around the region of interest, as a fraction of its size.")
+    parser.add_argument("--smoothing", action="store_true",
+                        help="Smooth the landmarks from one frame to the next before they are analysed.")
+    parser.add_argument("--smoothing-min-cutoff", type=float, default=None,
+                        help="Cutoff frequency (Hz) of the landmark smoothing when the lifter is still.")
+    parser.add_argument("--smoothing-beta", type=float, default=None,
+                        help="How much the smoothing cutoff rises with the speed of each landmark.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    jobs = collect_jobs(arguments.source, arguments.exercise)
+    if not jobs:
+        print(f"No videos found in '{arguments.source}'.")
+        return
+    options = {"cache": True, "cache_dir": arguments.cache_dir} if arguments.cache else {}
+    for option, value in (("pose_model_complexity", arguments.pose_complexity),
+                          ("pose_input_scale", arguments.pose_scale),
+                          ("detector_image_size", arguments.detector_size),
+                          ("target_fps", arguments.target_fps),
+                          ("concurrent_inference", arguments.concurrent_inference or None),
+                          ("torch_threads", arguments.torch_threads),
+                          ("opencv_threads", arguments.opencv_threads),
+                          ("detector_backend", arguments.detector_backend),
+                          ("detection_batch_size", arguments.detection_batch_size),
+                          ("detection_stride", arguments.detection_stride),
+                          ("adaptive_stride", arguments.adaptive_stride or None),
+                          ("max_detection_stride", arguments.max_detection_stride),
+                          ("region_of_interest", arguments.region_of_interest or None),
+                          ("region_margin", arguments.region_margin),
+                          ("smoothing", arguments.smoothing or None),
+                          ("smoothing_min_cutoff", arguments.smoothing_min_cutoff),
+                          ("smoothing_beta", arguments.smoothing_beta)):
+        if value is not None:
+            options[option] = value
+    summary = run_batch(jobs, arguments.output, arguments.workers, arguments.timeout, options)
+    print(f"Analysed {summary['videos']} videos in {summary['wall_seconds']:.1f}s "
+          f"({summary['frames_per_second']:.1f} frames/s, {summary['failed']} failed, "
+          f"{summary['timed_out']} timed out).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+import cv2
+import numpy as np
+from cache import to_landmark_list
+from helpers import benchmark as benchmark_helpers
+from landmarks import JOINTS, LANDMARK_COUNT, VISIBILITY
+from models import registry
+
+# Frame rate of the synthetic videos, and the number of frames of one repetition in them.
+SYNTHETIC_FPS = 30
+REP_FRAMES = 60
+DEFAULT_RESOLUTIONS = ("640x360", "1280x720")
+DEFAULT_FRAMES = (60, 240)
+DEFAULT_EXERCISES = ("squat", "deadlift")
+# A stage that became this much slower than in the baseline (10%) is reported as a regression.
+DEFAULT_THRESHOLD = 0.1
+# Times below this many milliseconds per frame are too short to compare reliably.
+MIN_COMPARABLE_MS = 0.01
+
+
+# Position of the centre of the barbell in frame 'index' of a synthetic video, as fractions of the
+# frame width and height. The bar moves down and up once per repetition and sways slightly.
+def barbell_position(index):
+    phase = 2 * math.pi * index / REP_FRAMES
+    return 0.5 + 0.01 * math.sin(phase / 2), 0.25 + 0.15 * (1 - math.cos(phase))
+
+
+# Write a synthetic video of a barbell moving through repetitions in front of a textured
+# background. The same arguments always produce the same frames.
+def make_video(path, width, height, frames, fps=SYNTHETIC_FPS):
+    background = np.random.default_rng(0).integers(60, 120, size=(height, width, 1), dtype=np.uint8).repeat(3, axis=2)
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    try:
+        for index in range(frames):
+            frame = background.copy()
+            x, y = barbell_position(index)
+            x, y = int(x * width), int(y * height)
+            # The lifter, from the bar down to the floor.
+            cv2.line(frame, (x, y), (width // 2, int(0.9 * height)), (200, 200, 200), max(2, width // 100))
+            cv2.rectangle(frame, (x - width * 3 // 20, y - height // 60), (x + width * 3 // 20, y + height // 60),
+                          (0, 0, 255), -1)
+            writer.write(frame)
+    finally:
+        writer.release()
+    return path
+
+
+# The (x, y, width, height) box of the red barbell in a frame, in pixels, or None if it is not in
+# the frame. 'red' is the index of the red channel (2 in BGR frames, 0 in RGB frames).
+def find_barbell(image, red=2, step=4):
+    sampled = image[::step, ::step]
+    mask = (sampled[..., red] > 180) & (sampled[..., 1] < 90)
+    rows, columns = np.flatnonzero(mask.any(axis=1)), np.flatnonzero(mask.any(axis=0))
+    if not len(rows):
+        return None
+    top, bottom = rows[0] * step, (rows[-1] + 1) * step
+    left, right = columns[0] * step, (columns[-1] + 1) * step
+    return (left + right) / 2, (top + bottom) / 2, right - left, bottom - top
+
+
+class StubBox:
+
+    def __init__(self, x, y, width, height, confidence, class_id):
+        self.xywh = np.array([[x, y, width, height]])
+        self.conf = np.array([confidence])
+        self.cls = np.array([class_id])
+
+
+class StubResult:
+
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+# Stands in for the YOLO model: finds the red barbell of the synthetic videos, so that the
+# benchmarks run without the model weights or a GPU.
+class StubDetectorModel:
+
+    def __call__(self, frames, verbose=False, imgsz=None):
+        if not isinstance(frames, list):
+            frames = [frames]
+        results = []
+        for frame in frames:
+            box = find_barbell(frame)
+            results.append(StubResult([] if box is None else [StubBox(*box, 0.9, 0)]))
+        return results
+
+
+class StubPoseResult:
+
+    def __init__(self, pose_landmarks):
+        self.pose_landmarks = pose_landmarks
+
+
+# Stands in for the MediaPipe Pose graph: places a lifter seen from the left under the red barbell
+# of the synthetic videos, squatting deeper the lower the bar is.
+class StubPose:
+
+    def process(self, image):
+        box = find_barbell(image, red=0)
+        if box is None:
+            return StubPoseResult(None)
+        height, width = image.shape[:2]
+        x, y = box[0] / width, box[1] / height
+        depth = min(max((y - 0.25) / 0.3, 0.0), 1.0)
+        left = {
+            "left_shoulder": (x, y + 0.02),
+            "left_wrist": (x, y + 0.03),
+            "left_hip": (0.48 - 0.12 * depth, 0.55 + 0.15 * depth),
+            "left_knee": (0.52 + 0.08 * depth, 0.72 - 0.05 * depth),
+            "left_ankle": (0.5, 0.88),
+            "left_heel": (0.47, 0.9),
+            "left_toes": (0.56, 0.9)
+        }
+        landmarks = np.full((LANDMARK_COUNT, 4), 0.9, dtype=np.float32)
+        landmarks[:, :2] = 0.5
+        landmarks[:, 2] = 0.0
+        for name, (joint_x, joint_y) in left.items():
+            landmarks[JOINTS[name], :2] = joint_x, joint_y
+            landmarks[JOINTS["right" + name[4:]], :2] = joint_x + 0.01, joint_y
+        # The far knee is hidden from a side view.
+        landmarks[JOINTS["right_knee"], VISIBILITY] = 0.4
+        return StubPoseResult(to_landmark_list(landmarks))
+
+    def reset(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def use_stub_backends():
+    registry.use_backend("detector", StubDetectorModel)
+    registry.use_backend("pose", StubPose)
+
+
+# Takes the place of the GUI: renders the annotations of every analysed frame, as the analysis
+# window would.
+class RenderingSink:
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.rendered = None
+
+    def submit(self, packet):
+        with self.metrics.time("render"):
+            if self.rendered is None or self.rendered.shape != packet.frame.shape:
+                self.rendered = np.empty_like(packet.frame)
+            packet.output = packet.overlay.render(packet.frame, out=self.rendered)
+        packet.release()
+
+
+# Analyse a video 'repeat' times and keep the fastest run: its frame rate and the time per frame
+# of each stage.
+def run_case(video_path, exercise, repeat):
+    # Imported here since the exercise modules depend on the models.
+    from batch import create_analysis
+    best = None
+    for _ in range(repeat):
+        analysis = create_analysis(exercise, str(video_path))
+        start = time.perf_counter()
+        analysis.process_video(RenderingSink(analysis.metrics))
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best["seconds"]:
+            summary = analysis.metrics.summary()
+            stages = summary["stages"]
+            best = {
+                "frames": analysis.frame_count,
+                "seconds": seconds,
+                "fps": analysis.frame_count / seconds if seconds > 0 else 0.0,
+                "stages": {stage: {key: timing[key] for key in ("frames", "mean_ms", "p50_ms", "p95_ms")}
+                           for stage, timing in stages.items()},
+                # Frame-sized arrays allocated over the run, which stays flat as the video gets
+                # longer if the buffers are reused.
+                "frame_buffers_allocated": summary["counters"].get("frame_buffers_allocated", 0)
+            }
+    return best
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__
+    }
+
+
+# Time the whole analysis and each of its stages on synthetic videos of every combination of
+# 'resolutions' ("WIDTHxHEIGHT") and lengths in 'frames', for every exercise. The videos are
+# written to 'videos_dir' (reused if they exist) or to a temporary directory.
+def run_suite(resolutions=DEFAULT_RESOLUTIONS, frames=DEFAULT_FRAMES, exercises=DEFAULT_EXERCISES, repeat=3,
+              backend="stub", videos_dir=None):
+    if backend == "stub":
+        use_stub_backends()
+    temporary = tempfile.TemporaryDirectory() if videos_dir is None else None
+    directory = Path(videos_dir or temporary.name)
+    directory.mkdir(parents=True, exist_ok=True)
+    cases = {}
+    try:
+        for resolution in resolutions:
+            width, height = map(int, resolution.lower().split("x"))
+            for length in frames:
+                video_path = directory / f"synthetic_{width}x{height}_{length}.mp4"
+                if not video_path.is_file():
+                    make_video(video_path, width, height, length)
+                for exercise in exercises:
+                    name = f"{exercise}_{width}x{height}_{length}"
+                    cases[name] = run_case(video_path, exercise, repeat)
+                    print(f"{name}: {cases[name]['fps']:.1f} fps")
+    finally:
+        if temporary is not None:
+            temporary.cleanup()
+        if backend == "stub":
+            registry.use_backend("detector")
+            registry.use_backend("pose")
+            registry.clear()
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "backend": backend,
+        "repeat": repeat,
+        "environment": environment(),
+        "cases": cases,
+        # Microseconds per frame of the geometry helpers.
+        "helpers": benchmark_helpers(repeat=repeat)
+    }
+
+
+# Compare the time per frame of every case and stage, and of the geometry helpers, with a
+# baseline. Each row holds the baseline and current times and whether the current time is more
+# than 'threshold' slower.
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    rows = []
+
+    def add(name, before, after):
+        if before < MIN_COMPARABLE_MS or after < MIN_COMPARABLE_MS:
+            return
+        ratio = after / before
+        rows.append({"name": name, "baseline": before, "current": after, "change": ratio - 1,
+                     "regression": ratio > 1 + threshold})
+
+    for case, result in current["cases"].items():
+        base = baseline["cases"].get(case)
+        if base is None:
+            continue
+        if base["fps"] > 0 and result["fps"] > 0:
+            add(f"{case} total", 1000 / base["fps"], 1000 / result["fps"])
+        for stage, timing in result["stages"].items():
+            if stage in base["stages"]:
+                add(f"{case} {stage}", base["stages"][stage]["mean_ms"], timing["mean_ms"])
+    for name, microseconds in current.get("helpers", {}).items():
+        if name in baseline.get("helpers", {}):
+            add(f"helpers {name}", baseline["helpers"][name] / 1000, microseconds / 1000)
+    return rows
+
+
+def print_comparison(rows, baseline, current):
+    if baseline.get("backend") != current.get("backend"):
+        print(f"Warning: the baseline used the '{baseline.get('backend')}' backend and the current run "
+              f"'{current.get('backend')}'.")
+    if baseline.get("environment") != current.get("environment"):
+        print("Warning: the baseline was recorded in a different environment.")
+    width = max((len(row["name"]) for row in rows), default=0)
+    print(f"{'':<{width}} {'baseline':>10} {'current':>10} {'change':>8}")
+    for row in rows:
+        flag = "  SLOWER" if row["regression"] else ""
+        print(f"{row['name']:<{width}} {row['baseline']:>8.3f}ms {row['current']:>8.3f}ms {row['change']:>+8.1%}{flag}")
+    regressions = sum(row["regression"] for row in rows)
+    print(f"{regressions} of {len(rows)} timings regressed.")
+    return regressions
+
+
+def read_json(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the analysis on synthetic videos.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run = subparsers.add_parser("run", help="Run the benchmarks and write the results as a JSON baseline.")
+    run.add_argument("--output", default="benchmark.json", help="File to write the results to.")
+    run.add_argument("--backend", default="stub", choices=("stub", "models"),
+                     help="Use deterministic stand-ins for the models (default), or the models themselves.")
+    run.add_argument("--resolutions", nargs="+", default=DEFAULT_RESOLUTIONS, help="e.g. 640x360 1280x720")
+    run.add_argument("--frames", nargs="+", type=int, default=DEFAULT_FRAMES, help="Lengths of the videos.")
+    run.add_argument("--exercises", nargs="+", default=DEFAULT_EXERCISES, choices=DEFAULT_EXERCISES)
+    run.add_argument("--repeat", type=int, default=3, help="Runs per case; the fastest is kept.")
+    run.add_argument("--videos", default=None, help="Directory to keep the synthetic videos in.")
+    run.add_argument("--compare", default=None, help="Baseline to compare the results with.")
+    run.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    comparison = subparsers.add_parser("compare", help="Compare two sets of results.")
+    comparison.add_argument("baseline")
+    comparison.add_argument("current")
+    comparison.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    if arguments.command == "run":
+        current = run_suite(arguments.resolutions, arguments.frames, arguments.exercises, arguments.repeat,
+                            arguments.backend, arguments.videos)
+        with open(arguments.output, "w") as file:
+            json.dump(current, file, indent=2)
+        baseline_path = arguments.compare
+    else:
+        current = read_json(arguments.current)
+        baseline_path = arguments.baseline
+    if baseline_path:
+        baseline = read_json(baseline_path)
+        # Exit with an error if anything became slower, e.g. to fail a CI job.
+        if print_comparison(compare(baseline, current, arguments.threshold), baseline, current):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import threading
+import numpy as np
+
+# Maximum number of idle buffers of each shape kept for reuse.
+DEFAULT_CAPACITY = 32
+
+
+# Hands out frame-sized arrays and takes them back once they are no longer used, so that frames
+# are decoded, resized and rendered into the same few buffers over and over instead of into newly
+# allocated arrays. Each new allocation is counted in 'metrics' (as 'frame_buffers_allocated'), so
+# that a steady-state analysis can be confirmed to allocate no new frames.
+class BufferPool:
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, metrics=None):
+        self.capacity = capacity
+        self.metrics = metrics
+        self.lock = threading.Lock()
+        # Idle buffers by (shape, dtype).
+        self.idle = {}
+        self.allocated = 0
+        self.reused = 0
+
+    def acquire(self, shape, dtype=np.uint8):
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self.lock:
+            buffers = self.idle.get(key)
+            if buffers:
+                self.reused += 1
+                return buffers.pop()
+            self.allocated += 1
+        self.count_allocation()
+        return np.empty(shape, dtype=dtype)
+
+    def release(self, buffer):
+        key = (buffer.shape, buffer.dtype.str)
+        with self.lock:
+            buffers = self.idle.setdefault(key, [])
+            if len(buffers) < self.capacity:
+                buffers.append(buffer)
+
+    # Count a frame-sized array that had to be allocated outside of the pool.
+    def count_allocation(self):
+        if self.metrics is not None:
+            self.metrics.count("frame_buffers_allocated")
+
+
+# A buffer of a single consumer that is reused for as long as the frames keep the same shape, e.g.
+# the resized and colour-converted input of the pose model.
+class ScratchBuffer:
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.buffer = None
+
+    def get(self, shape, dtype=np.uint8):
+        if self.buffer is None or self.buffer.shape != tuple(shape) or self.buffer.dtype != dtype:
+            if self.buffer is not None:
+                self.pool.release(self.buffer)
+            self.buffer = self.pool.acquire(shape, dtype)
+        return self.buffer
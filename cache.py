@@ -0,0 +1,198 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import time
+from pathlib import Path
+import numpy as np
+from mediapipe.framework.formats import landmark_pb2
+from detection import BARBELL_CLASS, BARBELL_CONFIDENCE
+from landmarks import LANDMARK_COUNT
+
+# Increment when the layout of the cache entries changes, so that older entries are ignored.
+CACHE_FORMAT_VERSION = 2
+DEFAULT_CACHE_DIR = Path(os.environ.get("REFORM_CACHE_DIR", Path.home() / ".cache" / "reform"))
+DEFAULT_MAX_BYTES = 1024 ** 3
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Hash a model stored as a single file, or as a directory of files (e.g. an OpenVINO model), so that
+# the entries cached with it are invalidated when any of its files change.
+def hash_model(path):
+    if not os.path.isdir(path):
+        return hash_file(path)
+    digest = hashlib.sha256()
+    for file_path in sorted(Path(path).rglob("*")):
+        if file_path.is_file():
+            digest.update(file_path.relative_to(path).as_posix().encode())
+            digest.update(hash_file(file_path).encode())
+    return digest.hexdigest()
+
+
+def to_landmark_list(landmarks):
+    return landmark_pb2.NormalizedLandmarkList(landmark=[
+        landmark_pb2.NormalizedLandmark(x=x, y=y, z=z, visibility=visibility)
+        for x, y, z, visibility in landmarks.tolist()
+    ])
+
+
+# Collects the pose landmarks and barbell detections of each frame of a video as it is analysed.
+class Recording:
+
+    def __init__(self):
+        self.landmarks = []
+        self.detections = []
+
+    # Add the (33, 4) landmarks (or None if no pose was detected) and the detections of a frame.
+    def add(self, landmarks, detections):
+        self.landmarks.append(landmarks)
+        self.detections.append(detections)
+
+    def __len__(self):
+        return len(self.detections)
+
+
+# The cached pose landmarks and barbell detections of every frame of a video.
+class CacheEntry:
+
+    def __init__(self, landmarks, has_pose, boxes, box_offsets):
+        # (frames, 33, 4) landmarks, only valid for frames where 'has_pose' is set.
+        self.landmarks = landmarks
+        self.has_pose = has_pose
+        # Detections of every frame, where the detections of frame i are
+        # boxes[box_offsets[i]:box_offsets[i + 1]].
+        self.boxes = boxes
+        self.box_offsets = box_offsets
+
+    def __len__(self):
+        return len(self.has_pose)
+
+    @classmethod
+    def from_recording(cls, recording):
+        landmarks = np.zeros((len(recording), LANDMARK_COUNT, 4), dtype=np.float32)
+        has_pose = np.zeros(len(recording), dtype=bool)
+        for i, frame_landmarks in enumerate(recording.landmarks):
+            if frame_landmarks is not None:
+                landmarks[i] = frame_landmarks
+                has_pose[i] = True
+        box_offsets = np.cumsum([0] + [len(detections) for detections in recording.detections], dtype=np.int32)
+        # Boxes are kept in double precision so that the barbell path is exactly the same as when the
+        # video was first analysed.
+        boxes = np.array([detection for detections in recording.detections for detection in detections],
+                         dtype=np.float64).reshape(-1, 6)
+        return cls(landmarks, has_pose, boxes, box_offsets)
+
+    def pose_landmarks(self, index):
+        return to_landmark_list(self.landmarks[index]) if self.has_pose[index] else None
+
+    def detections(self, index):
+        return [(x, y, width, height, confidence, int(class_id)) for x, y, width, height, confidence, class_id
+                in self.boxes[self.box_offsets[index]:self.box_offsets[index + 1]].tolist()]
+
+    # The frame index and (x, y) coordinates of every barbell detection, in frame order.
+    def barbell_coordinates(self):
+        frames = np.repeat(np.arange(len(self)), np.diff(self.box_offsets))
+        barbells = (self.boxes[:, 4] > BARBELL_CONFIDENCE) & (self.boxes[:, 5] == BARBELL_CLASS)
+        return frames[barbells], self.boxes[barbells, :2]
+
+
+# Stores the pose landmarks and barbell detections of analysed videos on disk, keyed by the content
+# of the video and by the versions of the models and settings that produced them. The least
+# recently used entries are evicted once the cache grows past 'max_bytes'.
+class LandmarkCache:
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = Path(directory or DEFAULT_CACHE_DIR)
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(video_path, config):
+        digest = hashlib.sha256(hash_file(video_path).encode())
+        digest.update(json.dumps({"format": CACHE_FORMAT_VERSION, **config}, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def path(self, key):
+        return self.directory / f"{key}.npz"
+
+    def load(self, key):
+        path = self.path(key)
+        try:
+            with np.load(path) as data:
+                entry = CacheEntry(data["landmarks"], data["has_pose"], data["boxes"], data["box_offsets"])
+        except (OSError, KeyError, ValueError):
+            return None
+        # Mark the entry as recently used.
+        os.utime(path)
+        return entry
+
+    def store(self, key, recording, video_path=""):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entry = CacheEntry.from_recording(recording)
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, landmarks=entry.landmarks, has_pose=entry.has_pose, boxes=entry.boxes,
+                            box_offsets=entry.box_offsets, video=np.array(str(video_path)))
+        # Write to a temporary file first so that a partially written entry is never loaded.
+        temporary_path = self.path(key).with_suffix(".tmp")
+        temporary_path.write_bytes(buffer.getvalue())
+        os.replace(temporary_path, self.path(key))
+        self.evict()
+
+    def entries(self):
+        if not self.directory.is_dir():
+            return []
+        return sorted(self.directory.glob("*.npz"), key=lambda path: path.stat().st_mtime)
+
+    def size(self):
+        return sum(path.stat().st_size for path in self.entries())
+
+    # Remove the least recently used entries until the cache fits in 'max_bytes'.
+    def evict(self):
+        entries = self.entries()
+        total = sum(path.stat().st_size for path in entries)
+        for path in entries:
+            if total <= self.max_bytes:
+                break
+            total -= path.stat().st_size
+            path.unlink(missing_ok=True)
+
+    def clear(self):
+        for path in self.entries():
+            path.unlink(missing_ok=True)
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or clear the landmark and detection cache.")
+    parser.add_argument("command", choices=("info", "list", "clear"))
+    parser.add_argument("--dir", default=None, help=f"Cache directory (default: {DEFAULT_CACHE_DIR}).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    cache = LandmarkCache(arguments.dir)
+    if arguments.command == "info":
+        entries = cache.entries()
+        print(f"{cache.directory}: {len(entries)} entries, {cache.size() / 1024 ** 2:.1f} MB "
+              f"(limit {cache.max_bytes / 1024 ** 2:.0f} MB)")
+    elif arguments.command == "list":
+        for path in reversed(cache.entries()):
+            with np.load(path) as data:
+                frames, video = len(data["has_pose"]), str(data["video"])
+            last_used = time.strftime("%Y-%m-%d %H:%M", time.localtime(path.stat().st_mtime))
+            print(f"{path.stem[:12]}  {frames:>6} frames  {path.stat().st_size / 1024:>8.1f} KB  {last_used}  {video}")
+    elif arguments.command == "clear":
+        count = len(cache.entries())
+        cache.clear()
+        print(f"Removed {count} entries from {cache.directory}.")
+
+
+if __name__ == "__main__":
+    main()
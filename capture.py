@@ -0,0 +1,134 @@
+import argparse
+import json
+import os
+import threading
+import time
+import cv2
+import numpy as np
+from errors import CustomError
+from pipeline import POLL_INTERVAL
+
+# Frame rate assumed when a source does not report one.
+DEFAULT_FPS = 30.0
+
+
+# A camera is given by its device index and a stream by its URL (e.g. 'rtsp://...').
+def parse_source(value):
+    value = str(value).strip()
+    return int(value) if value.isdigit() else value
+
+
+def is_live_source(source):
+    return isinstance(source, int) or "://" in str(source)
+
+
+# Reads a camera, stream or video file on its own thread and keeps only the newest frame, so that
+# frames never wait in a buffer while the analysis is busy: a frame that is not taken before the
+# next one arrives is dropped. A video file is played back at its own frame rate as a stand-in for
+# a camera.
+class LatestFrameCapture:
+
+    def __init__(self, source, clock=time.perf_counter):
+        self.source = source
+        self.clock = clock
+        self.capture = cv2.VideoCapture(source)
+        if not self.capture.isOpened():
+            raise CustomError(f"Could not open the video source '{source}'.", "invalid_source")
+        # Keep the driver's own buffer as short as possible.
+        self.capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS
+        self.simulated = not is_live_source(source)
+        self.condition = threading.Condition()
+        # (sequence number, frame, capture time) of the newest frame, or None once it is taken.
+        self.latest = None
+        self.captured_frames = 0
+        self.dropped_frames = 0
+        self.finished = False
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="capture", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+        started = self.clock()
+        try:
+            while not self.stop_event.is_set():
+                if self.simulated:
+                    # Wait until the frame would have been captured by a camera.
+                    delay = started + self.captured_frames / self.fps - self.clock()
+                    if delay > 0 and self.stop_event.wait(delay):
+                        break
+                ret, frame = self.capture.read()
+                if not ret:
+                    break
+                with self.condition:
+                    if self.latest is not None:
+                        self.dropped_frames += 1
+                    self.latest = (self.captured_frames, frame, self.clock())
+                    self.captured_frames += 1
+                    self.condition.notify()
+        finally:
+            self.capture.release()
+            with self.condition:
+                self.finished = True
+                self.condition.notify()
+
+    # Wait for the next frame and return its (sequence number, frame, capture time), or None once the
+    # source has ended or the capture was stopped.
+    def read(self):
+        with self.condition:
+            while self.latest is None and not self.finished and not self.stop_event.is_set():
+                self.condition.wait(POLL_INTERVAL)
+            latest, self.latest = self.latest, None
+            return latest
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join()
+
+
+# Analyse a live source without the GUI for 'seconds' (or until the source ends) and report the
+# delay from the capture of each frame to its results.
+def delay_report(source, exercise, seconds=None):
+    # Imported here since the exercise modules depend on the models.
+    from batch import create_analysis
+    analysis = create_analysis(exercise, source, live=True)
+    timer = None
+    if seconds:
+        timer = threading.Timer(seconds, analysis.stop)
+        timer.daemon = True
+        timer.start()
+    try:
+        analysis.process_video()
+    finally:
+        if timer is not None:
+            timer.cancel()
+    delays = np.array(analysis.delays) * 1000
+    capture = analysis.capture
+    return {"source": str(source), "simulated": capture.simulated if capture else None,
+            "captured_frames": capture.captured_frames if capture else 0,
+            "dropped_frames": capture.dropped_frames if capture else 0,
+            "delay_samples": len(delays),
+            "median_delay_ms": float(np.median(delays)) if len(delays) else 0.0,
+            "p95_delay_ms": float(np.percentile(delays, 95)) if len(delays) else 0.0,
+            "max_delay_ms": float(np.max(delays)) if len(delays) else 0.0}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the delay from capture to feedback of a live analysis. "
+                                                 "A video file is played back in real time as a stand-in for a camera.")
+    parser.add_argument("source", help="Camera index, stream URL or video file.")
+    parser.add_argument("--exercise", required=True, choices=("squat", "deadlift"))
+    parser.add_argument("--seconds", type=float, default=None, help="Stop after this many seconds.")
+    arguments = parser.parse_args(argv)
+    source = parse_source(arguments.source)
+    if not is_live_source(source) and not os.path.isfile(source):
+        raise CustomError(f"The video file '{source}' does not exist.", "missing_video")
+    print(json.dumps(delay_report(source, arguments.exercise, arguments.seconds), indent=2))
+
+
+if __name__ == "__main__":
+    main()
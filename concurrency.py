@@ -0,0 +1,137 @@
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+import torch
+from detection import BarbellDetector
+from errors import CustomError
+from tuning import DEFAULT_SAMPLE_SECONDS, PoseInput, sample_frames
+
+
+# Limit the threads that the barbell detector (PyTorch) and OpenCV each use within one process, so
+# that running the models at the same time, or several analyses side by side, does not oversubscribe
+# the cores. None leaves a library at its own default. The limits apply to the whole process.
+def configure_threads(torch_threads=None, opencv_threads=None):
+    if torch_threads is not None:
+        torch.set_num_threads(torch_threads)
+    if opencv_threads is not None:
+        cv2.setNumThreads(opencv_threads)
+    return {"torch": torch.get_num_threads(), "opencv": cv2.getNumThreads()}
+
+
+# Runs the barbell detector on a frame on a worker thread while the calling thread runs the pose
+# model on the same frame. Both models release the GIL while they run, so the latency of a frame is
+# that of the slower model rather than the sum of the two.
+class ConcurrentInference:
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="detection")
+
+    # Call 'detect()' and 'estimate_pose()' at the same time and return both of their results.
+    def __call__(self, detect, estimate_pose):
+        detection = self.executor.submit(detect)
+        try:
+            pose = estimate_pose()
+        finally:
+            # Wait for the detector even if the pose model failed, so that it never outlives the frame.
+            detections = detection.result()
+        return detections, pose
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def latency_summary(latencies):
+    latencies = np.array(latencies) * 1000
+    return {"mean_ms": float(np.mean(latencies)), "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)), "max_ms": float(np.max(latencies))}
+
+
+# Time the barbell detector and the pose model on each of 'frames', one after the other and at the
+# same time, and summarise the latency of each frame both ways.
+def compare_latency(frames, registry, pose_settings, pose_input_scale=1.0, detector_image_size=None):
+    with registry.detector_model() as model, registry.pose(**pose_settings) as pose, \
+            ConcurrentInference() as inference:
+        detector = BarbellDetector(model, image_size=detector_image_size)
+        pose_input = PoseInput(pose_input_scale)
+        # Warm both models up on the first frame.
+        detector.detect(frames[0])
+        pose.process(pose_input(frames[0]))
+        sequential = []
+        concurrent = []
+        for frame in frames:
+            start = time.perf_counter()
+            detector.detect(frame)
+            pose.process(pose_input(frame))
+            sequential.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            inference(lambda: detector.detect(frame), lambda: pose.process(pose_input(frame)))
+            concurrent.append(time.perf_counter() - start)
+    sequential, concurrent = latency_summary(sequential), latency_summary(concurrent)
+    return {"frames": len(frames), "sequential": sequential, "concurrent": concurrent,
+            "speedup": sequential["mean_ms"] / concurrent["mean_ms"] if concurrent["mean_ms"] > 0 else 0.0}
+
+
+# Compare the per-frame latency of the models one after the other and at the same time on the first
+# seconds of a video, and the frame rate of the whole analysis in each mode.
+def evaluate(video_path, exercise, torch_threads=None, opencv_threads=None, seconds=DEFAULT_SAMPLE_SECONDS):
+    # Imported here since the exercise modules depend on the models.
+    from batch import create_analysis
+    from models import registry
+    threads = configure_threads(torch_threads, opencv_threads)
+    frames = sample_frames(video_path, seconds)
+    if not frames:
+        raise CustomError(f"Could not read any frames from '{video_path}'.", "invalid_video")
+    reference = create_analysis(exercise, video_path)
+    report = {"video": video_path, "exercise": exercise, "threads": threads,
+              "models": compare_latency(frames, registry, reference.pose_settings), "analysis": {}}
+    for mode, concurrent in (("sequential", False), ("concurrent", True)):
+        analysis = create_analysis(exercise, video_path, concurrent_inference=concurrent)
+        start = time.perf_counter()
+        analysis.process_video()
+        elapsed = time.perf_counter() - start
+        stages = analysis.metrics.summary()["stages"]
+        report["analysis"][mode] = {
+            "frames": analysis.frame_count,
+            "fps": analysis.frame_count / elapsed if elapsed > 0 else 0.0,
+            "stages": {stage: {key: timing[key] for key in ("mean_ms", "p50_ms", "p95_ms")}
+                       for stage, timing in stages.items()}
+        }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the per-frame latency of running the barbell detector and "
+                                                 "the pose model one after the other and at the same time.")
+    parser.add_argument("video")
+    parser.add_argument("--exercise", required=True, choices=("squat", "deadlift"))
+    parser.add_argument("--torch-threads", type=int, default=None, help="Threads used by the barbell detector.")
+    parser.add_argument("--opencv-threads", type=int, default=None, help="Threads used by OpenCV.")
+    parser.add_argument("--seconds", type=float, default=DEFAULT_SAMPLE_SECONDS,
+                        help="Seconds of video that the models are timed on.")
+    parser.add_argument("--output", default=None, help="File to write the full report to.")
+    arguments = parser.parse_args(argv)
+    report = evaluate(arguments.video, arguments.exercise, arguments.torch_threads, arguments.opencv_threads,
+                      arguments.seconds)
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            json.dump(report, file, indent=2)
+    print(f"Threads: torch {report['threads']['torch']}, OpenCV {report['threads']['opencv']}")
+    print(f"{'mode':>11} {'mean ms':>8} {'p50 ms':>7} {'p95 ms':>7} {'analysis fps':>13}")
+    for mode in ("sequential", "concurrent"):
+        latency = report["models"][mode]
+        print(f"{mode:>11} {latency['mean_ms']:>8.1f} {latency['p50_ms']:>7.1f} {latency['p95_ms']:>7.1f} "
+              f"{report['analysis'][mode]['fps']:>13.1f}")
+    print(f"Speedup: {report['models']['speedup']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
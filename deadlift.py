@@ -1,11 +1,28 @@
 import analysis
-import numpy as np
-from helpers import calculate_angle
-from helpers import convert_coordinates
+import offline
 
 class Deadlift(analysis.Analysis):
-     def __init__(self, video_path):
-          super().__init__(video_path)
+
+     # Joints whose pixels are needed for drawing.
+     pixel_joints = ("left_hip", "right_hip", "left_shoulder", "right_shoulder", "left_heel", "right_heel",
+                     "left_toes", "right_toes")
+     # The (a, b, c) joints of each angle at 'b' measured in every frame.
+     angle_joints = {
+          "shoulder_hip_knee_angle": ("left_shoulder", "left_hip", "left_knee"),
+          "left_toes_ankles_angle": ("left_toes", "left_ankle", "right_ankle"),
+          "right_toes_ankles_angle": ("right_toes", "right_ankle", "left_ankle")
+     }
+     distance_joints = {
+          "feet_distance": ("left_heel", "right_heel"),
+          "shoulder_distance": ("left_shoulder", "right_shoulder")
+     }
+
+     def __init__(self, video_path, **options):
+          super().__init__(video_path, **options)
+
+     # Score the whole video at once with the vectorised rules in 'offline'.
+     def score_offline(self, features):
+          return offline.score_deadlift(features)
 
      def initialise_results(self):
           if self.view == "left" or self.view == "right":
@@ -51,41 +68,14 @@ class Deadlift(analysis.Analysis):
                     }
 
      def get_landmark_pixels(self, image):
-         self.pixels = {"left_hip":
-                    convert_coordinates(self.landmarks["left_hip"], image),
-                    "right_hip":
-                    convert_coordinates(self.landmarks["right_hip"], image),
-                    "left_shoulder":
-                    convert_coordinates(self.landmarks["left_shoulder"], image),
-                    "right_shoulder":
-                    convert_coordinates(self.landmarks["right_shoulder"], image),
-                    "left_heel":
-                    convert_coordinates(self.landmarks["left_heel"], image),
-                    "right_heel":
-                    convert_coordinates(self.landmarks["right_heel"], image),
-                    "left_toes":
-                    convert_coordinates(self.landmarks["left_toes"], image),
-                    "right_toes":
-                    convert_coordinates(self.landmarks["right_toes"], image)
-         }
+         self.pixels = self.measure_pixels(image)
 
          if "left_heel" in self.pixels:
              self.pixels["left_heel_target"] = [self.pixels["left_shoulder"][0], self.pixels["left_heel"][1]]
              self.pixels["right_heel_target"] = [self.pixels["right_shoulder"][0], self.pixels["right_heel"][1]]
 
      def calculate_angles(self):
-          self.angles["shoulder_hip_knee_angle"] = calculate_angle(self.landmarks["left_shoulder"], 
-                                                            self.landmarks["left_hip"],
-                                                            self.landmarks["left_knee"]
-          )
-          self.angles["left_toes_ankles_angle"] = calculate_angle(self.landmarks["left_toes"],
-                                                            self.landmarks["left_ankle"],
-                                                            self.landmarks["right_ankle"]
-          )
-          self.angles["right_toes_ankles_angle"] = calculate_angle(self.landmarks["right_toes"],
-                                                            self.landmarks["right_ankle"],
-                                                            self.landmarks["left_ankle"]
-          )
+          self.angles.update(self.measure_angles())
           # Maintain 'largest_shoulder_hip_knee_angle'.
           if "largest_shoulder_hip_knee_angle" not in self.angles:
             self.angles["largest_shoulder_hip_knee_angle"] = self.angles["shoulder_hip_knee_angle"]
@@ -97,12 +87,7 @@ class Deadlift(analysis.Analysis):
      
      # Calculate specific coordinates required for analysis.
      def calculate_distances(self):
-         self.distances = {
-                    "feet_distance": np.sqrt((self.landmarks["left_heel"][0] - self.landmarks["right_heel"][0]) ** 2 +
-                                        (self.landmarks["left_heel"][1] - self.landmarks["right_heel"][1]) ** 2),
-                    "shoulder_distance": np.sqrt((self.landmarks["left_shoulder"][0] - self.landmarks["right_shoulder"][0]) ** 2 +
-                                            (self.landmarks["left_shoulder"][1] - self.landmarks["right_shoulder"][1]) ** 2)
-                    }
+         self.distances = self.measure_distances()
      
      def determine_phase(self):
           if self.view == "left" or self.view == "right":
@@ -0,0 +1,365 @@
+import argparse
+import json
+import time
+import cv2
+import numpy as np
+from ultralytics import YOLO
+from backends import MODEL_PATH
+from errors import CustomError
+from helpers import is_bar_path_straight
+from tracking import BarbellTracker
+
+# Detections with a lower confidence, or of another class, are not considered to be the barbell.
+BARBELL_CONFIDENCE = 0.7
+BARBELL_CLASS = 0
+
+
+# Return the most confident barbell detection, or None if there is none.
+def best_barbell(detections):
+    barbells = [detection for detection in detections
+                if detection[4] > BARBELL_CONFIDENCE and detection[5] == BARBELL_CLASS]
+    return max(barbells, key=lambda detection: detection[4], default=None)
+
+
+# Record the boxes of detections, labelled with their confidence, onto the overlay of a frame.
+def draw_detections(overlay, detections):
+    for x, y, width, height, confidence, class_id in detections:
+        left, top = int(x - width / 2), int(y - height / 2)
+        overlay.rectangle((left, top), (int(x + width / 2), int(y + height / 2)), (255, 56, 56), 3)
+        overlay.text(f"{confidence:.2f}", (left, max(0, top - 6)), (255, 56, 56))
+
+
+# Runs the YOLO barbell detector on every frame. Detections are returned as
+# (x, y, width, height, confidence, class) tuples, where (x, y) is the centre of the box in frame
+# pixels. The boxes are drawn by the analysis, not by the detector. If 'image_size' is given, the
+# frames are resized to that many pixels on their longest side for the model instead of the size it
+# was trained at; the boxes are still returned in frame pixels.
+class BarbellDetector:
+
+    def __init__(self, model, image_size=None):
+        self.model = model
+        self.arguments = {"verbose": False}
+        if image_size:
+            self.arguments["imgsz"] = image_size
+
+    def detect(self, frame):
+        return self.parse(self.model(frame, **self.arguments)[0])
+
+    # Run the model once on a list of frames and return the detections of each, in order.
+    def detect_batch(self, frames):
+        return [self.parse(result) for result in self.model(list(frames), **self.arguments)]
+
+    @staticmethod
+    def parse(result):
+        detections = []
+        for detection in result.boxes:
+            box = detection.xywh[0]
+            detections.append((box[0].item(), box[1].item(), box[2].item(), box[3].item(),
+                               detection.conf.item(), int(detection.cls.item())))
+        return detections
+
+
+# Runs the wrapped detector every 'stride' frames only, and tracks the barbell in between. The
+# detector is also run as soon as the tracking confidence falls below 'min_tracking_confidence'.
+# If 'adaptive' is set, the stride grows by one frame each time the tracked position agrees with
+# the next detection (within 'drift_tolerance' pixels) up to 'max_stride', and is halved each
+# time it does not.
+class StridedDetector:
+
+    def __init__(self, detector, stride=4, adaptive=False, max_stride=8, min_tracking_confidence=0.6,
+                 drift_tolerance=10.0):
+        self.detector = detector
+        self.stride = max(1, stride)
+        self.adaptive = adaptive
+        self.max_stride = max(self.stride, max_stride)
+        self.min_tracking_confidence = min_tracking_confidence
+        self.drift_tolerance = drift_tolerance
+        self.tracker = BarbellTracker()
+        # The last detection of the barbell, used to fill in the boxes of tracked frames.
+        self.reference = None
+        self.frames_since_detection = 0
+        self.detector_calls = 0
+        self.tracked_frames = 0
+
+    def detect(self, frame):
+        self.frames_since_detection += 1
+        predicted = None
+        lost = False
+        if self.reference is not None:
+            predicted, tracking_confidence = self.tracker.update(frame)
+            lost = tracking_confidence < self.min_tracking_confidence
+            if lost:
+                # The tracker has lost the barbell.
+                if self.adaptive:
+                    self.stride = max(1, self.stride // 2)
+            elif self.frames_since_detection < self.stride:
+                self.tracked_frames += 1
+                x, y, width, height = predicted
+                return [(x, y, width, height, self.reference[4], self.reference[5])]
+
+        detections = self.detector.detect(frame)
+        self.detector_calls += 1
+        self.frames_since_detection = 0
+        barbell = best_barbell(detections)
+        if barbell is None:
+            self.reference = None
+            return detections
+        # The stride changes at most once per frame: a lost tracker has already halved it, and its
+        # position says nothing about drift.
+        if self.adaptive and predicted is not None and not lost:
+            drift = ((predicted[0] - barbell[0]) ** 2 + (predicted[1] - barbell[1]) ** 2) ** 0.5
+            if drift <= self.drift_tolerance:
+                self.stride = min(self.stride + 1, self.max_stride)
+            else:
+                self.stride = max(1, self.stride // 2)
+        self.reference = barbell
+        self.tracker.initialise(frame, barbell[:4])
+        return detections
+
+    # Each frame depends on the previous one, so the frames are detected one at a time.
+    def detect_batch(self, frames):
+        return [self.detect(frame) for frame in frames]
+
+
+# Runs the wrapped detector on a region of interest around the lifter's hands and shoulders, taken
+# from the pose landmarks of the frame, instead of the whole frame. The region is the bounding box
+# of those landmarks, extended on every side by 'margin' times its longest side. The whole frame
+# is searched if there are no landmarks yet or if no barbell is found in the region.
+class RegionDetector:
+
+    # Indices of the shoulders, wrists and index fingers in the MediaPipe Pose landmarks.
+    landmark_indices = (11, 12, 15, 16, 19, 20)
+
+    def __init__(self, detector, margin=0.5, min_visibility=0.5):
+        self.detector = detector
+        self.margin = margin
+        self.min_visibility = min_visibility
+        # Normalised (left, top, right, bottom) bounds of the landmarks, or None.
+        self.region = None
+        self.region_searches = 0
+        self.full_frame_searches = 0
+        # Number of pixels passed to the detector, and number of pixels in the frames.
+        self.detector_pixels = 0
+        self.frame_pixels = 0
+
+    # Called with the (33, 4) pose landmarks of each frame before it is detected, or None if no
+    # pose was detected.
+    def update_landmarks(self, landmarks):
+        if landmarks is None:
+            self.region = None
+            return
+        points = landmarks[list(self.landmark_indices)]
+        points = points[points[:, 3] >= self.min_visibility]
+        if len(points) == 0:
+            self.region = None
+            return
+        self.region = (points[:, 0].min(), points[:, 1].min(), points[:, 0].max(), points[:, 1].max())
+
+    def detect(self, frame):
+        height, width = frame.shape[:2]
+        self.frame_pixels += width * height
+        region = self.region
+        if region is not None:
+            left, top, right, bottom = region[0] * width, region[1] * height, region[2] * width, region[3] * height
+            margin = self.margin * max(right - left, bottom - top)
+            left, top = int(max(0, left - margin)), int(max(0, top - margin))
+            right, bottom = int(min(width, right + margin)), int(min(height, bottom + margin))
+            if right - left > 1 and bottom - top > 1:
+                self.region_searches += 1
+                self.detector_pixels += (right - left) * (bottom - top)
+                detections = self.detector.detect(np.ascontiguousarray(frame[top:bottom, left:right]))
+                if best_barbell(detections) is not None:
+                    # Map the boxes back to full-frame coordinates.
+                    return [(x + left, y + top, box_width, box_height, confidence, class_id)
+                            for x, y, box_width, box_height, confidence, class_id in detections]
+
+        self.full_frame_searches += 1
+        self.detector_pixels += width * height
+        return self.detector.detect(frame)
+
+    # Each region depends on the latest landmarks, so the frames are detected one at a time.
+    def detect_batch(self, frames):
+        return [self.detect(frame) for frame in frames]
+
+    # Fraction of the frame pixels that were passed to the detector.
+    def pixel_fraction(self):
+        return self.detector_pixels / self.frame_pixels if self.frame_pixels else 0.0
+
+
+# Replays previously recorded detections, one list per frame, in place of running the model. A
+# wrapping detector may only call it on some frames, so the index of the current frame is set with
+# 'seek' before each frame rather than counted from its calls.
+class RecordedDetector:
+
+    def __init__(self, detections):
+        self.detections = detections
+        self.index = 0
+
+    def seek(self, index):
+        self.index = index
+
+    def detect(self, frame):
+        return self.detections[self.index] if self.index < len(self.detections) else []
+
+
+def read_video(video_path):
+    cap = cv2.VideoCapture(video_path)
+    try:
+        while cap.isOpened():
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield frame
+    finally:
+        cap.release()
+
+
+def barbell_coordinates(detections):
+    return [(detection[0], detection[1]) for detection in detections
+            if detection[4] > BARBELL_CONFIDENCE and detection[5] == BARBELL_CLASS]
+
+
+# Compare the barbell path tracked at each stride against the path detected on every frame. The
+# model is only run once per frame; each stride then replays those detections on its keyframes,
+# which gives the same result as running the model on them.
+def drift_report(video_path, strides, adaptive=False, model=None):
+    detector = BarbellDetector(model or YOLO(MODEL_PATH))
+    reference = [detector.detect(frame) for frame in read_video(video_path)]
+    reference_coordinates = [coordinate for detections in reference for coordinate in barbell_coordinates(detections)]
+    reference_straight = is_bar_path_straight(reference_coordinates) if reference_coordinates else None
+
+    report = {"video": video_path, "frames": len(reference), "adaptive": adaptive,
+              "straight": reference_straight, "strides": []}
+    for stride in strides:
+        recorded = RecordedDetector(reference)
+        strided = StridedDetector(recorded, stride=stride, adaptive=adaptive)
+        drifts = []
+        missed_frames = 0
+        coordinates = []
+        for index, (frame, expected_detections) in enumerate(zip(read_video(video_path), reference)):
+            recorded.seek(index)
+            detections = strided.detect(frame)
+            coordinates.extend(barbell_coordinates(detections))
+            expected, tracked = best_barbell(expected_detections), best_barbell(detections)
+            if expected is None:
+                continue
+            if tracked is None:
+                missed_frames += 1
+                continue
+            drifts.append(np.hypot(tracked[0] - expected[0], tracked[1] - expected[1]))
+        straight = is_bar_path_straight(coordinates) if coordinates else None
+        report["strides"].append({
+            "stride": stride,
+            "detector_calls": strided.detector_calls,
+            "detector_fraction": strided.detector_calls / len(reference) if reference else 0.0,
+            "mean_drift": float(np.mean(drifts)) if drifts else 0.0,
+            "p95_drift": float(np.percentile(drifts, 95)) if drifts else 0.0,
+            "max_drift": float(np.max(drifts)) if drifts else 0.0,
+            "missed_frames": missed_frames,
+            "straight": straight,
+            "verdict_matches": straight == reference_straight
+        })
+    # The largest stride that still gives the same bar path verdict as per-frame detection.
+    matching = [row["stride"] for row in report["strides"] if row["verdict_matches"]]
+    report["recommended_stride"] = max(matching, default=1)
+    return report
+
+
+# Analyse a video with the region of interest enabled and report how many pixels were passed to the
+# detector compared to searching every full frame.
+def region_report(video_path, exercise, margin=0.5):
+    # Imported here since the exercise modules depend on this module.
+    from batch import create_analysis
+    analysis = create_analysis(exercise, video_path, region_of_interest=True, region_margin=margin)
+    analysis.process_video()
+    detector = analysis.region_detector
+    return {"video": video_path, "frames": analysis.frame_count, "margin": margin,
+            "region_searches": detector.region_searches, "full_frame_searches": detector.full_frame_searches,
+            "pixel_fraction": detector.pixel_fraction()}
+
+
+# Compare the throughput of detecting 'frame_count' frames of a video one frame at a time with
+# detecting them in batches of each size.
+def throughput_report(video_path, batch_sizes, frame_count=64, model=None):
+    detector = BarbellDetector(model or YOLO(MODEL_PATH))
+    frames = []
+    for frame in read_video(video_path):
+        frames.append(frame)
+        if len(frames) == frame_count:
+            break
+    if not frames:
+        raise CustomError(f"No frames could be read from '{video_path}'.", "empty_video")
+    # Warm up the model so that its initialisation is not timed.
+    detector.detect(frames[0])
+
+    start = time.perf_counter()
+    for frame in frames:
+        detector.detect(frame)
+    per_frame_seconds = time.perf_counter() - start
+    report = {"video": video_path, "frames": len(frames),
+              "per_frame": {"seconds": per_frame_seconds, "fps": len(frames) / per_frame_seconds},
+              "batched": []}
+    for batch_size in batch_sizes:
+        start = time.perf_counter()
+        for i in range(0, len(frames), batch_size):
+            detector.detect_batch(frames[i:i + batch_size])
+        seconds = time.perf_counter() - start
+        report["batched"].append({"batch_size": batch_size, "seconds": seconds, "fps": len(frames) / seconds,
+                                  "speedup": per_frame_seconds / seconds})
+    return report
+
+
+def print_drift_report(report):
+    print(f"{report['video']}: {report['frames']} frames, per-frame verdict: "
+          f"{'straight' if report['straight'] else 'not straight' if report['straight'] is not None else 'no barbell'}")
+    print(f"{'stride':>6} {'calls':>7} {'mean px':>8} {'p95 px':>8} {'max px':>8} {'missed':>7} {'verdict':>8}")
+    for row in report["strides"]:
+        print(f"{row['stride']:>6} {row['detector_fraction']:>7.0%} {row['mean_drift']:>8.1f} {row['p95_drift']:>8.1f} "
+              f"{row['max_drift']:>8.1f} {row['missed_frames']:>7} {'same' if row['verdict_matches'] else 'CHANGED':>8}")
+    print(f"Recommended stride: {report['recommended_stride']}")
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Barbell detection tools.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    drift = commands.add_parser("drift", help="Report how far strided tracking drifts from per-frame detection.")
+    drift.add_argument("video")
+    drift.add_argument("--strides", type=int, nargs="+", default=[2, 4, 8])
+    drift.add_argument("--adaptive", action="store_true", help="Adapt the stride while tracking.")
+    drift.add_argument("--output", help="File to write the report to as JSON.")
+    throughput = commands.add_parser("throughput", help="Compare per-frame and batched detection throughput.")
+    throughput.add_argument("video")
+    throughput.add_argument("--batch-sizes", type=int, nargs="+", default=[2, 4, 8, 16])
+    throughput.add_argument("--frames", type=int, default=64, help="Number of frames to detect.")
+    region = commands.add_parser("region", help="Report the detector pixels saved by the region of interest.")
+    region.add_argument("video")
+    region.add_argument("--exercise", required=True, choices=("squat", "deadlift"))
+    region.add_argument("--margin", type=float, default=0.5)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    if arguments.command == "drift":
+        report = drift_report(arguments.video, arguments.strides, arguments.adaptive)
+        print_drift_report(report)
+        if arguments.output:
+            with open(arguments.output, "w") as file:
+                json.dump(report, file, indent=2)
+    elif arguments.command == "throughput":
+        report = throughput_report(arguments.video, arguments.batch_sizes, arguments.frames)
+        print(f"{report['video']}: {report['frames']} frames")
+        print(f"{'batch':>6} {'fps':>8} {'speedup':>8}")
+        print(f"{'1*':>6} {report['per_frame']['fps']:>8.1f} {1.0:>8.2f}")
+        for row in report["batched"]:
+            print(f"{row['batch_size']:>6} {row['fps']:>8.1f} {row['speedup']:>8.2f}")
+        print("* one frame per call")
+    elif arguments.command == "region":
+        report = region_report(arguments.video, arguments.exercise, arguments.margin)
+        print(f"{report['video']}: {report['frames']} frames, {report['region_searches']} region searches, "
+              f"{report['full_frame_searches']} full-frame searches, "
+              f"{report['pixel_fraction']:.1%} of the frame pixels passed to the detector")
+
+
+if __name__ == "__main__":
+    main()
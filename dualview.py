@@ -0,0 +1,158 @@
+import argparse
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from batch import EXERCISES, analyse_video, to_json, write_json
+from reps import combine_results
+
+SIDE_VIEWS = ("left", "right")
+# Paired repetitions may end this fraction of the front repetition's duration apart once aligned.
+PAIRING_TOLERANCE = 0.5
+
+
+# Align the side recording to the front one and pair up their repetitions. If 'offset' is not
+# given and both recordings have repetitions, the offset is the median difference between the times
+# at which the repetitions ended in each, taken in order. Otherwise, the recordings are assumed to
+# have started at the same time, or 'offset' seconds apart. The offset is the time in the side
+# recording of the start of the front recording. Each front repetition is then paired with the
+# unpaired side repetition that ended closest to it, within 'tolerance' times its duration.
+def align(front_reps, side_reps, offset=None, tolerance=PAIRING_TOLERANCE):
+    front_ends = np.array([rep["end"] for rep in front_reps], dtype=float)
+    side_ends = np.array([rep["end"] for rep in side_reps], dtype=float)
+    count = min(len(front_ends), len(side_ends))
+    if offset is None and count:
+        method = "reps"
+        offset = float(np.median(side_ends[:count] - front_ends[:count]))
+    else:
+        method = "timestamps"
+        offset = float(offset or 0.0)
+    # Times at which the side repetitions ended, in seconds of the front recording.
+    side_ends = side_ends - offset
+    pairs = []
+    unpaired_side = set(range(len(side_reps)))
+    for i, rep in enumerate(front_reps):
+        candidates = [j for j in unpaired_side if abs(side_ends[j] - front_ends[i]) <= tolerance * rep["duration"]]
+        if not candidates:
+            continue
+        j = min(candidates, key=lambda j: abs(side_ends[j] - front_ends[i]))
+        unpaired_side.remove(j)
+        pairs.append({"front_rep": rep["rep"], "side_rep": side_reps[j]["rep"], "front_end": float(front_ends[i]),
+                      "side_end": float(side_ends[j])})
+    paired_front = {pair["front_rep"] for pair in pairs}
+    return {
+        "method": method,
+        "offset_seconds": offset,
+        "pairs": pairs,
+        # Repetitions that only one of the recordings saw.
+        "unpaired": {"front": [rep["rep"] for rep in front_reps if rep["rep"] not in paired_front],
+                     "side": [side_reps[j]["rep"] for j in sorted(unpaired_side)]}
+    }
+
+
+# The side view judges the torso, depth, hips, back and barbell path and the front view judges the
+# stance, toes and knees, so the results of each are taken from the view that can see them.
+def merge_results(front, side):
+    results = dict(front)
+    results.update(side)
+    return results
+
+
+# Merge the repetitions of both recordings, pair by pair, in the order they happened (in seconds of
+# the front recording). A repetition that only one recording saw keeps the results of that view.
+def merge_reps(front_reps, side_reps, alignment):
+    front_by_number = {rep["rep"]: rep for rep in front_reps}
+    side_by_number = {rep["rep"]: rep for rep in side_reps}
+    offset = alignment["offset_seconds"]
+    merged = []
+    for pair in alignment["pairs"]:
+        front, side = front_by_number[pair["front_rep"]], side_by_number[pair["side_rep"]]
+        merged.append({"front_rep": front["rep"], "side_rep": side["rep"], "start": front["start"], "end": front["end"],
+                       "results": merge_results(front["results"], side["results"])})
+    for number in alignment["unpaired"]["front"]:
+        front = front_by_number[number]
+        merged.append({"front_rep": number, "side_rep": None, "start": front["start"], "end": front["end"],
+                       "results": front["results"]})
+    for number in alignment["unpaired"]["side"]:
+        side = side_by_number[number]
+        merged.append({"front_rep": None, "side_rep": number, "start": side["start"] - offset,
+                       "end": side["end"] - offset, "results": side["results"]})
+    merged.sort(key=lambda rep: rep["end"])
+    for number, rep in enumerate(merged, start=1):
+        rep["rep"] = number
+    return merged
+
+
+def stream_summary(report, role):
+    summary = {key: report[key] for key in ("video", "view", "status", "error", "frames", "seconds", "fps")}
+    summary["expected_view"] = role
+    return summary
+
+
+# Analyse a front and a side recording of the same set at the same time, each in its own worker
+# process, and merge their results into one report.
+def analyse_dual(front_path, side_path, exercise, timeout=None, options=None, offset=None):
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        front_future = executor.submit(analyse_video, front_path, exercise, timeout, options)
+        side_future = executor.submit(analyse_video, side_path, exercise, timeout, options)
+        front, side = front_future.result(), side_future.result()
+    alignment = align(front["reps"], side["reps"], offset)
+    reps = merge_reps(front["reps"], side["reps"], alignment)
+    warnings = []
+    if front["status"] == "completed" and front["view"] != "front":
+        warnings.append(f"The front recording was detected as a '{front['view']}' view.")
+    if side["status"] == "completed" and side["view"] not in SIDE_VIEWS:
+        warnings.append(f"The side recording was detected as a '{side['view']}' view.")
+    for role in ("front", "side"):
+        if alignment["unpaired"][role]:
+            warnings.append(f"Repetition(s) {', '.join(map(str, alignment['unpaired'][role]))} of the {role} "
+                            f"recording could not be paired with the other recording.")
+    status = "completed" if front["status"] == side["status"] == "completed" else "incomplete"
+    return {
+        "exercise": exercise,
+        "status": status,
+        "warnings": warnings,
+        "front": stream_summary(front, "front"),
+        "side": stream_summary(side, "side"),
+        "alignment": alignment,
+        "weight": side["weight"] or front["weight"],
+        # Without repetitions in either recording, the results of the whole recordings are merged.
+        "results": (combine_results([rep["results"] for rep in reps]) if reps
+                    else merge_results(front["results"], side["results"])),
+        "reps": reps,
+        "bar_path": side["bar_path"],
+        "wall_seconds": time.perf_counter() - start
+    }
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse a front and a side recording of the same set together.")
+    parser.add_argument("front", help="Video recorded from the front.")
+    parser.add_argument("side", help="Video recorded from the side.")
+    parser.add_argument("--exercise", required=True, choices=EXERCISES)
+    parser.add_argument("--output", default=None, help="File to write the report to (default: print it).")
+    parser.add_argument("--offset", type=float, default=None,
+                        help="Seconds into the side recording at which the front recording starts. "
+                             "By default, the recordings are aligned by their repetitions.")
+    parser.add_argument("--timeout", type=float, default=None, help="Maximum number of seconds per video.")
+    parser.add_argument("--cache", action="store_true",
+                        help="Reuse the landmarks and detections cached by previous analyses of the same videos.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    options = {"cache": True} if arguments.cache else None
+    report = analyse_dual(arguments.front, arguments.side, arguments.exercise, arguments.timeout, options,
+                          arguments.offset)
+    if arguments.output:
+        write_json(arguments.output, report)
+    else:
+        print(json.dumps(report, indent=2, default=to_json))
+    print(f"Analysed both views in {report['wall_seconds']:.1f}s "
+          f"(front {report['front']['seconds']:.1f}s, side {report['side']['seconds']:.1f}s).")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,9 +10,164 @@ OUTPUT_PATH = Path(__file__).parent
 ASSETS_PATH = OUTPUT_PATH / Path(r"/Users/melodyflavel/Projects/Python/Reform/assets")
 
 
+# Interval (in milliseconds) at which the analysis window shows the newest frame, if there is one.
+PRESENT_INTERVAL = 15
+
+
 def relative_to_assets(path: str) -> Path:
     return ASSETS_PATH / Path(path)
 
+
+# Feedback shown for each criterion of each exercise and view ('side' or 'front'), in display order.
+# The first of the rules whose condition matches the results is shown, or the 'adequate' message
+# with a check mark if none does. A condition maps result keys, given as 'key' for the current
+# category of a result or as 'key.field' for another field, to the values they must have. Criteria
+# marked 'barbell' are only shown when a barbell is detected.
+FEEDBACK = {
+    ("squat", "side"): [
+        {"title": "Torso", "adequate": "Your torso is adequately positioned.", "rules": [
+            ({"torso": "upright"}, "Your torso is too upright.", "cross"),
+            ({"torso": "forward"}, "Your torso is leaning too far forward.", "cross")]},
+        {"title": "Depth", "adequate": "Your squat depth is adequate.", "rules": [
+            ({"depth": "shallow"}, "Your squat is not deep enough.", "exclamation_mark"),
+            ({"depth": "deep"}, "Your squat is too deep.", "cross")]},
+        {"title": "Barbell", "adequate": "Your barbell path is straight.", "barbell": True, "rules": [
+            ({"barbell.straight": False}, "Your barbell path is not straight.", "cross")]}
+    ],
+    ("squat", "front"): [
+        {"title": "Feet", "adequate": "Your foot stance is adequate.", "rules": [
+            ({"feet": "far"}, "Your feet are too far apart.", "cross"),
+            ({"feet": "close"}, "Your feet are too close together.", "cross")]},
+        {"title": "Toes", "adequate": "Your toes are adequately pointed outward.", "rules": [
+            ({"right_toes": "outward", "left_toes": "outward"}, "Your toes are pointed too outward.", "cross"),
+            ({"right_toes": "inward", "left_toes": "inward"}, "Your toes are not pointed outward enough.", "cross"),
+            ({"right_toes": "outward", "left_toes": "adequate"}, "Your right toes are pointed too outward.", "cross"),
+            ({"right_toes": "inward", "left_toes": "adequate"}, "Your right toes are not pointed outward enough.",
+             "cross"),
+            ({"left_toes": "outward", "right_toes": "adequate"}, "Your left toes are pointed too outward.", "cross"),
+            ({"left_toes": "inward", "right_toes": "adequate"}, "Your left toes are not pointed outward enough.",
+             "cross")]},
+        {"title": "Knees", "adequate": "Knees are adequately positioned.", "rules": [
+            ({"right_knee": "inward", "left_knee": "inward"}, "Both knees are moving inward.", "cross"),
+            ({"right_knee": "inward", "left_knee": "adequate"}, "Right knee is moving inward.", "cross"),
+            ({"right_knee": "adequate", "left_knee": "inward"}, "Left knee is moving inward.", "cross")]}
+    ],
+    ("deadlift", "side"): [
+        {"title": "Hips", "adequate": "Your hip placement is adequate.", "rules": [
+            ({"hips": "high"}, "Your hips are above your shoulders.", "cross")]},
+        {"title": "Back", "adequate": "Your back extension is adequate.", "rules": [
+            ({"back.overextended": True}, "Your back is overextended at the peak\nof the deadlift.", "cross"),
+            ({"back": "overflexed"}, "Your back is overflexed at the peak\nof the deadlift.", "cross")]},
+        {"title": "Barbell", "adequate": "Your barbell path is straight.", "barbell": True, "rules": [
+            ({"barbell.straight": False}, "Your barbell path is not straight.", "cross")]}
+    ],
+    ("deadlift", "front"): [
+        {"title": "Feet", "adequate": "Your foot stance is adequate.", "rules": [
+            ({"feet": "far"}, "Your feet are too far apart.", "cross"),
+            ({"feet": "close"}, "Your feet are too close together.", "cross")]},
+        {"title": "Toes", "adequate": "Your toes are adequately pointed outward.", "rules": [
+            ({"right_toes": "outward", "left_toes": "outward"}, "Both of your toes are pointed too outward.", "cross"),
+            ({"right_toes": "inward", "left_toes": "inward"}, "Both of your toes are not pointed outward\nenough.",
+             "cross"),
+            ({"right_toes": "outward", "left_toes": "adequate"}, "Your right toes are pointed too outward.", "cross"),
+            ({"right_toes": "inward", "left_toes": "adequate"}, "Your right toes are not pointed outward enough.",
+             "cross"),
+            ({"left_toes": "outward", "right_toes": "adequate"}, "Your left toes are pointed too outward.", "cross"),
+            ({"left_toes": "inward", "right_toes": "adequate"}, "Your left toes are not pointed outward enough.",
+             "cross")]}
+    ]
+}
+
+
+# The value of 'key' (see 'FEEDBACK') in the results. A missing result or field counts as False.
+def result_value(results, key):
+    name, _, field = key.partition(".")
+    return results.get(name, {}).get(field or "current", False)
+
+
+# The rows of feedback next to the videos. Each row keeps the same canvas items (title, message and
+# icon) for as long as the window is open, and an item is only updated when its content changes.
+class FeedbackPanel:
+
+    # (title, message, icon) positions and title font of each row.
+    rows = [
+        ((711.0, 71.0), (711.0, 94.0), (684.0, 80.0), ("Arial BoldMT", 16 * -1)),
+        ((711.0, 155.0), (713.0, 178.0), (684.0, 164.0), ("ArialMT", 16 * -1)),
+        ((711.0, 237.0), (711.0, 260.0), (684.0, 245.0), ("ArialMT", 16 * -1))
+    ]
+
+    def __init__(self, canvas, images):
+        self.canvas = canvas
+        self.images = images
+        self.items = []
+        for title_position, message_position, icon_position, title_font in self.rows:
+            self.items.append((
+                canvas.create_text(*title_position, anchor="nw", text="", fill="#000000", font=title_font),
+                canvas.create_text(*message_position, anchor="nw", text="", fill="#000000",
+                                   font=("ArialMT", 12 * -1)),
+                canvas.create_image(*icon_position, state="hidden")
+            ))
+        # The (title, message, icon) shown in each row.
+        self.shown = [("", "", None)] * len(self.rows)
+
+    # Show the (title, message, icon) of each criterion, one per row, and clear the other rows.
+    def update(self, rows):
+        rows = list(rows)[:len(self.rows)]
+        rows += [("", "", None)] * (len(self.rows) - len(rows))
+        for index, (row, shown, (title_item, message_item, icon_item)) in enumerate(zip(rows, self.shown, self.items)):
+            if row == shown:
+                continue
+            title, message, icon = row
+            if title != shown[0]:
+                self.canvas.itemconfigure(title_item, text=title)
+            if message != shown[1]:
+                self.canvas.itemconfigure(message_item, text=message)
+            if icon != shown[2]:
+                if icon is None:
+                    self.canvas.itemconfigure(icon_item, state="hidden")
+                else:
+                    self.canvas.itemconfigure(icon_item, image=self.images[icon], state="normal")
+            self.shown[index] = row
+
+
+# Shows frames in a label, scaled to 'max_height' and cropped evenly from the left and right if
+# they are wider than 'max_width'. The scaled frame, its RGB conversion and the Tk image are
+# allocated once per frame size and reused for every frame.
+class VideoDisplay:
+
+    def __init__(self, label, max_width, max_height):
+        self.label = label
+        self.max_width = max_width
+        self.max_height = max_height
+        self.source_shape = None
+
+    def configure(self, height, width):
+        scale = self.max_height / height
+        new_width = int(width * scale)
+        if new_width > self.max_width:
+            # Crop the frame before scaling it, so that only the part that is shown is scaled.
+            crop_width = int(round(self.max_width / scale))
+            start_x = (width - crop_width) // 2
+            self.crop = slice(start_x, start_x + crop_width)
+            new_width = self.max_width
+        else:
+            self.crop = slice(0, width)
+        self.size = (new_width, self.max_height)
+        self.scaled = np.empty((self.max_height, new_width, 3), dtype=np.uint8)
+        self.rgb = np.empty_like(self.scaled)
+        self.image_tk = ImageTk.PhotoImage("RGB", self.size)
+        self.label.configure(image=self.image_tk)
+        # Reference to avoid garbage collection.
+        self.label.image = self.image_tk
+        self.source_shape = (height, width)
+
+    def show(self, frame):
+        if frame.shape[:2] != self.source_shape:
+            self.configure(*frame.shape[:2])
+        cv2.resize(frame[:, self.crop], self.size, dst=self.scaled)
+        cv2.cvtColor(self.scaled, cv2.COLOR_BGR2RGB, dst=self.rgb)
+        self.image_tk.paste(Image.fromarray(self.rgb))
+
 class GUI:
 
     def __init__(self):
@@ -40,6 +195,9 @@ class Launch(GUI):
         self.canvas.config(height=420, width=500)
         self.entry_image = None  # Declare an attribute to store image references
         self.launch_button_image = None  # Declare an attribute to store image references
+        # Remain None if the window is closed without clicking the launch button.
+        self.exercise = None
+        self.video_path = None
         self.display()
 
     def display(self):
@@ -52,7 +210,7 @@ class Launch(GUI):
             30.0,
             20.0,
             anchor="nw",
-            text="Hi! I’m here to help analyze your exercise form and provide real-time feedback on\nareas that could use improvement. My assessments are grounded in widely\nrecognized standards for proper form during these exercises.\n\nPlease note that my analysis focuses on the conventional execution of exercises\nand does not consider variations such as sumo styles or close-foot stances. The\ndepth and accuracy of the analysis are subject to the constraints of the MediaPipe\npose estimation models.\n\nTo ensure an accurate assessment, please make sure your video meets the\nfollowing criteria:\n• The video shows one complete repetition of the exercise.\n• The video is clear and well-lit.\n• Your entire body is visible within the frame.\n• There are no objects or obstructions blocking the camera's view.\n• The video begins with you in the starting position.\n",
+            text="Hi! I’m here to help analyze your exercise form and provide real-time feedback on\nareas that could use improvement. My assessments are grounded in widely\nrecognized standards for proper form during these exercises.\n\nPlease note that my analysis focuses on the conventional execution of exercises\nand does not consider variations such as sumo styles or close-foot stances. The\ndepth and accuracy of the analysis are subject to the constraints of the MediaPipe\npose estimation models.\n\nTo ensure an accurate assessment, please make sure your video meets the\nfollowing criteria:\n• The video shows one or more complete repetitions of the exercise.\n• The video is clear and well-lit.\n• Your entire body is visible within the frame.\n• There are no objects or obstructions blocking the camera's view.\n• The video begins with you in the starting position.\n",
             fill="#000000",
             font=("ArialMT", 12 * -1)
         )
@@ -143,6 +301,9 @@ class Launch(GUI):
     
     def show_selection_error(self):
         messagebox.showerror("Error", "Please select an exercise from the drop down menu.")
+
+    def show_path_error(self, video_path):
+        messagebox.showerror("Error", f"The video file '{video_path}' does not exist.")
     
 class Analysis(GUI):
 
@@ -150,32 +311,50 @@ class Analysis(GUI):
         super().__init__()
         self.window.geometry("1000x500")
         self.canvas.config(height=500, width=1000)
+        # The icons are decoded once, when the window is created.
         self.images = {
-            "cross": relative_to_assets("cross.png"),
-            "exclamation_mark": relative_to_assets("exclamation_mark.png"),
-            "check_mark": relative_to_assets("check_mark.png")
+            "cross": PhotoImage(file=relative_to_assets("cross.png")),
+            "exclamation_mark": PhotoImage(file=relative_to_assets("exclamation_mark.png")),
+            "check_mark": PhotoImage(file=relative_to_assets("check_mark.png"))
         }
-        self.text = {}
+        self.feedback = FeedbackPanel(self.canvas, self.images)
         # Label to display the original video.
         self.original_video_label = Label(self.window)
         self.original_video_label.place(x=0, y=0)
         # Label to display the annotated video.
         self.processed_video_label = Label(self.window)
         self.processed_video_label.place(x=(959 - 651), y=0)
+        self.original_video = VideoDisplay(self.original_video_label, 959 - 651, 500)
+        self.processed_video = VideoDisplay(self.processed_video_label, 959 - 651, 500)
+
+        # The newest analysed frame that has not been shown yet. The analysis thread only ever
+        # replaces it, and the Tk main loop takes it every 'PRESENT_INTERVAL' milliseconds, so a
+        # frame that is replaced before it is shown is dropped instead of queued.
+        self.latest_packet = None
+        self.latest_packet_lock = threading.Lock()
+        self.presented_frames = 0
+        self.dropped_frames = 0
+        self.present_job = None
+        # The buffer that the annotations are rendered into, reused from frame to frame.
+        self.rendered = None
 
         self.analysis = None
+        # Set when the user asks to analyse another video, rather than to exit.
+        self.change_requested = False
 
     def display(self, analysis):
         self.analysis = analysis
         self.canvas.place(x = 0, y = 0)
         
         background_image = PhotoImage(file=relative_to_assets("grey_rectangle.png"))
-        self.canvas.create_image(
+        background = self.canvas.create_image(
             651 + (308 / 2),  
             170,
             image=background_image,
             anchor="center"
         )
+        # Keep the background behind the feedback panel.
+        self.canvas.tag_lower(background)
     
         # Ensure the image is not garbage collected.
         self.canvas.background_image = background_image
@@ -206,293 +385,82 @@ class Analysis(GUI):
         exit_label.image = exit_icon
 
         self.window.resizable(False, False)
+        self.present_job = self.window.after(PRESENT_INTERVAL, self.present_latest)
         self.window.mainloop()
+
+    # Called by the analysis thread with each analysed frame. Nothing is drawn here; the frame is
+    # only handed over to 'present_latest'.
+    def submit(self, packet):
+        with self.latest_packet_lock:
+            if self.latest_packet is not None:
+                self.dropped_frames += 1
+                self.latest_packet.release()
+            self.latest_packet = packet
+
+    # Runs on the Tk main loop: show the newest frame, if there is one, along with the results.
+    def present_latest(self):
+        with self.latest_packet_lock:
+            packet, self.latest_packet = self.latest_packet, None
+        if packet is not None:
+            with self.analysis.metrics.time("render"):
+                if self.rendered is None or self.rendered.shape != packet.frame.shape:
+                    self.rendered = np.empty_like(packet.frame)
+                packet.output = packet.overlay.render(packet.frame, out=self.rendered)
+            with self.analysis.metrics.time("display"):
+                self.update_video_frame(packet.frame, label='original')
+                self.update_video_frame(packet.output, label='processed')
+            self.update_analysis_text()
+            self.analysis.record_delay(packet)
+            self.presented_frames += 1
+        self.present_job = self.window.after(PRESENT_INTERVAL, self.present_latest)
                 
     # Replay the video if the 'Replay' button is clicked.
     def replay_video(self):
         if not self.analysis.is_playing:  # Check if a video is already playing.
-            self.analysis.is_playing = True
             threading.Thread(target=self.analysis.process_video, args=(self,), daemon=True).start()
-            self.display(self.analysis)
 
     def exit_app(self):
+        self.analysis.stop()
         sys.exit(0)
 
 
+    # Close the window and return to the launch window in 'main.main', which reuses the models
+    # that are already loaded.
     def change_video(self):
+        # Shut down the current playback before the window it displays to is destroyed.
+        self.analysis.stop()
+        self.change_requested = True
+        if self.present_job is not None:
+            self.window.after_cancel(self.present_job)
         self.window.destroy()
-        import main
-        main.main()
 
+    # Runs on the Tk main loop: show the feedback for the current view of the exercise.
     def update_analysis_text(self):
-
-        # Clear previous text.
-        self.canvas.delete("analysis_text")
-
-        if self.analysis.exercise == "squat":
-            if self.analysis.view == "left" or self.analysis.view == "right":
-                # Update torso analysis text.
-                self.text["Torso"] = "Your torso is adequately positioned."
-                self.update_result_image("check_mark", 80)
-                if self.analysis.results.get("torso", {}).get("current", 0) == "upright":
-                    self.text["Torso"] = "Your torso is too upright."
-                    self.update_result_image("cross", 80)
-                elif self.analysis.results.get("torso", {}).get("current", 0) == "forward":
-                    self.text["Torso"] = "Your torso is leaning too far forward."
-                    self.update_result_image("cross", 80)
-
-                # Update depth analysis text.
-                self.text["Depth"] = "Your squat depth is adequate."
-                self.update_result_image("check_mark", 164)
-                if self.analysis.results.get("depth", {}).get("current", 0) == "shallow":
-                    self.text["Depth"] = "Your squat is not deep enough."
-                    self.update_result_image("exclamation_mark", 164)
-                elif self.analysis.results.get("depth", {}).get("current", 0) == "deep":
-                    self.text["Depth"] = "Your squat is too deep."
-                    self.update_result_image("cross", 164)
-
-                if self.analysis.weight["type"] == "barbell":
-                    # Update barbell path analysis text.
-                    self.text["Barbell"] = "Your barbell path is straight."
-                    self.update_result_image("check_mark", 245)
-                    if self.analysis.results.get("barbell", {}).get("straight", False) == False:
-                        self.text["Barbell"] = "Your barbell path is not straight."
-                        self.update_result_image("cross", 245)
-
-            elif self.analysis.view == "front":
-                # Update feet.
-                self.text["Feet"] = "Your foot stance is adequate."
-                self.update_result_image("check_mark", 80)
-                if self.analysis.results.get("feet", {}).get("current", 0) == "far":
-                    self.text["Feet"] = "Your feet are too far apart."
-                    self.update_result_image("cross", 80)
-                elif self.analysis.results.get("torso", {}).get("current", 0) == "close":
-                    self.text["Feet"] = "Your feet are too close together."
-                    self.update_result_image("cross", 80)
-
-                # Update toes.
-                self.text["Toes"] = "Your toes are adequately pointed outward."
-                self.update_result_image("check_mark", 164)
-                if self.analysis.results.get("right_toes", {}).get("current", 0) == "outward" and self.analysis.results.get("left_toes", {}).get("current", 0) == "outward":
-                    self.text["Toes"] = "Your toes are pointed too outward."
-                    self.update_result_image("cross", 164)
-                elif self.analysis.results.get("right_toes", {}).get("current", 0) == "inward" and self.analysis.results.get("left_toes", {}).get("current", 0) == "inward":
-                    self.text["Toes"] = "Your toes are not pointed outward enough."
-                    self.update_result_image("cross", 164)
-                elif self.analysis.results.get("right_toes", {}).get("current", 0) == "outward" and self.analysis.results.get("left_toes", {}).get("current", 0) == "adequate":
-                    self.text["Toes"] = "Your right toes are pointed too outward."
-                    self.update_result_image("cross", 164)
-                elif self.analysis.results.get("right_toes", {}).get("current", 0) == "inward" and self.analysis.results.get("left_toes", {}).get("current", 0) == "adequate":
-                    self.text["Toes"] = "Your right toes are not pointed outward enough."
-                    self.update_result_image("cross", 164)
-                elif self.analysis.results.get("left_toes", {}).get("current", 0) == "outward" and self.analysis.results.get("right_toes", {}).get("current", 0) == "adequate":
-                    self.text["Toes"] = "Your left toes are pointed too outward."
-                    self.update_result_image("cross", 164)
-                elif self.analysis.results.get("left_toes", {}).get("current", 0) == "inward" and self.analysis.results.get("right_toes", {}).get("current", 0) == "adequate":
-                    self.text["Toes"] = "Your left toes are not pointed outward enough."
-                    self.update_result_image("cross", 164)
-
-                self.text["Knees"] = "Knees are adequately positioned."
-                self.update_result_image("check_mark", 245)
-                if self.analysis.results.get("right_knee", {}).get("current", 0) == "inward" and self.analysis.results.get("left_knee", {}).get("current", 0) == "inward":
-                    self.text["Knees"] = "Both knees are moving inward."
-                    self.update_result_image("cross", 245)
-                elif self.analysis.results.get("right_knee", {}).get("current", 0) == "inward" and self.analysis.results.get("left_knee", {}).get("current", 0) == "adequate":
-                    self.text["Knees"] = "Right knee is moving inward."
-                    self.update_result_image("cross", 245)
-                elif self.analysis.results.get("right_knee", {}).get("current", 0) == "adequate" and self.analysis.results.get("left_knee", {}).get("current", 0) == "inward":
-                    self.text["Knees"] = "Left knee is moving inward."
-                    self.update_result_image("cross", 245)
-            
-        elif self.analysis.exercise == "deadlift":
-            if self.analysis.view == "left" or self.analysis.view == "right":
-                
-                # Update torso analysis text.
-                self.text["Hips"] = "Your hip placement is adequate."
-                self.update_result_image("check_mark", 80)
-                if self.analysis.results.get("hips", {}).get("current", 0) == "high":
-                    self.text["Hips"] = "Your hips are above your shoulders."
-                    self.update_result_image("cross", 80)
-
-                # Update depth analysis text.
-                self.text["Back"] = "Your back extension is adequate."
-                self.update_result_image("check_mark", 164)
-                if self.analysis.results.get("back", {}).get("overextended", 0) == True:
-                    self.text["Back"] = "Your back is overextended at the peak\nof the deadlift."
-                    self.update_result_image("cross", 164)
-                elif self.analysis.results.get("back", {}).get("current", 0) == "overflexed":
-                    self.text["Back"] = "Your back is overflexed at the peak\nof the deadlift."
-                    self.update_result_image("cross", 164)
-
-                if self.analysis.weight["type"] == "barbell":
-                    # Update barbell path analysis text.
-                    self.text["Barbell"] = "Your barbell path is straight."
-                    self.update_result_image("check_mark", 245)
-                    if self.analysis.results.get("barbell", {}).get("straight", False) == False:
-                        self.text["Barbell"] = "Your barbell path is not straight."
-                        self.update_result_image("cross", 245)
-
-            elif self.analysis.view == "front":
-
-                # If a different view ('left' or 'right') was detected before detecting this view
-                # ('front'), remove the previous key-value pairs from the 'text' dictionary so that 
-                # only the key-value pairs from this view ('front') are displayed.
-                self.text.pop("Hips", None)
-                self.text.pop("Back", None)
-                self.text.pop("Barbell", None)
-
-                # Update feet.
-                self.text["Feet"] = "Your foot stance is adequate."
-                self.update_result_image("check_mark", 80)
-                if self.analysis.results.get("feet", {}).get("current", 0) == "far":
-                    self.text["Feet"] = "Your feet are too far apart."
-                    self.update_result_image("cross", 80)
-                elif self.analysis.results.get("feet", {}).get("current", 0) == "close":
-                    self.text["Feet"] = "Your feet are too close together."
-                    self.update_result_image("cross", 80)
-
-                # Update toes.
-                self.text["Toes"] = "Your toes are adequately pointed outward."
-                self.update_result_image("check_mark", 164)
-                if self.analysis.results.get("right_toes", {}).get("current", 0) == "outward" and self.analysis.results.get("left_toes", {}).get("current", 0) == "outward":
-                    self.text["Toes"] = "Both of your toes are pointed too outward."
-                    self.update_result_image("cross", 164)
-                elif self.analysis.results.get("right_toes", {}).get("current", 0) == "inward" and self.analysis.results.get("left_toes", {}).get("current", 0) == "inward":
-                    self.text["Toes"] = "Both of your toes are not pointed outward\nenough."
-                    self.update_result_image("cross", 164)
-                elif self.analysis.results.get("right_toes", {}).get("current", 0) == "outward" and self.analysis.results.get("left_toes", {}).get("current", 0) == "adequate":
-                    self.text["Toes"] = "Your right toes are pointed too outward."
-                    self.update_result_image("cross", 164)
-                elif self.analysis.results.get("right_toes", {}).get("current", 0) == "inward" and self.analysis.results.get("left_toes", {}).get("current", 0) == "adequate":
-                    self.text["Toes"] = "Your right toes are not pointed outward enough."
-                    self.update_result_image("cross", 164)
-                elif self.analysis.results.get("left_toes", {}).get("current", 0) == "outward" and self.analysis.results.get("right_toes", {}).get("current", 0) == "adequate":
-                    self.text["Toes"] = "Your left toes are pointed too outward."
-                    self.update_result_image("cross", 164)
-                elif self.analysis.results.get("left_toes", {}).get("current", 0) == "inward" and self.analysis.results.get("right_toes", {}).get("current", 0) == "adequate":
-                    self.text["Toes"] = "Your left toes are not pointed outward enough."
-                    self.update_result_image("cross", 164)
-
-        text_list = list(self.text.items())
-        if len(self.text) > 0:
-            first_key, first_value = text_list[0]
-        if len(self.text) > 1:
-            second_key, second_value = text_list[1]
-        if len(self.text) > 2:
-            third_key, third_value = text_list[2]
-
-        if len(self.text) > 0:
-            self.canvas.create_text(
-                711.0,
-                71.0,
-                anchor="nw",
-                text=first_key,
-                fill="#000000",
-                font=("Arial BoldMT", 16 * -1),
-                tags="analysis_text"
-            )
-
-            self.canvas.create_text(
-                711.0,
-                94.0,
-                anchor="nw",
-                text=first_value,
-                fill="#000000",
-                font=("ArialMT", 12 * -1),
-                tags="analysis_text"
-            )
-        if len(self.text) > 1:
-            self.canvas.create_text(
-                711.0,
-                155.0,
-                anchor="nw",
-                text=second_key,
-                fill="#000000",
-                font=("ArialMT", 16 * -1),
-                tags="analysis_text"
-            )
-
-            self.canvas.create_text(
-                713.0,
-                178.0,
-                anchor="nw",
-                text=second_value,
-                fill="#000000",
-                font=("ArialMT", 12 * -1),
-                tags="analysis_text"
-            )
-        if len(text_list) > 2:
-            self.canvas.create_text(
-                711.0,
-                237.0,
-                anchor="nw",
-                text=third_key,
-                fill="#000000",
-                font=("ArialMT", 16 * -1),
-                tags="analysis_text"
-            )
-            self.canvas.create_text(
-                711.0,
-                260.0,
-                anchor="nw",
-                text=third_value,
-                fill="#000000",
-                font=("ArialMT", 12 * -1),
-                tags="analysis_text"
-            )
-        self.window.update_idletasks()
-
-
-        # Ensure the canvas is updated.
-        self.window.update_idletasks()
-        #self.update_result_image(self.analysis)
-
-    def update_result_image(self, image_key, y_position):
-        image_path = self.images.get(image_key)
-        image = PhotoImage(file=image_path)
-        # Positions for the images next to each analysis criterion.
-        x_position = 684.0
-        # Remove previous images.
-        self.canvas.delete("result_image")
-            
-        # Place the image in the corresponding position with a unique tag.
-        self.canvas.create_image(
-            (x_position, y_position),
-            image=image,
-            tags=f"image"
-        )
-        
-        # Reference to avoid garbage collection.
-        setattr(self, f"{y_position}_image", image)
-
-
-    def update_video_frame(self, frame, label):
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        height, width = frame_rgb.shape[:2]
-        max_height = 500
-        max_width = 959 - 651
-        scale = max_height / height
-        new_width = int(width * scale)
-        new_height = int(height * scale)
-        frame_resized = cv2.resize(frame_rgb, (new_width, new_height))
-        # Create a new image with a white background (change the color here)
-        canvas_image = np.ones((max_height, max_width, 3), dtype=np.uint8) * 255  # 255 for white background
-        # Crop the frame evenly from left and right if it exceeds 'max_width'.
-        if new_width > max_width:
-            excess_width = new_width - max_width
-            # Calculate cropping boundaries.
-            start_x = excess_width // 2
-            end_x = start_x + max_width
-            frame_cropped = frame_resized[:, start_x:end_x]
+        if self.analysis.view == "left" or self.analysis.view == "right":
+            criteria = FEEDBACK.get((self.analysis.exercise, "side"))
         else:
-            frame_cropped = frame_resized
-        image_pil = Image.fromarray(frame_cropped)
-        image_tk = ImageTk.PhotoImage(image=image_pil)
+            criteria = FEEDBACK.get((self.analysis.exercise, self.analysis.view))
+        # Keep showing the previous feedback until the view is determined.
+        if criteria is None:
+            return
+        # The repetition in progress starts with empty results, so the feedback covers the whole set
+        # so far, keeping the verdicts of the completed repetitions.
+        results = self.analysis.set_results()
+        rows = []
+        for criterion in criteria:
+            if criterion.get("barbell") and self.analysis.weight["type"] != "barbell":
+                continue
+            message, icon = criterion["adequate"], "check_mark"
+            for condition, rule_message, rule_icon in criterion["rules"]:
+                if all(result_value(results, key) == value for key, value in condition.items()):
+                    message, icon = rule_message, rule_icon
+                    break
+            rows.append((criterion["title"], message, icon))
+        self.feedback.update(rows)
+
+    # Must be called on the Tk main loop.
+    def update_video_frame(self, frame, label):
         if label == 'original':
-            self.original_video_label.configure(image=image_tk)
-            # Reference to avoid garbage collection.
-            self.original_video_label.image = image_tk 
+            self.original_video.show(frame)
         elif label == 'processed':
-            self.processed_video_label.configure(image=image_tk)
-            self.processed_video_label.image = image_tk
-        self.window.update_idletasks()
+            self.processed_video.show(frame)
@@ -1,18 +1,96 @@
+import argparse
+import timeit
 import numpy as np
 
+# The geometry below works on whole arrays of points at once: (N, 2) arrays of points, or
+# (frames, joints, 2) arrays of landmarks, where any values after x and y (e.g. z and visibility)
+# are ignored. The scalar functions are thin wrappers around them for single points.
+
+# Angle at 'b' in between 'a', 'b' and 'c' in degrees, for every set of points.
+def calculate_angles(a, b, c):
+    a, b, c = np.asarray(a), np.asarray(b), np.asarray(c)
+    radians = np.arctan2(c[..., 1] - b[..., 1], c[..., 0] - b[..., 0]) - np.arctan2(a[..., 1] - b[..., 1], a[..., 0] - b[..., 0])
+    angles = np.abs(radians * 180.0 / np.pi)
+    return np.where(angles > 180.0, 360 - angles, angles)
+
 def calculate_angle(a, b, c):
-    a = np.array(a)
-    b = np.array(b)
-    c = np.array(c)
+    return calculate_angles(a, b, c)[()]
+
+# Distance in between 'a' and 'b', for every pair of points.
+def calculate_distances(a, b):
+    a, b = np.asarray(a), np.asarray(b)
+    return np.sqrt((a[..., 0] - b[..., 0]) ** 2 + (a[..., 1] - b[..., 1]) ** 2)
 
-    radians = np.arctan2(c[1] - b[1], c[0] - b[0]) - np.arctan2(a[1] - b[1], a[0] - b[0])
-    angle = np.abs(radians * 180.0 / np.pi)
+def calculate_distance(a, b):
+    return calculate_distances(a, b)[()]
 
-    if angle > 180.0:
-        angle = 360 - angle
-    return angle
+# Convert normalised coordinates to integer pixel coordinates, for every point.
+def convert_coordinates_array(landmarks, image):
+    landmarks = np.asarray(landmarks)
+    scale = np.array((image.shape[1], image.shape[0]), dtype=landmarks.dtype)
+    return (landmarks[..., :2] * scale).astype(int)
 
 # Convert normalised coordinates to pixel coordinates
 def convert_coordinates(landmark, image):
-    pixel_coordinates = (int(landmark[0] * image.shape[1]), int(landmark[1] * image.shape[0]))
-    return pixel_coordinates
\ No newline at end of file
+    return tuple(convert_coordinates_array(landmark, image).tolist())
+
+# The barbell path is considered straight if the bar does not move more than 'tolerance' pixels
+# horizontally.
+def is_bar_path_straight(coordinates, tolerance=50):
+    min_x = min(coord[0] for coord in coordinates)
+    max_x = max(coord[0] for coord in coordinates)
+    return abs(min_x - max_x) <= tolerance
+
+# Time the geometry of a frame (four angles, two distances and nine pixel conversions, as in the
+# analyses) one point at a time and in one call each, and of a whole video in one call each.
+def benchmark(frames=1000, repeat=5):
+    # Imported here since only the benchmark needs the landmark layout.
+    from landmarks import LANDMARK_COUNT
+    rng = np.random.default_rng(0)
+    video = rng.random((frames, LANDMARK_COUNT, 4), dtype=np.float32)
+    image = np.zeros((720, 1280, 3), dtype=np.uint8)
+    angle_joints = np.array([(23, 25, 29), (11, 23, 25), (31, 27, 28), (32, 28, 27)])
+    distance_joints = np.array([(29, 30), (11, 12)])
+    pixel_joints = np.array([11, 12, 23, 25, 26, 29, 30, 31, 32])
+
+    def scalar(frame):
+        for a, b, c in angle_joints:
+            calculate_angle(frame[a], frame[b], frame[c])
+        for a, b in distance_joints:
+            calculate_distance(frame[a], frame[b])
+        for joint in pixel_joints:
+            convert_coordinates(frame[joint], image)
+
+    def batched(frame):
+        a, b, c = frame[angle_joints.T]
+        calculate_angles(a, b, c)
+        a, b = frame[distance_joints.T]
+        calculate_distances(a, b)
+        convert_coordinates_array(frame[pixel_joints], image).tolist()
+
+    def whole_video():
+        a, b, c = video[:, angle_joints.T].transpose(1, 0, 2, 3)
+        calculate_angles(a, b, c)
+        a, b = video[:, distance_joints.T].transpose(1, 0, 2, 3)
+        calculate_distances(a, b)
+        convert_coordinates_array(video[:, pixel_joints], image)
+
+    results = {}
+    for name, run in (("scalar", lambda: [scalar(frame) for frame in video]),
+                      ("batched", lambda: [batched(frame) for frame in video]),
+                      ("whole_video", whole_video)):
+        seconds = min(timeit.repeat(run, number=1, repeat=repeat))
+        results[name] = seconds / frames * 1e6
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the per-frame cost of the geometry helpers.")
+    parser.add_argument("--frames", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    arguments = parser.parse_args(argv)
+    results = benchmark(arguments.frames, arguments.repeat)
+    for name, microseconds in results.items():
+        print(f"{name:>12}: {microseconds:8.2f} us per frame ({results['scalar'] / microseconds:.1f}x)")
+
+if __name__ == "__main__":
+    main()
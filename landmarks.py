@@ -0,0 +1,156 @@
+import numpy as np
+
+# Number of landmarks in a MediaPipe Pose result.
+LANDMARK_COUNT = 33
+# Each landmark is stored as (x, y, z, visibility).
+X, Y, Z, VISIBILITY = range(4)
+
+# Index of each joint used in the analyses within the MediaPipe Pose landmarks.
+JOINTS = {
+    "left_shoulder": 11,
+    "right_shoulder": 12,
+    "left_wrist": 15,
+    "right_wrist": 16,
+    "left_hip": 23,
+    "right_hip": 24,
+    "left_knee": 25,
+    "right_knee": 26,
+    "left_ankle": 27,
+    "right_ankle": 28,
+    "left_heel": 29,
+    "right_heel": 30,
+    "left_toes": 31,
+    "right_toes": 32
+}
+
+
+# Landmark indices of joints given by name, in the same layout, e.g. an (n, 3) array for n
+# (a, b, c) triples of joint names.
+def joint_indices(names):
+    return np.vectorize(JOINTS.__getitem__, otypes=[np.intp])(np.array(names, dtype=object))
+
+
+# Convert MediaPipe Pose landmarks to a (33, 4) array.
+def landmarks_to_array(landmark_list):
+    return np.array([(landmark.x, landmark.y, landmark.z, landmark.visibility)
+                     for landmark in landmark_list.landmark], dtype=np.float32)
+
+
+# Gives access to the landmarks of the latest frame in a store by joint name, e.g.
+# joints["left_hip"] returns its (x, y, z, visibility) row.
+class Joints:
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, name):
+        return self.store.data[self.store.count - 1, JOINTS[name]]
+
+    def __contains__(self, name):
+        return name in JOINTS and self.store.count > 0
+
+
+# Stores the landmarks of every frame with a detected pose in a single float32 array of
+# frames x landmarks x (x, y, z, visibility), which grows as frames are added. Each frame takes
+# 528 bytes. If 'path' is given, the array is memory-mapped to that file so that long sessions do
+# not need to be held in memory. The running minimum and maximum of every landmark value are
+# maintained as frames are added.
+class LandmarkStore:
+
+    def __init__(self, capacity=256, path=None):
+        self.path = path
+        self.count = 0
+        self.data = self.allocate(max(1, capacity))
+        # Index of the video frame that each stored frame was taken from.
+        self.frame_indices = np.zeros(len(self.data), dtype=np.int32)
+        self.minimum = np.full((LANDMARK_COUNT, 4), np.inf, dtype=np.float32)
+        self.maximum = np.full((LANDMARK_COUNT, 4), -np.inf, dtype=np.float32)
+        self.latest = Joints(self)
+
+    def __len__(self):
+        return self.count
+
+    def allocate(self, capacity):
+        shape = (capacity, LANDMARK_COUNT, 4)
+        if self.path is None:
+            return np.zeros(shape, dtype=np.float32)
+        # Extend the file before mapping it, keeping the frames that are already stored.
+        with open(self.path, "ab") as file:
+            file.truncate(int(np.prod(shape)) * np.dtype(np.float32).itemsize)
+        return np.memmap(self.path, dtype=np.float32, mode="r+", shape=shape)
+
+    def grow(self):
+        capacity = 2 * len(self.data)
+        if self.path is None:
+            data = self.allocate(capacity)
+            data[:self.count] = self.data[:self.count]
+        else:
+            self.data.flush()
+            del self.data
+            data = self.allocate(capacity)
+        self.data = data
+        self.frame_indices = np.resize(self.frame_indices, capacity)
+
+    # Add the (33, 4) landmarks of a frame.
+    def append(self, landmarks, frame_index=None):
+        if self.count == len(self.data):
+            self.grow()
+        self.data[self.count] = landmarks
+        self.frame_indices[self.count] = self.count if frame_index is None else frame_index
+        np.minimum(self.minimum, self.data[self.count], out=self.minimum)
+        np.maximum(self.maximum, self.data[self.count], out=self.maximum)
+        self.count += 1
+
+    # Add the (frames, 33, 4) landmarks of several frames at once.
+    def extend(self, landmarks, frame_indices):
+        while self.count + len(landmarks) > len(self.data):
+            self.grow()
+        self.data[self.count:self.count + len(landmarks)] = landmarks
+        self.frame_indices[self.count:self.count + len(landmarks)] = frame_indices
+        if len(landmarks):
+            np.minimum(self.minimum, landmarks.min(axis=0), out=self.minimum)
+            np.maximum(self.maximum, landmarks.max(axis=0), out=self.maximum)
+        self.count += len(landmarks)
+
+    # The (x, y, z, visibility) values of a joint in every stored frame.
+    def series(self, name):
+        return self.data[:self.count, JOINTS[name]]
+
+    # The (landmarks, 4) array of the latest frame.
+    def latest_frame(self):
+        return self.data[self.count - 1]
+
+    # The (frames, landmarks, 4) array of every stored frame.
+    def frames(self):
+        return self.data[:self.count]
+
+    def smallest(self, name):
+        return self.minimum[JOINTS[name]]
+
+    def largest(self, name):
+        return self.maximum[JOINTS[name]]
+
+    # Forget the running minimum and maximum, e.g. at the start of a new repetition.
+    def reset_extrema(self):
+        self.minimum.fill(np.inf)
+        self.maximum.fill(-np.inf)
+
+    # Forget every stored frame but the latest, which becomes the running minimum and maximum, e.g.
+    # once a repetition has been analysed, so that memory does not grow with the length of a session.
+    def retain_latest(self):
+        if self.count == 0:
+            return
+        self.data[0] = self.data[self.count - 1]
+        self.frame_indices[0] = self.frame_indices[self.count - 1]
+        self.count = 1
+        self.minimum[:] = self.data[0]
+        self.maximum[:] = self.data[0]
+
+    # Forget every stored frame.
+    def clear(self):
+        self.count = 0
+        self.reset_extrema()
+
+    # Size of the stored landmarks in bytes.
+    def nbytes(self):
+        return self.count * LANDMARK_COUNT * 4 * self.data.itemsize
@@ -3,34 +3,55 @@ import deadlift
 import gui
 import threading
 import os
-from tkinter import messagebox
+import logging
+from analysis import Analysis
+from capture import is_live_source, parse_source
+from models import registry
 
 def main():
 
-    # Get user input.
-    launch_window = gui.Launch()
-    exercise, video_path = launch_window.get_values()
-    analysis_window = gui.Analysis()
+    # Show the events logged during the analysis, e.g. the detected view.
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
 
-    # Check if the video path is valid.
-    if not os.path.isfile(video_path):
-            messagebox.showerror("Error", f"The video file '{video_path}' does not exist.")
+    # Load and warm up the models while the user is selecting a video, so that the analysis can
+    # start straight away.
+    threading.Thread(target=registry.preload, args=(Analysis.pose_settings,), daemon=True).start()
 
-    if exercise == "Squat":
-        analysis1 = squat.Squat(video_path)
-        analysis1.exercise = "squat"
-        analysis_window.analysis = analysis1
-        threading.Thread(target=analysis1.process_video, args=(analysis_window,), daemon=True).start()
-        analysis_window.display(analysis1)
-    elif exercise == "Deadlift":
-        analysis1 = deadlift.Deadlift(video_path)
-        analysis1.exercise = "deadlift"
+    # Keep returning to the launch window for as long as the user chooses to change the video. The
+    # models stay loaded in between videos.
+    while True:
+
+        # Get user input.
+        launch_window = gui.Launch()
+        exercise, video_path = launch_window.get_values()
+        # The launch window was closed without launching an analysis.
+        if exercise is None:
+            break
+
+        # A camera index or stream URL is analysed live; anything else must be an existing file.
+        source = parse_source(video_path)
+        live = is_live_source(source)
+        if not live and not os.path.isfile(source):
+            launch_window.show_path_error(video_path)
+            continue
+
+        if exercise == "Squat":
+            analysis1 = squat.Squat(source, live=live)
+            analysis1.exercise = "squat"
+        elif exercise == "Deadlift":
+            analysis1 = deadlift.Deadlift(source, live=live)
+            analysis1.exercise = "deadlift"
+        else:
+            launch_window.show_selection_error()
+            print("Please select an exercise from the drop down menu.")
+            continue
+
+        analysis_window = gui.Analysis()
         analysis_window.analysis = analysis1
         threading.Thread(target=analysis1.process_video, args=(analysis_window,), daemon=True).start()
         analysis_window.display(analysis1)
-    else:
-        launch_window.show_selection_error()
-        print("Please select an exercise from the drop down menu.")
+        if not analysis_window.change_requested:
+            break
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,193 @@
+import argparse
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+
+# Number of latest durations of each stage that the percentiles are computed over.
+DEFAULT_WINDOW = 1000
+# Minimum number of seconds in between two log events of the same kind.
+DEFAULT_LOG_INTERVAL = 1.0
+PERCENTILES = (50, 95, 99)
+
+
+# The wall time spent in one stage of the analysis: totals over the whole run, and the latest
+# 'window' durations for rolling percentiles.
+class StageTiming:
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.frames = 0
+        self.calls = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        self.recent = deque(maxlen=window)
+
+    def add(self, seconds, frames=1):
+        self.frames += frames
+        self.calls += 1
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+        # A call that handled a batch of frames is counted as its time per frame.
+        self.recent.append(seconds / frames if frames else seconds)
+
+    def summary(self):
+        recent = np.array(self.recent) * 1000
+        summary = {
+            "frames": self.frames,
+            "calls": self.calls,
+            "total_seconds": self.total,
+            "mean_ms": self.total * 1000 / self.frames if self.frames else 0.0,
+            "max_ms": self.maximum * 1000
+        }
+        for percentile in PERCENTILES:
+            summary[f"p{percentile}_ms"] = float(np.percentile(recent, percentile)) if len(recent) else 0.0
+        return summary
+
+
+# Records the wall time spent in each stage of an analysis (decoding, detection, pose estimation,
+# the measurements, the view analyses, rendering and display) from whichever thread runs it.
+class Metrics:
+
+    def __init__(self, window=DEFAULT_WINDOW, clock=time.perf_counter):
+        self.window = window
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stages = {}
+            self.counters = {}
+            self.started = self.clock()
+
+    def record(self, stage, seconds, frames=1):
+        with self.lock:
+            timing = self.stages.get(stage)
+            if timing is None:
+                timing = self.stages[stage] = StageTiming(self.window)
+            timing.add(seconds, frames)
+
+    # Add 'amount' to the counter 'name', e.g. the number of frame buffers allocated.
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    @contextmanager
+    def time(self, stage, frames=1):
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.record(stage, self.clock() - start, frames)
+
+    # Wrap 'process' so that every call to it is recorded under 'stage'.
+    def timed(self, stage, process, batched=False):
+        def timed_process(item):
+            with self.time(stage, len(item) if batched else 1):
+                return process(item)
+        return timed_process
+
+    def summary(self):
+        with self.lock:
+            stages = {stage: timing.summary() for stage, timing in self.stages.items()}
+            counters = dict(self.counters)
+        return {"wall_seconds": self.clock() - self.started, "stages": stages, "counters": counters}
+
+    def write_json(self, path):
+        with open(path, "w") as file:
+            json.dump(self.summary(), file, indent=2)
+
+    # A snapshot of the metrics in the Prometheus text exposition format.
+    def prometheus(self, prefix="reform"):
+        summary = self.summary()
+        lines = [f"# HELP {prefix}_stage_seconds Wall time spent in each stage of the analysis.",
+                 f"# TYPE {prefix}_stage_seconds summary"]
+        for stage, timing in summary["stages"].items():
+            for percentile in PERCENTILES:
+                lines.append(f'{prefix}_stage_seconds{{stage="{stage}",quantile="{percentile / 100}"}} '
+                             f'{timing[f"p{percentile}_ms"] / 1000:.6f}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {timing["total_seconds"]:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {timing["calls"]}')
+        lines += [f"# HELP {prefix}_stage_frames_total Frames handled by each stage of the analysis.",
+                  f"# TYPE {prefix}_stage_frames_total counter"]
+        for stage, timing in summary["stages"].items():
+            lines.append(f'{prefix}_stage_frames_total{{stage="{stage}"}} {timing["frames"]}')
+        for name, value in summary["counters"].items():
+            lines += [f"# TYPE {prefix}_{name}_total counter", f"{prefix}_{name}_total {value}"]
+        lines += [f"# HELP {prefix}_wall_seconds Wall time since the run started.",
+                  f"# TYPE {prefix}_wall_seconds gauge",
+                  f"{prefix}_wall_seconds {summary['wall_seconds']:.6f}"]
+        return "\n".join(lines) + "\n"
+
+    # One line of text per stage with its median and 95th percentile time per frame, for the
+    # on-screen overlay.
+    def overlay_lines(self):
+        return [f"{stage}: {timing['p50_ms']:.1f} / {timing['p95_ms']:.1f} ms"
+                for stage, timing in self.summary()["stages"].items()]
+
+
+# Logs structured events (a JSON object per line) at most once every 'interval' seconds for each
+# kind of event, so that events raised on every frame do not slow the analysis down. The number of
+# events that were suppressed since the last one was logged is added to each event.
+class EventLog:
+
+    def __init__(self, logger, interval=DEFAULT_LOG_INTERVAL, clock=time.monotonic):
+        self.logger = logger
+        self.interval = interval
+        self.clock = clock
+        self.lock = threading.Lock()
+        # Time at which each kind of event was last logged, and the number suppressed since.
+        self.last_logged = {}
+        self.suppressed = {}
+
+    def event(self, name, level=logging.INFO, **fields):
+        if not self.logger.isEnabledFor(level):
+            return
+        now = self.clock()
+        with self.lock:
+            if now - self.last_logged.get(name, -self.interval) < self.interval:
+                self.suppressed[name] = self.suppressed.get(name, 0) + 1
+                return
+            self.last_logged[name] = now
+            suppressed = self.suppressed.pop(name, 0)
+        if suppressed:
+            fields["suppressed"] = suppressed
+        self.logger.log(level, json.dumps({"event": name, **fields}, default=str))
+
+
+events = EventLog(logging.getLogger("reform"))
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse a video without the GUI and report the time spent in "
+                                                 "each stage of the analysis.")
+    parser.add_argument("video")
+    parser.add_argument("--exercise", required=True, choices=("squat", "deadlift"))
+    parser.add_argument("--format", default="json", choices=("json", "prometheus"))
+    parser.add_argument("--output", default=None, help="File to write the metrics to (default: print them).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    # Imported here since the exercise modules depend on the models.
+    from batch import create_analysis
+    analysis = create_analysis(arguments.exercise, arguments.video)
+    analysis.process_video()
+    if arguments.format == "json":
+        text = json.dumps(analysis.metrics.summary(), indent=2)
+    else:
+        text = analysis.metrics.prometheus()
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            file.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import threading
+from contextlib import contextmanager
+import numpy as np
+import mediapipe as mp
+from ultralytics import YOLO
+from detection import MODEL_PATH
+
+# Size of the blank frame that the models are warmed up on.
+WARM_UP_FRAME_SHAPE = (640, 640, 3)
+
+
+# Loads the barbell detector and the pose graph once per process and lends them out to analyses,
+# so that only the first analysis pays the cost of loading them. A model is only lent to one
+# analysis at a time; if every loaded instance is in use, another one is loaded. Either model can
+# be replaced by another backend, e.g. a deterministic stub for benchmarks.
+class ModelRegistry:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Instances that are not currently lent out, by model key.
+        self.idle = {}
+        self.loaded = 0
+        # Functions that load a replacement for the "detector" model or the "pose" graph, by kind.
+        self.backends = {}
+
+    # Load the model of 'kind' with 'load()' from now on, or with the default loader again if
+    # 'load' is None. The pose backend must be able to 'process' an RGB frame like a MediaPipe Pose
+    # graph, and the detector backend must be callable on frames like a YOLO model.
+    def use_backend(self, kind, load=None):
+        with self.lock:
+            if load is None:
+                self.backends.pop(kind, None)
+            else:
+                self.backends[kind] = load
+
+    @contextmanager
+    def lease(self, key, load):
+        with self.lock:
+            instances = self.idle.setdefault(key, [])
+            instance = instances.pop() if instances else None
+        if instance is None:
+            instance = load()
+            with self.lock:
+                self.loaded += 1
+        try:
+            yield instance
+        finally:
+            with self.lock:
+                self.idle.setdefault(key, []).append(instance)
+
+    # Lend out the YOLO barbell detector model stored at 'path'.
+    def detector_model(self, path=MODEL_PATH, warm_up=False):
+        load = self.backends.get("detector")
+        if load is not None:
+            return self.lease(("detector", load), load)
+        return self.lease(("detector", path), lambda: self.load_detector_model(path, warm_up))
+
+    # Lend out a MediaPipe Pose graph created with the keyword arguments 'settings'. A graph in
+    # tracking mode carries the region and the smoothed landmarks of the last frame it saw over to
+    # the next one, so it is reset on every lease: each playback starts from a clean graph, whatever
+    # the graph was used for before.
+    @contextmanager
+    def pose(self, warm_up=False, **settings):
+        load = self.backends.get("pose")
+        if load is not None:
+            key = ("pose", load)
+        else:
+            key, load = ("pose", tuple(sorted(settings.items()))), lambda: self.load_pose(settings, warm_up)
+        with self.lease(key, load) as pose:
+            pose.reset()
+            yield pose
+
+    @staticmethod
+    def load_detector_model(path, warm_up):
+        model = YOLO(path)
+        if warm_up:
+            model(np.zeros(WARM_UP_FRAME_SHAPE, dtype=np.uint8), verbose=False)
+        return model
+
+    @staticmethod
+    def load_pose(settings, warm_up):
+        pose = mp.solutions.pose.Pose(**settings)
+        if warm_up:
+            pose.process(np.zeros(WARM_UP_FRAME_SHAPE, dtype=np.uint8))
+        return pose
+
+    # Load and warm up one instance of the detector and of the pose graph ahead of the first
+    # analysis.
+    def preload(self, pose_settings=None):
+        with self.detector_model(warm_up=True):
+            pass
+        with self.pose(warm_up=True, **(pose_settings or {})):
+            pass
+
+    # Close and forget every idle model.
+    def clear(self):
+        with self.lock:
+            idle, self.idle = self.idle, {}
+        for (kind, _), instances in idle.items():
+            if kind == "pose":
+                for pose in instances:
+                    pose.close()
+
+
+# The registry shared by every analysis in the process.
+registry = ModelRegistry()
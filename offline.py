@@ -0,0 +1,297 @@
+import argparse
+import json
+import time
+import numpy as np
+from helpers import calculate_angles, calculate_distances
+from landmarks import JOINTS, X, Y, VISIBILITY
+
+# Codes of the views and phases in the per-frame arrays.
+VIEWS = ("", "front", "left", "right")
+NO_VIEW, FRONT, LEFT, RIGHT = range(4)
+# Either of the side views, where only the difference between the side and the front matters.
+SIDE = LEFT
+PHASES = ("", "standing", "squatting", "deadlifting")
+NO_PHASE, STANDING, SQUATTING, DEADLIFTING = range(4)
+
+
+# The category of each frame, given a list of (mask, category) pairs checked in order, as an
+# if/elif/else chain would.
+def categorise(conditions, default):
+    return np.select([mask for mask, _ in conditions], [category for _, category in conditions], default)
+
+
+def last(indices):
+    return indices[-1] if len(indices) else None
+
+
+# Everything about a whole video that the exercise rules depend on, computed once for every frame
+# with a detected pose.
+class VideoFeatures:
+
+    def __init__(self, landmarks, frame_indices, barbell_frames, barbell_x, view=NO_VIEW, barbell_start=0):
+        # (frames, 33, 4) landmarks and the index of the video frame that each was taken from.
+        self.landmarks = landmarks
+        self.frame_indices = frame_indices
+        self.count = len(landmarks)
+        self.determine_views(view)
+        self.determine_segment()
+        self.determine_bar_path(np.asarray(barbell_frames), np.asarray(barbell_x, dtype=np.float64), barbell_start)
+
+    def joint(self, name):
+        return self.landmarks[:, JOINTS[name]]
+
+    # Angle at joint 'b' in between joints 'a', 'b' and 'c' in every frame.
+    def angle(self, a, b, c):
+        return calculate_angles(self.joint(a), self.joint(b), self.joint(c))
+
+    def distance(self, a, b):
+        return calculate_distances(self.joint(a), self.joint(b))
+
+    # The view of each frame, as determined by 'Analysis.determine_view'. Frames where the view
+    # cannot be determined keep the view of the previous frame, or 'view' (the view of the frames
+    # before these ones, e.g. in an earlier repetition) at the start.
+    def determine_views(self, view=NO_VIEW):
+        right_visible = self.joint("right_knee")[:, VISIBILITY] >= 0.7
+        left_visible = self.joint("left_knee")[:, VISIBILITY] >= 0.7
+        codes = categorise([(right_visible & left_visible, FRONT), (right_visible, RIGHT), (left_visible, LEFT)],
+                           NO_VIEW)
+        if self.count and codes[0] == NO_VIEW:
+            codes[0] = view
+        # Carry the last determined view forward.
+        determined = np.where(codes != NO_VIEW, np.arange(self.count), 0)
+        self.views = codes[np.maximum.accumulate(determined)] if self.count else codes
+
+    # The results are reset whenever the view changes between the side and the front, so the
+    # final results only depend on the frames since the last change ('segment').
+    def determine_segment(self):
+        sides = np.where(self.views == FRONT, FRONT, np.where(self.views == NO_VIEW, NO_VIEW, SIDE))
+        changes = np.flatnonzero(sides[1:] != sides[:-1]) + 1
+        start = changes[-1] if len(changes) else 0
+        self.segment = np.zeros(self.count, dtype=bool)
+        self.segment[start:] = True
+        # NO_VIEW, FRONT or SIDE in the final segment.
+        self.side = sides[-1] if self.count else NO_VIEW
+        self.view = VIEWS[self.views[-1]] if self.count else ""
+
+    # Whether a barbell has been detected by each frame, and whether the barbell path of the
+    # repetition up to each frame is straight, as determined by 'Analysis.analyse_bar_path'. The
+    # repetition's detections start at index 'barbell_start' of the detections of the video.
+    def determine_bar_path(self, barbell_frames, barbell_x, barbell_start=0):
+        # Number of barbell detections up to and including each frame.
+        detections = np.searchsorted(barbell_frames, self.frame_indices, side="right")
+        self.has_barbell = detections > 0
+        self.bar_path_straight = np.ones(self.count, dtype=bool)
+        rep_x = barbell_x[barbell_start:]
+        if len(rep_x):
+            lateral_range = np.maximum.accumulate(rep_x) - np.minimum.accumulate(rep_x)
+            in_rep = detections > barbell_start
+            self.bar_path_straight[in_rep] = lateral_range[detections[in_rep] - 1 - barbell_start] <= 50
+
+    # Frames of the final segment that satisfy 'mask'.
+    def frames(self, mask=True):
+        return np.flatnonzero(self.segment & mask)
+
+
+# The result of scoring a whole video: the per-frame angles, distances, phases and fault
+# categories, and the final results.
+class VideoScore:
+
+    def __init__(self, features):
+        self.features = features
+        self.view = features.view
+        self.angles = {}
+        self.distances = {}
+        self.phases = np.full(features.count, NO_PHASE)
+        self.faults = {}
+        self.results = {}
+
+    def phase_names(self):
+        return np.array(PHASES)[self.phases]
+
+
+def current(categories, frame):
+    return str(categories[frame]) if frame is not None else ""
+
+
+# Score a whole squat with the rules of 'squat.Squat'.
+def score_squat(features):
+    score = VideoScore(features)
+    hip, knee = features.joint("left_hip"), features.joint("left_knee")
+    left_ankle, right_ankle = features.joint("left_ankle"), features.joint("right_ankle")
+    score.angles["hip_knee_heel_angle"] = hip_knee_heel = features.angle("left_hip", "left_knee", "left_heel")
+    score.angles["shoulder_hip_knee_angle"] = shoulder_hip_knee = features.angle("left_shoulder", "left_hip",
+                                                                                 "left_knee")
+    score.angles["left_toes_ankles_angle"] = left_toes = features.angle("left_toes", "left_ankle", "right_ankle")
+    score.angles["right_toes_ankles_angle"] = right_toes = features.angle("right_toes", "right_ankle", "left_ankle")
+    score.angles["smallest_hip_knee_heel_angle"] = smallest_hip_knee_heel = np.minimum.accumulate(hip_knee_heel)
+    score.distances["shoulder_knee_distance"] = np.abs(features.joint("left_shoulder")[:, Y] - knee[:, Y])
+    score.distances["feet_distance"] = feet = features.distance("left_heel", "right_heel")
+    score.distances["shoulder_distance"] = shoulders = features.distance("left_shoulder", "right_shoulder")
+
+    # 'Squat.determine_phase' only determines the phase of the left side and front views.
+    left, front = features.views == LEFT, features.views == FRONT
+    squatting_distance = score.distances["shoulder_knee_distance"] < 0.4
+    score.phases = categorise([(left & (hip_knee_heel > 120), STANDING), (left & (hip_knee_heel < 120), SQUATTING),
+                               (front & ~squatting_distance, STANDING), (front & squatting_distance, SQUATTING)],
+                              NO_PHASE)
+    squatting = features.frames(score.phases == SQUATTING)
+    barbell = features.has_barbell[-1] if features.count else False
+
+    if features.side == SIDE:
+        torso_shin_angle_diff = shoulder_hip_knee - hip_knee_heel
+        score.faults["torso"] = torso = categorise([(torso_shin_angle_diff > 10, "upright"),
+                                                    (torso_shin_angle_diff < -10, "forward")], "adequate")
+        largest_hip_y = np.maximum.accumulate(hip[:, Y])
+        largest_knee_y = np.maximum.accumulate(knee[:, Y])
+        score.faults["depth"] = depth = categorise([(largest_hip_y < largest_knee_y, "shallow"),
+                                                    (smallest_hip_knee_heel < 30, "deep")], "adequate")
+        score.results = {
+            "torso": {
+                "current": current(torso, last(squatting)),
+                "upright": int(np.count_nonzero(torso[squatting] == "upright")),
+                "adequate": int(np.count_nonzero(torso[squatting] == "adequate")),
+                "forward": int(np.count_nonzero(torso[squatting] == "forward"))
+            },
+            "depth": {
+                "current": current(depth, last(squatting)),
+                "shallow": False,
+                "adequate": False,
+                "deep": False
+            }
+        }
+        if barbell:
+            # The barbell path is evaluated on every squatting frame once a barbell is detected.
+            frame = last(squatting[features.has_barbell[squatting]])
+            score.results["barbell"] = {
+                "straight": bool(features.bar_path_straight[frame]) if frame is not None else True
+            }
+
+    elif features.side == FRONT:
+        score.faults["feet"] = feet_stance = categorise([(feet > 1.2 * shoulders, "far"),
+                                                         (feet > 0.8 * shoulders, "close")], "adequate")
+        score.faults["left_toes"] = left_toes_direction = toes_direction(left_toes)
+        score.faults["right_toes"] = right_toes_direction = toes_direction(right_toes)
+        score.faults["left_knee"] = left_knee = np.where(knee[:, X] < left_ankle[:, X], "inward", "adequate")
+        score.faults["right_knee"] = right_knee = np.where(features.joint("right_knee")[:, X] > right_ankle[:, X],
+                                                           "inward", "adequate")
+        frame = last(squatting)
+        score.results = {
+            "feet": flags(feet_stance, squatting, ("far", "adequate", "close")),
+            # The toe flags are never set by 'Squat.analyse_front_view'.
+            "right_toes": flags(right_toes_direction, squatting[:0], ("outward", "adequate", "inward"), frame),
+            "left_toes": flags(left_toes_direction, squatting[:0], ("outward", "adequate", "inward"), frame),
+            "right_knee": flags(right_knee, squatting, ("inward", "adequate")),
+            "left_knee": flags(left_knee, squatting, ("inward", "adequate"))
+        }
+        if barbell:
+            score.results["barbell"] = {"left": False, "balanced": False, "right": False}
+    return score
+
+
+# Score a whole deadlift with the rules of 'deadlift.Deadlift'.
+def score_deadlift(features):
+    score = VideoScore(features)
+    shoulder, hip = features.joint("left_shoulder"), features.joint("left_hip")
+    score.angles["shoulder_hip_knee_angle"] = shoulder_hip_knee = features.angle("left_shoulder", "left_hip",
+                                                                                 "left_knee")
+    score.angles["left_toes_ankles_angle"] = left_toes = features.angle("left_toes", "left_ankle", "right_ankle")
+    score.angles["right_toes_ankles_angle"] = right_toes = features.angle("right_toes", "right_ankle", "left_ankle")
+    score.angles["largest_shoulder_hip_knee_angle"] = largest = np.maximum.accumulate(shoulder_hip_knee)
+    score.distances["feet_distance"] = feet = features.distance("left_heel", "right_heel")
+    score.distances["shoulder_distance"] = shoulders = features.distance("left_shoulder", "right_shoulder")
+
+    side = (features.views == LEFT) | (features.views == RIGHT)
+    score.phases = categorise([(side & (shoulder_hip_knee >= 150), STANDING),
+                               (side & (shoulder_hip_knee < 150), DEADLIFTING)], NO_PHASE)
+    barbell = features.has_barbell[-1] if features.count else False
+
+    if features.side == SIDE:
+        high = (hip[:, Y] < shoulder[:, Y]) | (features.joint("right_hip")[:, Y] < features.joint("right_shoulder")[:, Y])
+        score.faults["hips"] = np.where(high, "high", "adequate")
+        any_high = bool(np.any(high[features.segment]))
+
+        # The back is no longer analysed once it has been overextended while standing.
+        standing = features.frames(score.phases == STANDING)
+        overextended = last(standing[shoulder_hip_knee[standing] >= 175][:1])
+        if overextended is not None:
+            standing = standing[standing <= overextended]
+        score.faults["back"] = back = np.where(largest < 165, "overflexed", "adequate")
+        score.results = {
+            "hips": {
+                "current": "high" if any_high else "",
+                "high": True if any_high else 0,
+                "adequate": 0,
+            },
+            "back": {
+                "current": current(back, last(standing)),
+                "overextended": overextended is not None,
+                "adequate": bool(np.any(back[standing] == "adequate")),
+                "overflexed": bool(np.any(back[standing] == "overflexed"))
+            }
+        }
+        if barbell:
+            score.results["barbell"] = {"straight": True}
+
+    elif features.side == FRONT:
+        # The front view is analysed on every frame, whatever the phase.
+        frames = features.frames()
+        score.faults["feet"] = feet_stance = categorise([(feet > 1.1 * shoulders, "far"),
+                                                         (feet < 0.7 * shoulders, "close")], "adequate")
+        score.faults["left_toes"] = left_toes_direction = toes_direction(left_toes)
+        score.faults["right_toes"] = right_toes_direction = toes_direction(right_toes)
+        frame = last(frames)
+        score.results = {
+            "feet": flags(feet_stance, frames, ("far", "adequate", "close")),
+            # The toe flags are never set by 'Deadlift.analyse_front_view'.
+            "right_toes": flags(right_toes_direction, frames[:0], ("outward", "adequate", "inward"), frame),
+            "left_toes": flags(left_toes_direction, frames[:0], ("outward", "adequate", "inward"), frame)
+        }
+    return score
+
+
+def toes_direction(toes_ankles_angle):
+    return categorise([(toes_ankles_angle > 140, "outward"), (toes_ankles_angle < 110, "inward")], "adequate")
+
+
+# Build a result with the 'current' category of the last analysed frame, and a flag for each
+# category that is set if any of the 'flagged' frames was in that category.
+def flags(categories, flagged, names, frame=None):
+    frame = last(flagged) if frame is None else frame
+    result = {"current": current(categories, frame)}
+    for name in names:
+        result[name] = bool(np.any(categories[flagged] == name))
+    return result
+
+
+# Re-score a video from the landmarks and detections cached by a previous analysis, without
+# decoding the video or running the models.
+def rescore(video_path, exercise, cache_dir=None):
+    # Imported here since the exercise modules depend on this module.
+    from batch import create_analysis
+    from cache import LandmarkCache
+    analysis = create_analysis(exercise, video_path, cache=True, cache_dir=cache_dir)
+    cache = LandmarkCache(cache_dir)
+    entry = cache.load(cache.key(video_path, analysis.cache_config()))
+    if entry is None:
+        return None
+    analysis.analyse_offline(entry)
+    return analysis
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-score a previously analysed video from the cache.")
+    parser.add_argument("video")
+    parser.add_argument("--exercise", required=True, choices=("squat", "deadlift"))
+    parser.add_argument("--cache-dir", default=None)
+    arguments = parser.parse_args(argv)
+    start = time.perf_counter()
+    analysis = rescore(arguments.video, arguments.exercise, arguments.cache_dir)
+    if analysis is None:
+        print(f"'{arguments.video}' is not in the cache. Analyse it with the 'cache' option first.")
+        return
+    print(json.dumps({"view": analysis.view, "results": analysis.set_results(), "reps": analysis.reps}, indent=2))
+    print(f"Re-scored {analysis.frame_count} frames in {(time.perf_counter() - start) * 1000:.1f} ms.")
+
+
+if __name__ == "__main__":
+    main()
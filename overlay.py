@@ -0,0 +1,76 @@
+import cv2
+
+
+# Records the annotations of a frame (the pose skeleton, the barbell boxes and the lines, circles
+# and crosses of the analysis) as draw commands, and renders all of them onto a single copy of the
+# frame once it is displayed. Translucent commands are drawn straight onto that copy and blended
+# with the pixels they covered in one pass over the region they span, instead of once per command.
+# A disabled overlay records nothing, e.g. when the video is analysed without being displayed.
+class Overlay:
+
+    # The frame is brightened slightly under the annotations.
+    brightness = 1.4
+
+    def __init__(self, shape, enabled=True):
+        # Shape of the frame that the overlay is drawn onto.
+        self.shape = shape
+        self.enabled = enabled
+        self.commands = []
+        # (opacity, draw, args, (left, top, right, bottom)) of each translucent command.
+        self.translucent = []
+
+    def __len__(self):
+        return len(self.commands) + len(self.translucent)
+
+    # Record a call to 'draw(image, *args)'. Commands with an 'opacity' below 1 must give the
+    # 'bounds' of the pixels that they may draw onto.
+    def add(self, draw, *args, opacity=1.0, bounds=None):
+        if not self.enabled:
+            return
+        if opacity < 1.0:
+            self.translucent.append((opacity, draw, args, bounds))
+        else:
+            self.commands.append((draw, args))
+
+    # Record the commands of another overlay, e.g. to show the annotations of an earlier frame again.
+    def extend(self, other):
+        if not self.enabled:
+            return
+        self.commands.extend(other.commands)
+        self.translucent.extend(other.translucent)
+
+    def line(self, start, end, colour, thickness=1, opacity=1.0):
+        bounds = (min(start[0], end[0]) - thickness, min(start[1], end[1]) - thickness,
+                  max(start[0], end[0]) + thickness + 1, max(start[1], end[1]) + thickness + 1)
+        self.add(cv2.line, start, end, colour, thickness, opacity=opacity, bounds=bounds)
+
+    def circle(self, centre, radius, colour, thickness=1):
+        self.add(cv2.circle, centre, radius, colour, thickness)
+
+    def rectangle(self, top_left, bottom_right, colour, thickness=1):
+        self.add(cv2.rectangle, top_left, bottom_right, colour, thickness)
+
+    def text(self, text, origin, colour, scale=0.6, thickness=2):
+        self.add(cv2.putText, text, origin, cv2.FONT_HERSHEY_SIMPLEX, scale, colour, thickness)
+
+    # Render the recorded commands onto a copy of 'frame', made in 'out' if it is given (an array of
+    # the same shape, reused from frame to frame).
+    def render(self, frame, out=None):
+        image = cv2.convertScaleAbs(frame, dst=out, alpha=self.brightness)
+        height, width = image.shape[:2]
+        for opacity in sorted({command[0] for command in self.translucent}):
+            group = [command for command in self.translucent if command[0] == opacity]
+            left = max(0, int(min(bounds[0] for _, _, _, bounds in group)))
+            top = max(0, int(min(bounds[1] for _, _, _, bounds in group)))
+            right = min(width, int(max(bounds[2] for _, _, _, bounds in group)))
+            bottom = min(height, int(max(bounds[3] for _, _, _, bounds in group)))
+            if right <= left or bottom <= top:
+                continue
+            region = image[top:bottom, left:right]
+            covered = region.copy()
+            for _, draw, args, _ in group:
+                draw(image, *args)
+            image[top:bottom, left:right] = cv2.addWeighted(region, opacity, covered, 1 - opacity, 0)
+        for draw, args in self.commands:
+            draw(image, *args)
+        return image
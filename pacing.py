@@ -0,0 +1,56 @@
+import time
+
+# Frame rate assumed when the container does not report one.
+DEFAULT_FPS = 30.0
+
+
+# Paces the analysis of a video to the wall clock. Each frame is due at the time given by its
+# timestamp, counted from when the first frame was read. A stage that receives a frame more than
+# 'budget' seconds (one frame interval by default) after it was due skips its work on that frame,
+# so that the analysis catches up instead of playing in slow motion, and frames are not shown
+# before they are due, so that the video does not play faster than real time either.
+class Pacer:
+
+    def __init__(self, fps=DEFAULT_FPS, budget=None, clock=time.perf_counter):
+        self.fps = fps if fps and fps > 0 else DEFAULT_FPS
+        self.budget = budget if budget is not None else 1 / self.fps
+        self.clock = clock
+        # Wall-clock time at which the frame with a timestamp of 0 is due.
+        self.origin = None
+        self.started = None
+        self.analysed_frames = 0
+        # Frames whose pose was carried forward from an earlier frame.
+        self.dropped_frames = 0
+
+    # Called with the timestamp of the first frame, as it is read.
+    def start(self, timestamp=0.0):
+        self.started = self.clock()
+        self.origin = self.started - timestamp
+
+    # Seconds since the frame was due (negative if it is early).
+    def lateness(self, timestamp):
+        if self.origin is None:
+            return 0.0
+        return self.clock() - (self.origin + timestamp)
+
+    def can_afford(self, timestamp):
+        return self.lateness(timestamp) <= self.budget
+
+    # Wait until the frame is due, or until 'stop_event' is set.
+    def wait(self, timestamp, stop_event):
+        delay = -self.lateness(timestamp)
+        if delay > 0:
+            stop_event.wait(delay)
+
+    def record(self, dropped):
+        if dropped:
+            self.dropped_frames += 1
+        else:
+            self.analysed_frames += 1
+
+    # Frames analysed per second of wall-clock time.
+    def analysis_rate(self):
+        if self.started is None:
+            return 0.0
+        elapsed = self.clock() - self.started
+        return self.analysed_frames / elapsed if elapsed > 0 else 0.0
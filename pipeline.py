@@ -0,0 +1,217 @@
+import queue
+import threading
+from errors import CustomError
+
+# Passed from one stage to the next to mark the end of the stream.
+END_OF_STREAM = object()
+
+# Interval (in seconds) at which blocked stages wake up to check whether the pipeline is stopping.
+POLL_INTERVAL = 0.1
+
+
+# Carries a single video frame and everything computed for it through the pipeline.
+class FramePacket:
+
+    def __init__(self, index, frame, pool=None):
+        self.index = index
+        # The decoded BGR frame, exactly as read from the video. It is shared by every stage (and
+        # by the models), so it is only handed out as a read-only view.
+        self.frame = frame.view()
+        self.frame.flags.writeable = False
+        # The pool that the frame's buffer was taken from, if any. The buffer is returned to it once
+        # the packet has been displayed or dropped.
+        self.pool = pool
+        self.buffer = frame if pool is not None else None
+        # Position of the frame in the video, in seconds.
+        self.timestamp = 0.0
+        # Wall-clock time (time.perf_counter) at which a live frame was captured, or None.
+        self.captured_at = None
+        # Set when the detections or the pose of an earlier frame were carried forward to this
+        # frame instead of being computed, because the frame arrived too late to afford it.
+        self.detections_carried = False
+        self.pose_carried = False
+        # Barbell detections as (x, y, width, height, confidence, class) tuples in frame pixels.
+        self.detections = []
+        # The MediaPipe Pose landmarks of the frame, or None if no pose was detected.
+        self.pose_landmarks = None
+        # The same landmarks as a (33, 4) array of (x, y, z, visibility) values.
+        self.landmarks = None
+        # The annotations of the frame, rendered onto it once it is displayed.
+        self.overlay = None
+        # The final frame to be displayed.
+        self.output = None
+
+    # Return the frame's buffer to its pool, to be reused for a later frame. The frame must not be
+    # used afterwards.
+    def release(self):
+        if self.pool is not None:
+            self.pool.release(self.buffer)
+            self.pool = self.buffer = None
+
+
+# Release a packet, or every packet of a batch, that will not reach the sink.
+def release(item):
+    if isinstance(item, list):
+        for packet in item:
+            release(packet)
+    elif isinstance(item, FramePacket):
+        item.release()
+
+
+# A single step of the pipeline. 'process' receives a packet and returns the packet to be passed
+# on to the next stage, or None to drop it. If 'batch_size' is larger than 1, 'process' instead
+# receives a list of up to 'batch_size' consecutive packets and returns the list of packets to be
+# passed on.
+class Stage:
+
+    def __init__(self, name, process, batch_size=1):
+        self.name = name
+        self.process = process
+        self.batch_size = batch_size
+
+
+# Runs a source, a sequence of stages and a sink on their own threads, joined by bounded queues.
+# Each stage handles one packet at a time in the order it was received, so frame order is
+# preserved while the stages overlap. A full queue blocks the stage feeding it (backpressure),
+# so the throughput is set by the slowest stage and at most 'queue_depth' frames wait between
+# any two stages. If 'metrics' is given, the time spent in each stage is recorded under its name.
+class Pipeline:
+
+    def __init__(self, source, stages, sink=None, queue_depth=4, metrics=None):
+        if queue_depth < 1:
+            raise CustomError("The queue depth must be at least 1.", "invalid_queue_depth")
+        self.source = source
+        self.stages = stages
+        self.sink = sink
+        self.queue_depth = queue_depth
+        self.metrics = metrics
+        self.stop_event = threading.Event()
+        self.error = None
+        self.threads = []
+        self.queues = []
+
+    def start(self):
+        queues = self.queues = [queue.Queue(maxsize=self.queue_depth) for _ in range(len(self.stages) + 1)]
+        self.threads = [threading.Thread(target=self.guard, args=(self.produce, queues[0]),
+                                         name="source", daemon=True)]
+        for i, stage in enumerate(self.stages):
+            process = stage.process
+            if self.metrics is not None:
+                process = self.metrics.timed(stage.name, process, batched=stage.batch_size > 1)
+            if stage.batch_size > 1:
+                args = (self.consume_batches, queues[i], queues[i + 1], process, stage.batch_size)
+            else:
+                args = (self.consume, queues[i], queues[i + 1], process)
+            self.threads.append(threading.Thread(target=self.guard, args=args, name=stage.name, daemon=True))
+        self.threads.append(threading.Thread(target=self.guard, args=(self.consume, queues[-1], None, self.sink),
+                                             name="sink", daemon=True))
+        for thread in self.threads:
+            thread.start()
+
+    # Wait for every stage to finish and re-raise the first error raised by any of them. The packets
+    # left in the queues by a stop are released.
+    def join(self):
+        for thread in self.threads:
+            thread.join()
+        for remaining in self.queues:
+            while True:
+                try:
+                    release(remaining.get_nowait())
+                except queue.Empty:
+                    break
+        if self.error is not None:
+            raise self.error
+
+    def run(self):
+        self.start()
+        self.join()
+
+    # Request a shutdown. Every stage exits at its next queue operation, without waiting for the
+    # remaining frames to be processed.
+    def stop(self):
+        self.stop_event.set()
+
+    def is_running(self):
+        return any(thread.is_alive() for thread in self.threads)
+
+    def guard(self, target, *args):
+        try:
+            target(*args)
+        except Exception as error:
+            if self.error is None:
+                self.error = error
+            self.stop()
+
+    def produce(self, output_queue):
+        try:
+            for packet in self.source:
+                if not self.put(output_queue, packet):
+                    release(packet)
+                    break
+        finally:
+            # Release the source (e.g. the video capture) if it is a generator.
+            close = getattr(self.source, "close", None)
+            if close is not None:
+                close()
+            self.put(output_queue, END_OF_STREAM)
+
+    def consume(self, input_queue, output_queue, process):
+        while True:
+            packet = self.get(input_queue)
+            if packet is END_OF_STREAM:
+                if output_queue is not None:
+                    self.put(output_queue, END_OF_STREAM)
+                return
+            if process is not None:
+                processed = process(packet)
+                # A dropped packet never reaches the sink, so its buffer is returned here.
+                if processed is None:
+                    release(packet)
+                packet = processed
+            if packet is not None and output_queue is not None:
+                if not self.put(output_queue, packet):
+                    release(packet)
+                    return
+
+    # Collect packets into batches of up to 'batch_size' packets. A smaller batch is only processed
+    # at the end of the stream.
+    def consume_batches(self, input_queue, output_queue, process, batch_size):
+        batch = []
+        while True:
+            packet = self.get(input_queue)
+            if self.stop_event.is_set():
+                release(batch)
+                release(packet)
+                return
+            if packet is not END_OF_STREAM:
+                batch.append(packet)
+            if batch and (len(batch) == batch_size or packet is END_OF_STREAM):
+                processed = [item for item in process(batch) if item is not None]
+                # Release the packets that the stage dropped from the batch.
+                kept = {id(item) for item in processed}
+                release([item for item in batch if id(item) not in kept])
+                for position, item in enumerate(processed):
+                    if not self.put(output_queue, item):
+                        release(processed[position:])
+                        return
+                batch = []
+            if packet is END_OF_STREAM:
+                self.put(output_queue, END_OF_STREAM)
+                return
+
+    def put(self, output_queue, packet):
+        while not self.stop_event.is_set():
+            try:
+                output_queue.put(packet, timeout=POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self, input_queue):
+        while not self.stop_event.is_set():
+            try:
+                return input_queue.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                continue
+        return END_OF_STREAM
@@ -0,0 +1,85 @@
+# Number of consecutive frames that a new phase must hold before the repetition changes state, so
+# that a phase flickering around its threshold does not start or end a repetition.
+DEFAULT_HYSTERESIS_FRAMES = 3
+STANDING = "standing"
+# Result fields that only hold for the whole set if they hold for every repetition.
+ALL_REPS_FIELDS = {"straight"}
+
+
+# Splits a stream of per-frame phases (from 'determine_phase') into repetitions in constant time
+# per frame. A repetition starts once the lifter has left the standing phase for 'hysteresis'
+# consecutive frames and ends once they have been standing again for as many frames. Frames
+# without a phase are ignored.
+class RepSegmenter:
+
+    def __init__(self, hysteresis=DEFAULT_HYSTERESIS_FRAMES):
+        self.hysteresis = max(1, hysteresis)
+        self.reset()
+
+    def reset(self):
+        self.working = False
+        self.count = 0
+        # The first frame and time of the run of frames in the opposite state, and its length.
+        self.run_start = None
+        self.run_length = 0
+        # The first frame and time of the repetition in progress.
+        self.start = None
+
+    # Add the phase of a frame. Returns the (start frame, start time, end frame, end time) of the
+    # repetition that it completes, if any.
+    def update(self, phase, frame_index, timestamp):
+        if phase is None:
+            return None
+        if (phase != STANDING) == self.working:
+            self.run_length = 0
+            return None
+        if self.run_length == 0:
+            self.run_start = (frame_index, timestamp)
+        self.run_length += 1
+        if self.run_length < self.hysteresis:
+            return None
+        self.run_length = 0
+        self.working = not self.working
+        if self.working:
+            self.start = self.run_start
+            return None
+        self.count += 1
+        return (*self.start, *self.run_start)
+
+
+# The report of a repetition, given its position in the set, its (start frame, start time, end
+# frame, end time) span, its results and its barbell path.
+def rep_report(number, span, results, bar_path=None):
+    start_frame, start, end_frame, end = span
+    return {
+        "rep": number,
+        "start_frame": int(start_frame),
+        "end_frame": int(end_frame),
+        "start": float(start),
+        "end": float(end),
+        "duration": float(end - start),
+        "results": results,
+        "bar_path": bar_path
+    }
+
+
+# Combine the results of several repetitions into the results of the whole set: a fault is
+# flagged if it was flagged in any repetition, counters are summed, and 'current' is the latest.
+def combine_results(results_list):
+    combined = {}
+    for results in results_list:
+        for name, fields in results.items():
+            target = combined.setdefault(name, {})
+            for field, value in fields.items():
+                previous = target.get(field)
+                if field == "current":
+                    target[field] = value or previous or ""
+                elif previous is None:
+                    target[field] = value
+                elif field in ALL_REPS_FIELDS:
+                    target[field] = bool(previous and value)
+                elif isinstance(value, bool) or isinstance(previous, bool):
+                    target[field] = bool(previous or value)
+                else:
+                    target[field] = previous + value
+    return combined
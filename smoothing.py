@@ -0,0 +1,165 @@
+import argparse
+import json
+import math
+import numpy as np
+from landmarks import VISIBILITY
+from offline import VideoFeatures
+from pacing import DEFAULT_FPS
+
+# Default settings of the filter. The cutoff frequencies are in Hz, and the landmark coordinates
+# are normalised to the size of the frame.
+DEFAULT_MIN_CUTOFF = 1.0
+DEFAULT_BETA = 20.0
+DEFAULT_DERIVATIVE_CUTOFF = 1.0
+# The filter starts afresh when the pose is lost for longer than this many seconds.
+DEFAULT_MAX_GAP = 0.5
+
+
+# Smoothing factor of an exponential low-pass filter with the given cutoff frequency, for samples
+# 'interval' seconds apart.
+def smoothing_factor(cutoff, interval):
+    return 1 / (1 + 1 / (2 * math.pi * cutoff * interval))
+
+
+# Smooths the (x, y, z) coordinates of every landmark from one frame to the next with an adaptive
+# low-pass filter (the 1€ filter): slow movements are smoothed heavily, to remove the jitter of the
+# pose model, while fast movements are followed closely, as the cutoff frequency of each coordinate
+# rises with its speed by 'beta'. The state of each joint is its previous smoothed position and
+# speed. The visibility of the landmarks is left as it is.
+class LandmarkFilter:
+
+    def __init__(self, min_cutoff=DEFAULT_MIN_CUTOFF, beta=DEFAULT_BETA, derivative_cutoff=DEFAULT_DERIVATIVE_CUTOFF,
+                 max_gap=DEFAULT_MAX_GAP):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.derivative_cutoff = derivative_cutoff
+        self.max_gap = max_gap
+        self.reset()
+
+    def reset(self):
+        self.position = None
+        self.speed = None
+        self.timestamp = None
+
+    # Smooth the (33, 4) landmarks of the frame at 'timestamp' seconds, and return them as a new
+    # array.
+    def __call__(self, landmarks, timestamp):
+        coordinates = landmarks[:, :VISIBILITY]
+        interval = timestamp - self.timestamp if self.timestamp is not None else None
+        self.timestamp = timestamp
+        if interval is None or interval > self.max_gap:
+            self.position = coordinates.copy()
+            self.speed = np.zeros_like(coordinates)
+            return landmarks.copy()
+        # Frames with the same timestamp are taken to be one frame apart.
+        interval = interval if interval > 0 else 1 / DEFAULT_FPS
+        speed = (coordinates - self.position) / interval
+        self.speed += smoothing_factor(self.derivative_cutoff, interval) * (speed - self.speed)
+        cutoff = self.min_cutoff + self.beta * np.abs(self.speed)
+        self.position += smoothing_factor(cutoff, interval) * (coordinates - self.position)
+        smoothed = landmarks.copy()
+        smoothed[:, :VISIBILITY] = self.position
+        return smoothed
+
+
+# Smooth the (frames, 33, 4) landmarks of consecutive frames at 'timestamps' seconds.
+def smooth_sequence(landmarks, timestamps, landmark_filter=None):
+    landmark_filter = landmark_filter or LandmarkFilter()
+    smoothed = np.empty_like(landmarks)
+    for i, timestamp in enumerate(np.asarray(timestamps).tolist()):
+        smoothed[i] = landmark_filter(landmarks[i], timestamp)
+    return smoothed
+
+
+# Number of times the verdict of each criterion changes from one frame to the next, per minute of
+# video, over the frames that the results are based on.
+def verdict_changes(score, minutes):
+    frames = score.features.frames()
+    return {criterion: np.count_nonzero(categories[frames][1:] != categories[frames][:-1]) / minutes
+            for criterion, categories in score.faults.items()}
+
+
+# Fraction of the frames with a pose in both scores where the verdict of each criterion is the same.
+def agreement(score, reference):
+    _, frames, reference_frames = np.intersect1d(score.features.frame_indices, reference.features.frame_indices,
+                                                 return_indices=True)
+    return {criterion: float(np.mean(categories[frames] == reference.faults[criterion][reference_frames]))
+            for criterion, categories in score.faults.items()
+            if criterion in reference.faults and len(frames)}
+
+
+# Compare how often the verdicts change from frame to frame with the lite (0) and full (1) pose
+# models, with and without smoothing. Each model is run once through the cache, and the smoothing
+# is applied to its cached landmarks. The verdicts are also compared with those of the full model
+# without smoothing, as used until now.
+def evaluate(video_path, exercise, complexities=(0, 1), cache_dir=None, min_cutoff=DEFAULT_MIN_CUTOFF,
+             beta=DEFAULT_BETA):
+    # Imported here since the exercise modules depend on the models.
+    from batch import create_analysis
+    from cache import LandmarkCache
+    cache = LandmarkCache(cache_dir)
+    runs = []
+    reference = None
+    for complexity in sorted(complexities, reverse=True):
+        analysis = create_analysis(exercise, video_path, cache=True, cache_dir=cache_dir, smoothing=False,
+                                   pose_model_complexity=complexity)
+        analysis.process_video()
+        pose = analysis.metrics.summary()["stages"].get("pose")
+        entry = cache.load(cache.key(video_path, analysis.cache_config()))
+        fps = analysis.video_fps()
+        minutes = len(entry) / fps / 60 or 1.0
+        frame_indices = np.flatnonzero(entry.has_pose)
+        raw = entry.landmarks[entry.has_pose]
+        barbell_frames, barbell_coordinates = entry.barbell_coordinates()
+        for smoothing in (False, True):
+            landmarks = raw
+            if smoothing:
+                landmarks = smooth_sequence(raw, frame_indices / fps, LandmarkFilter(min_cutoff, beta))
+            score = analysis.score_offline(VideoFeatures(landmarks, frame_indices, barbell_frames,
+                                                         barbell_coordinates[:, 0]))
+            if reference is None:
+                reference = score
+            changes = verdict_changes(score, minutes)
+            runs.append({
+                "model_complexity": complexity,
+                "smoothing": smoothing,
+                # Only measured when the landmarks were not already cached.
+                "pose_ms": pose["mean_ms"] if pose else None,
+                "frames_with_pose": len(frame_indices),
+                "verdict_changes_per_minute": changes,
+                "total_verdict_changes_per_minute": sum(changes.values()),
+                "agreement_with_reference": agreement(score, reference),
+                "same_results_as_reference": score.results == reference.results,
+                "results": score.results
+            })
+    return {"video": video_path, "exercise": exercise, "reference": {"model_complexity": max(complexities),
+                                                                     "smoothing": False},
+            "min_cutoff": min_cutoff, "beta": beta, "runs": runs}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the stability of the verdicts with the lite and full pose "
+                                                 "models, with and without landmark smoothing.")
+    parser.add_argument("video")
+    parser.add_argument("--exercise", required=True, choices=("squat", "deadlift"))
+    parser.add_argument("--cache-dir", default=None)
+    parser.add_argument("--min-cutoff", type=float, default=DEFAULT_MIN_CUTOFF)
+    parser.add_argument("--beta", type=float, default=DEFAULT_BETA)
+    parser.add_argument("--output", default=None, help="File to write the full report to.")
+    arguments = parser.parse_args(argv)
+    report = evaluate(arguments.video, arguments.exercise, cache_dir=arguments.cache_dir,
+                      min_cutoff=arguments.min_cutoff, beta=arguments.beta)
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            json.dump(report, file, indent=2)
+    print(f"{'model':>6} {'smoothed':>9} {'pose ms':>8} {'changes/min':>12} {'agreement':>10} {'same results':>13}")
+    for run in report["runs"]:
+        agreement_values = list(run["agreement_with_reference"].values())
+        pose_ms = f"{run['pose_ms']:.1f}" if run["pose_ms"] is not None else "cached"
+        print(f"{('lite', 'full', 'heavy')[run['model_complexity']]:>6} {str(run['smoothing']):>9} {pose_ms:>8} "
+              f"{run['total_verdict_changes_per_minute']:>12.1f} "
+              f"{np.mean(agreement_values) if agreement_values else 0.0:>10.1%} {str(run['same_results_as_reference']):>13}")
+
+
+if __name__ == "__main__":
+    main()
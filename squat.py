@@ -1,12 +1,30 @@
 import analysis
-import numpy as np
-from helpers import calculate_angle
-from helpers import convert_coordinates
+import offline
+from landmarks import Y
 
 class Squat(analysis.Analysis):
 
-     def __init__(self, video_path):
-          super().__init__(video_path)
+     # Joints whose pixels are needed for drawing.
+     pixel_joints = ("left_shoulder", "right_shoulder", "left_hip", "left_knee", "right_knee", "left_heel",
+                     "right_heel", "left_toes", "right_toes")
+     # The (a, b, c) joints of each angle at 'b' measured in every frame.
+     angle_joints = {
+          "hip_knee_heel_angle": ("left_hip", "left_knee", "left_heel"),
+          "shoulder_hip_knee_angle": ("left_shoulder", "left_hip", "left_knee"),
+          "left_toes_ankles_angle": ("left_toes", "left_ankle", "right_ankle"),
+          "right_toes_ankles_angle": ("right_toes", "right_ankle", "left_ankle")
+     }
+     distance_joints = {
+          "feet_distance": ("left_heel", "right_heel"),
+          "shoulder_distance": ("left_shoulder", "right_shoulder")
+     }
+
+     def __init__(self, video_path, **options):
+          super().__init__(video_path, **options)
+
+     # Score the whole video at once with the vectorised rules in 'offline'.
+     def score_offline(self, features):
+          return offline.score_squat(features)
 
      # Initialise a dictionary containing the results of the analysis. The contents are dependant on
      # whether the squat is being analysed from the front view or side view.
@@ -78,46 +96,14 @@ class Squat(analysis.Analysis):
 
      # Store the pixels of each landmark that may be required for drawing in a dictionary.
      def get_landmark_pixels(self, image):
-         self.pixels = {"left_shoulder":
-                    convert_coordinates(self.landmarks["left_shoulder"], image),
-                    "right_shoulder":
-                    convert_coordinates(self.landmarks["right_shoulder"], image),
-                    "left_hip":
-                    convert_coordinates(self.landmarks["left_hip"], image),
-                    "left_knee":
-                    convert_coordinates(self.landmarks["left_knee"], image),
-                    "right_knee":
-                    convert_coordinates(self.landmarks["right_knee"], image),
-                    "left_heel":
-                    convert_coordinates(self.landmarks["left_heel"], image),
-                    "right_heel":
-                    convert_coordinates(self.landmarks["right_heel"], image),
-                    "left_toes":
-                    convert_coordinates(self.landmarks["left_toes"], image),
-                    "right_toes":
-                    convert_coordinates(self.landmarks["right_toes"], image)
-         }
+         self.pixels = self.measure_pixels(image)
          if "left_heel" in self.pixels:
              self.pixels["left_heel_target"] = [self.pixels["left_shoulder"][0], self.pixels["left_heel"][1]]
              self.pixels["right_heel_target"] = [self.pixels["right_shoulder"][0], self.pixels["right_heel"][1]]
 
      def calculate_angles(self):
-
           # Store angles required for analysis in 'angles' dictionary.
-          self.angles["hip_knee_heel_angle"] = calculate_angle(self.landmarks["left_hip"], 
-                                                            self.landmarks["left_knee"],
-                                                            self.landmarks["left_heel"]
-          )
-          self.angles["shoulder_hip_knee_angle"] = calculate_angle(self.landmarks["left_shoulder"], 
-                                                       self.landmarks["left_hip"], self.landmarks["left_knee"])
-          self.angles["left_toes_ankles_angle"] = calculate_angle(self.landmarks["left_toes"],
-                                                            self.landmarks["left_ankle"],
-                                                            self.landmarks["right_ankle"]
-          )
-          self.angles["right_toes_ankles_angle"] = calculate_angle(self.landmarks["right_toes"],
-                                                            self.landmarks["right_ankle"],
-                                                            self.landmarks["left_ankle"]
-          )
+          self.angles.update(self.measure_angles())
           # Maintain 'smallest_hip_knee_heel_angle'.
           if "smallest_hip_knee_heel_angle" not in self.angles:
             self.angles["smallest_hip_knee_heel_angle"] = self.angles["hip_knee_heel_angle"]
@@ -131,35 +117,18 @@ class Squat(analysis.Analysis):
      def calculate_distances(self):
          self.distances = {
                     "shoulder_knee_distance": abs(self.landmarks["left_shoulder"][1] - self.landmarks["left_knee"][1]),
-                    "feet_distance": np.sqrt((self.landmarks["left_heel"][0] - self.landmarks["right_heel"][0]) ** 2 +
-                                        (self.landmarks["left_heel"][1] - self.landmarks["right_heel"][1]) ** 2),
-                    "shoulder_distance": np.sqrt((self.landmarks["left_shoulder"][0] - self.landmarks["right_shoulder"][0]) ** 2 +
-                                            (self.landmarks["left_shoulder"][1] - self.landmarks["right_shoulder"][1]) ** 2)
+                    **self.measure_distances()
                     }
                
      # Calculate specific coordinates required for analysis.
      def calculate_coordinates(self):
           
-          # Store specific coordinates required for analysis in 'coordinates' dictionary.
-          self.coordinates = self.coordinates if hasattr(self, 'coordinates') else {}
-
-          # Maintain 'largest_left_hip_y'.
-          if "largest_left_hip_y" not in self.coordinates:
-            self.coordinates["largest_left_hip_y"] = self.landmarks["left_hip"][1]
-          else:
-               self.coordinates["largest_left_hip_y"] = max(
-               self.coordinates["largest_left_hip_y"], 
-               self.landmarks["left_hip"][1]
-            )
-               
-          # Maintain 'largest_left_knee_y'.
-          if "largest_left_knee_y" not in self.coordinates:
-            self.coordinates["largest_left_knee_y"] = self.landmarks["left_knee"][1]
-          else:
-               self.coordinates["largest_left_knee_y"] = max(
-               self.coordinates["largest_left_knee_y"], 
-               self.landmarks["left_knee"][1]
-            )
+          # Store specific coordinates required for analysis in 'coordinates' dictionary. The
+          # largest values are maintained by the landmark store.
+          self.coordinates = {
+               "largest_left_hip_y": self.store.largest("left_hip")[Y],
+               "largest_left_knee_y": self.store.largest("left_knee")[Y]
+          }
 
      def determine_phase(self):
           if self.view == "left":
@@ -0,0 +1,53 @@
+import numpy as np
+from detection import RecordedDetector, StridedDetector
+
+FRAME = np.zeros((240, 320, 3), dtype=np.uint8)
+
+
+def barbell(x, y):
+    return [(x, y, 120.0, 12.0, 0.9, 0)]
+
+
+# Stands in for the barbell tracker: stays where the barbell was last detected, with the scripted
+# confidence on each frame.
+class ScriptedTracker:
+
+    def __init__(self, confidences):
+        self.confidences = iter(confidences)
+        self.box = None
+
+    def initialise(self, frame, box):
+        self.box = box
+
+    def update(self, frame):
+        return self.box, next(self.confidences)
+
+
+# Detect each frame of the scripted detections and return the stride after each one.
+def run(detections, confidences, stride):
+    recorded = RecordedDetector(detections)
+    detector = StridedDetector(recorded, stride=stride, adaptive=True)
+    detector.tracker = ScriptedTracker(confidences)
+    strides = []
+    for index in range(len(detections)):
+        recorded.seek(index)
+        detector.detect(FRAME)
+        strides.append(detector.stride)
+    return strides
+
+
+def test_stride_grows_when_the_tracking_agrees_with_the_detector():
+    detections = [barbell(160, 100), barbell(160, 100), barbell(160, 100)]
+    assert run(detections, [0.9, 0.9], stride=2) == [2, 2, 3]
+
+
+def test_stride_halves_when_the_tracking_drifts_from_the_detector():
+    detections = [barbell(160, 100), barbell(160, 100), barbell(220, 100)]
+    assert run(detections, [0.9, 0.9], stride=2) == [2, 2, 1]
+
+
+def test_stride_halves_once_when_the_tracker_loses_the_barbell():
+    # The detection on the frame that the tracker lost the barbell on is also far from its last
+    # position, but the stride is only halved once for that frame.
+    detections = [barbell(160, 100), barbell(220, 100), barbell(220, 100)]
+    assert run(detections, [0.1, 0.9], stride=4) == [4, 2, 2]
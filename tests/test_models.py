@@ -0,0 +1,44 @@
+import numpy as np
+from benchmark import StubPose, make_video
+from detection import read_video
+from landmarks import landmarks_to_array
+from models import ModelRegistry
+from tuning import PoseInput
+
+
+# Returns the landmarks of each frame as an array, smoothed with those of the frames before it as a
+# MediaPipe graph in tracking mode does, until it is reset.
+class TrackingStubPose(StubPose):
+
+    def __init__(self):
+        self.previous = None
+
+    def process(self, image):
+        result = super().process(image)
+        if result.pose_landmarks is None:
+            return None
+        landmarks = landmarks_to_array(result.pose_landmarks)
+        if self.previous is not None:
+            landmarks = (landmarks + self.previous) / 2
+        self.previous = landmarks
+        return landmarks
+
+    def reset(self):
+        self.previous = None
+
+
+def run_clip(registry, video_path):
+    pose_input = PoseInput()
+    with registry.pose() as pose:
+        return np.array([pose.process(pose_input(frame)) for frame in read_video(video_path)])
+
+
+def test_consecutive_leases_give_identical_landmarks(tmp_path):
+    video_path = str(make_video(tmp_path / "clip.mp4", 320, 240, 30))
+    registry = ModelRegistry()
+    registry.use_backend("pose", TrackingStubPose)
+    first = run_clip(registry, video_path)
+    second = run_clip(registry, video_path)
+    # The same graph is lent out both times.
+    assert registry.loaded == 1
+    np.testing.assert_array_equal(first, second)
@@ -0,0 +1,46 @@
+import pytest
+from batch import create_analysis
+from benchmark import REP_FRAMES, StubDetectorModel, StubPose, make_video
+from landmarks import JOINTS, VISIBILITY
+from models import registry
+
+
+# The lifter of 'StubPose' seen from the front: both knees are visible.
+class FrontStubPose(StubPose):
+
+    def process(self, image):
+        result = super().process(image)
+        if result.pose_landmarks is not None:
+            result.pose_landmarks.landmark[JOINTS["right_knee"]].visibility = 0.9
+        return result
+
+
+@pytest.fixture
+def stub_backends():
+    def use(pose):
+        registry.use_backend("detector", StubDetectorModel)
+        registry.use_backend("pose", pose)
+    yield use
+    registry.use_backend("detector")
+    registry.use_backend("pose")
+    registry.clear()
+
+
+# The first playback analyses the video frame by frame and caches its landmarks and detections, and
+# the second one analyses the cached video at once with the vectorised rules of 'offline'.
+@pytest.mark.parametrize("exercise", ["squat", "deadlift"])
+@pytest.mark.parametrize("pose, view", [(StubPose, "left"), (FrontStubPose, "front")])
+def test_offline_analysis_matches_streaming_analysis(tmp_path, stub_backends, exercise, pose, view):
+    stub_backends(pose)
+    video_path = str(make_video(tmp_path / "set.mp4", 320, 240, 3 * REP_FRAMES))
+    options = {"cache": True, "cache_dir": str(tmp_path / "cache")}
+    streamed = create_analysis(exercise, video_path, **options)
+    streamed.process_video()
+    cached = create_analysis(exercise, video_path, **options)
+    cached.process_video()
+
+    assert "offline" in cached.metrics.summary()["stages"]
+    assert streamed.view == cached.view == view
+    assert [rep["results"] for rep in cached.reps] == [rep["results"] for rep in streamed.reps]
+    assert cached.results == streamed.results
+    assert cached.set_results() == streamed.set_results()
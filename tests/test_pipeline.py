@@ -0,0 +1,52 @@
+import pytest
+from buffers import BufferPool
+from pipeline import FramePacket, Pipeline, Stage
+
+SHAPE = (8, 8, 3)
+
+
+def frames(pool, count):
+    for index in range(count):
+        yield FramePacket(index, pool.acquire(SHAPE), pool)
+
+
+def idle_buffers(pool):
+    return sum(len(buffers) for buffers in pool.idle.values())
+
+
+def display(packet):
+    packet.release()
+    return packet
+
+
+def drop_odd(packet):
+    return packet if packet.index % 2 == 0 else None
+
+
+def drop_odd_batch(packets):
+    return [drop_odd(packet) for packet in packets]
+
+
+@pytest.mark.parametrize("stage", [Stage("drop", drop_odd), Stage("drop", drop_odd_batch, batch_size=3)])
+def test_dropped_packets_are_released(stage):
+    pool = BufferPool()
+    displayed = []
+    Pipeline(frames(pool, 20), [stage], sink=lambda packet: displayed.append(display(packet))).run()
+    assert [packet.index for packet in displayed] == list(range(0, 20, 2))
+    assert idle_buffers(pool) == pool.allocated
+
+
+@pytest.mark.parametrize("batch_size", [1, 3])
+def test_packets_in_flight_are_released_on_stop(batch_size):
+    pool = BufferPool()
+    pipeline = None
+
+    def stop(packet):
+        pipeline.stop()
+        return display(packet)
+
+    pipeline = Pipeline(frames(pool, 100), [Stage("pass", lambda packet: packet, batch_size=batch_size)],
+                        sink=stop, queue_depth=2)
+    pipeline.run()
+    assert pipeline.stop_event.is_set()
+    assert idle_buffers(pool) == pool.allocated
@@ -0,0 +1,69 @@
+import cv2
+import numpy as np
+
+
+# Tracks the barbell from one frame to the next by matching the image of the last detected box
+# against a search window around its previous position. Matching is performed on a downscaled
+# greyscale image so that its cost does not depend on the size of the box.
+class BarbellTracker:
+
+    def __init__(self, template_size=64, search_margin=0.5, min_search_margin=24):
+        # Length (in pixels) of the longest side of the template after downscaling.
+        self.template_size = template_size
+        # Margin around the previous box that is searched, as a fraction of the longest side of
+        # the box, but at least 'min_search_margin' pixels.
+        self.search_margin = search_margin
+        self.min_search_margin = min_search_margin
+        self.template = None
+        self.box = None
+        self.scale = 1.0
+
+    def reset(self):
+        self.template = None
+        self.box = None
+
+    # Start tracking the (x, y, width, height) box, where (x, y) is the centre of the box.
+    def initialise(self, frame, box):
+        x, y, width, height = box
+        self.scale = min(1.0, self.template_size / max(width, height, 1))
+        left, top, right, bottom = self.clip(frame, x - width / 2, y - height / 2,
+                                             x + width / 2, y + height / 2)
+        if right - left < 2 or bottom - top < 2:
+            self.reset()
+            return
+        self.template = self.downscale(frame[top:bottom, left:right])
+        self.box = box
+
+    # Return the tracked (x, y, width, height) box in the frame and the confidence of the match,
+    # between 0 and 1.
+    def update(self, frame):
+        if self.template is None:
+            return None, 0.0
+        x, y, width, height = self.box
+        margin = max(self.min_search_margin, self.search_margin * max(width, height))
+        left, top, right, bottom = self.clip(frame, x - width / 2 - margin, y - height / 2 - margin,
+                                             x + width / 2 + margin, y + height / 2 + margin)
+        window = self.downscale(frame[top:bottom, left:right])
+        if window.shape[0] < self.template.shape[0] or window.shape[1] < self.template.shape[1]:
+            return self.box, 0.0
+        scores = cv2.matchTemplate(window, self.template, cv2.TM_CCOEFF_NORMED)
+        _, confidence, _, location = cv2.minMaxLoc(scores)
+        if not np.isfinite(confidence):
+            return self.box, 0.0
+        # Map the match back to frame pixels.
+        x = left + (location[0] + self.template.shape[1] / 2) / self.scale
+        y = top + (location[1] + self.template.shape[0] / 2) / self.scale
+        self.box = (x, y, width, height)
+        return self.box, max(0.0, confidence)
+
+    def downscale(self, image):
+        grey = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        if self.scale == 1.0:
+            return grey
+        return cv2.resize(grey, (max(1, round(grey.shape[1] * self.scale)), max(1, round(grey.shape[0] * self.scale))),
+                          interpolation=cv2.INTER_AREA)
+
+    @staticmethod
+    def clip(frame, left, top, right, bottom):
+        height, width = frame.shape[:2]
+        return (int(max(0, left)), int(max(0, top)), int(min(width, right)), int(min(height, bottom)))
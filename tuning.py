@@ -0,0 +1,98 @@
+import time
+import cv2
+from buffers import BufferPool, ScratchBuffer
+from detection import MODEL_PATH, BarbellDetector
+
+# Seconds of video that the settings are measured on.
+DEFAULT_SAMPLE_SECONDS = 2.0
+# Settings that trade the accuracy of the models for speed, from the most accurate to the fastest.
+CANDIDATES = (
+    {"pose_model_complexity": 1, "pose_input_scale": 1.0, "detector_image_size": None},
+    {"pose_model_complexity": 1, "pose_input_scale": 0.75, "detector_image_size": 480},
+    {"pose_model_complexity": 0, "pose_input_scale": 0.75, "detector_image_size": 480},
+    {"pose_model_complexity": 0, "pose_input_scale": 0.5, "detector_image_size": 320},
+)
+
+
+# Prepares the RGB image that the pose model is run on, downscaled by 'scale'. The landmarks of the
+# pose model are normalised to the size of the image, so they hold for the full-size frame as well.
+# The image is resized and converted into the same buffers on every frame, so a PoseInput must only
+# be used by one thread, and each image only until the next one is prepared.
+class PoseInput:
+
+    def __init__(self, scale=1.0, pool=None):
+        self.scale = scale
+        pool = pool or BufferPool()
+        self.resized = ScratchBuffer(pool)
+        self.rgb = ScratchBuffer(pool)
+
+    def __call__(self, frame):
+        if self.scale != 1.0:
+            height, width = frame.shape[:2]
+            size = (max(1, round(width * self.scale)), max(1, round(height * self.scale)))
+            frame = cv2.resize(frame, size, dst=self.resized.get((size[1], size[0], 3)),
+                               interpolation=cv2.INTER_AREA)
+        image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self.rgb.get(frame.shape))
+        # The model is given a read-only view, so that it cannot change the shared buffer.
+        image = image.view()
+        image.flags.writeable = False
+        return image
+
+
+# Decode the first 'seconds' of a video.
+def sample_frames(video_path, seconds=DEFAULT_SAMPLE_SECONDS):
+    cap = cv2.VideoCapture(video_path)
+    try:
+        count = max(1, int(seconds * (cap.get(cv2.CAP_PROP_FPS) or 30.0)))
+        frames = []
+        while len(frames) < count:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        return frames
+    finally:
+        cap.release()
+
+
+# Frames per second that the analysis could hold with 'settings', estimated from the time taken to
+# detect the barbell and the pose in each of 'frames'. The stages of the pipeline run at the same
+# time, so the slowest of them sets the frame rate.
+def measure(settings, frames, registry, pose_settings, detector_path=MODEL_PATH):
+    pose_settings = {**pose_settings, "model_complexity": settings["pose_model_complexity"]}
+    with registry.detector_model(detector_path) as model, registry.pose(**pose_settings) as pose:
+        detector = BarbellDetector(model, image_size=settings["detector_image_size"])
+        pose_input = PoseInput(settings["pose_input_scale"])
+        # Warm both models up on the first frame.
+        detector.detect(frames[0])
+        pose.process(pose_input(frames[0]))
+        start = time.perf_counter()
+        for frame in frames:
+            detector.detect(frame)
+        detection = (time.perf_counter() - start) / len(frames)
+        start = time.perf_counter()
+        for frame in frames:
+            pose.process(pose_input(frame))
+        pose_time = (time.perf_counter() - start) / len(frames)
+    slowest = max(detection, pose_time)
+    return {"detection_ms": detection * 1000, "pose_ms": pose_time * 1000, "fps": 1 / slowest if slowest > 0 else 0.0}
+
+
+# Choose the most accurate of the 'candidates' that holds 'target_fps' on the first seconds of the
+# video, or the fastest if none of them does. Returns the chosen settings and the measurement of
+# each candidate that was tried.
+def tune(video_path, target_fps, registry, pose_settings, candidates=CANDIDATES, seconds=DEFAULT_SAMPLE_SECONDS,
+         detector_path=MODEL_PATH):
+    frames = sample_frames(video_path, seconds)
+    if not frames:
+        return dict(candidates[0]), []
+    measurements = []
+    fastest = None
+    for settings in candidates:
+        measurement = {**settings, **measure(settings, frames, registry, pose_settings, detector_path)}
+        measurements.append(measurement)
+        if measurement["fps"] >= target_fps:
+            return dict(settings), measurements
+        if fastest is None or measurement["fps"] > fastest[1]:
+            fastest = (settings, measurement["fps"])
+    return dict(fastest[0]), measurements